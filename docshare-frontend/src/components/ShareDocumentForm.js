@@ -8,6 +8,7 @@ import {
   Spinner,
   FormCheck,
   Card,
+  ListGroup,
 } from "react-bootstrap";
 
 function ShareDocumentForm({ documentId }) {
@@ -15,24 +16,29 @@ function ShareDocumentForm({ documentId }) {
   const api = useAxios(authTokens); // ✅ Pass token to Axios instance
 
   const [users, setUsers] = useState([]);
+  const [query, setQuery] = useState("");
   const [sharedUsers, setSharedUsers] = useState([]);
   const [selectedUserId, setSelectedUserId] = useState("");
   const [canEdit, setCanEdit] = useState(false);
   const [message, setMessage] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  // ✅ Load available users (excluding self)
+  // ✅ Suggest users (excluding self) matching what has been typed so far
   useEffect(() => {
-    const fetchUsers = async () => {
+    if (!query.trim() || selectedUserId) {
+      setUsers([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
       try {
-        const res = await api.get("/api/users/");
-        setUsers(res.data);
+        const res = await api.get("/api/users/", { params: { q: query, limit: 10 } });
+        setUsers(res.data.results);
       } catch (err) {
         console.error("❌ Failed to load users", err);
       }
-    };
-    fetchUsers();
-  }, [api]);
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [api, query, selectedUserId]);
 
   // ✅ Load current shares for this document
   const loadShares = async () => {
@@ -64,6 +70,7 @@ function ShareDocumentForm({ documentId }) {
 
       setMessage("✅ User successfully added!");
       setSelectedUserId("");
+      setQuery("");
       setCanEdit(false);
       await loadShares();
     } catch (err) {
@@ -108,19 +115,34 @@ function ShareDocumentForm({ documentId }) {
         {message && <Alert variant={message.startsWith("✅") ? "success" : "danger"}>{message}</Alert>}
 
         <Form onSubmit={handleSubmit}>
-          <Form.Select
-            value={selectedUserId}
-            onChange={(e) => setSelectedUserId(e.target.value)}
+          <Form.Control
+            type="text"
+            placeholder="Search by username or email"
+            value={query}
+            onChange={(e) => {
+              setQuery(e.target.value);
+              setSelectedUserId("");
+            }}
             className="mb-2"
             required
-          >
-            <option value="">Select User</option>
-            {users.map((user) => (
-              <option key={user.id} value={user.id}>
-                {user.username}
-              </option>
-            ))}
-          </Form.Select>
+          />
+          {users.length > 0 && (
+            <ListGroup className="mb-2">
+              {users.map((user) => (
+                <ListGroup.Item
+                  key={user.id}
+                  action
+                  type="button"
+                  onClick={() => {
+                    setSelectedUserId(String(user.id));
+                    setQuery(user.username);
+                  }}
+                >
+                  {user.username}
+                </ListGroup.Item>
+              ))}
+            </ListGroup>
+          )}
 
           <FormCheck
             type="checkbox"
@@ -1,6 +1,6 @@
 // src/pages/DocumentEditor.js
 
-import React, { useEffect, useRef, useState, useContext } from "react";
+import React, { useCallback, useEffect, useRef, useState, useContext } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import useWebSocket from "react-use-websocket";
 import AuthContext from "../context/AuthContext";
@@ -14,9 +14,9 @@ import {
   Form,
   Alert,
   Spinner,
-  Button,
 } from "react-bootstrap";
 import ShareDocumentForm from "../components/ShareDocumentForm";
+import { apply, compose, diff, transform } from "../utils/ot";
 
 function DocumentEditor() {
   const { id } = useParams();
@@ -30,25 +30,57 @@ function DocumentEditor() {
   const [messages, setMessages] = useState([]);
   const [activeUsers, setActiveUsers] = useState({});
   const [cursors, setCursors] = useState({});
-  const [isSaving, setIsSaving] = useState(false);
 
   const editorRef = useRef(null);
-  const saveTimeoutRef = useRef(null);
 
-  const wsUrl = `ws://localhost:8000/ws/doc/${id}/?token=${authTokens?.access}`;
+  // OT client state: last server revision, the op awaiting an ack and
+  // local edits made while waiting
+  const contentRef = useRef("");
+  const revisionRef = useRef(0);
+  const pendingRef = useRef(null);
+  const bufferRef = useRef(null);
+  const syncedRef = useRef(false);
+  const reportedRef = useRef(null);
 
-  const { sendMessage, lastMessage, readyState } = useWebSocket(wsUrl, {
+  // Reconnects resume from our last revision so the server only sends what
+  // we missed; with unacknowledged edits we start over from a snapshot.
+  const getWsUrl = useCallback(() => {
+    const base = `ws://localhost:8000/ws/doc/${id}/?token=${authTokens?.access}`;
+    if (syncedRef.current && !pendingRef.current) {
+      return `${base}&since_revision=${revisionRef.current}`;
+    }
+    return base;
+  }, [id, authTokens]);
+
+  const { sendMessage, lastMessage, readyState } = useWebSocket(getWsUrl, {
     onOpen: () => console.log("✅ WebSocket connected"),
     onClose: () => console.log("❌ WebSocket disconnected"),
-    shouldReconnect: () => true,
+    // 4403: no access to this document (or it was revoked)
+    shouldReconnect: (event) => event.code !== 4403,
   });
 
+  // Tell the server which revision we have applied, about once a second, so
+  // it can resync us with a snapshot if we fall too far behind
+  useEffect(() => {
+    if (readyState !== WebSocket.OPEN) return;
+    reportedRef.current = null;
+    const timer = setInterval(() => {
+      if (!syncedRef.current || reportedRef.current === revisionRef.current) return;
+      reportedRef.current = revisionRef.current;
+      sendMessage(JSON.stringify({ applied: revisionRef.current }));
+    }, 1000);
+    return () => clearInterval(timer);
+  }, [readyState, sendMessage]);
+
   useEffect(() => {
     const fetchDoc = async () => {
       try {
         const res = await api.get(`/api/documents/${id}/`);
         setDocument(res.data);
-        setContent(res.data.content || "");
+        if (revisionRef.current === 0 && !pendingRef.current) {
+          contentRef.current = res.data.content || "";
+          setContent(contentRef.current);
+        }
 
         const currentUserId = user?.user_id;
         const isOwner = res.data.owner.id === currentUserId;
@@ -64,12 +96,35 @@ function DocumentEditor() {
     fetchDoc();
   }, [api, id, navigate, user]);
 
+  // Rebase an incoming op past our unacknowledged edits and apply it
+  const receiveOp = useCallback((op) => {
+    let incoming = op;
+    if (pendingRef.current) {
+      [incoming, pendingRef.current] = transform(incoming, pendingRef.current);
+    }
+    if (bufferRef.current) {
+      [incoming, bufferRef.current] = transform(incoming, bufferRef.current);
+    }
+    contentRef.current = apply(contentRef.current, incoming);
+  }, []);
+
+  // Send the edits made while waiting, once nothing else is in flight
+  const sendBuffered = useCallback(() => {
+    if (pendingRef.current || !bufferRef.current) return;
+    pendingRef.current = bufferRef.current;
+    bufferRef.current = null;
+    sendMessage(JSON.stringify({
+      op: pendingRef.current,
+      revision: revisionRef.current,
+    }));
+  }, [sendMessage]);
+
   useEffect(() => {
     if (!lastMessage) return;
 
     try {
       const data = JSON.parse(lastMessage.data);
-      const { type, username, color, message, cursor } = data;
+      const { type, username, color } = data;
 
       switch (type) {
         case "join":
@@ -94,18 +149,60 @@ function DocumentEditor() {
           addMessage(`${username} left`);
           break;
 
-        case "message":
-          if (message !== content) {
-            setContent(message);
-          }
-          if (cursor && username) {
-            setCursors((prev) => ({
-              ...prev,
-              [username]: { ...cursor, color },
-            }));
-          }
-          addMessage(`${username} is editing...`);
+        case "snapshot":
+          contentRef.current = data.content || "";
+          revisionRef.current = data.revision;
+          reportedRef.current = null;  // The server waits for a new report
+          pendingRef.current = null;
+          bufferRef.current = null;
+          syncedRef.current = true;
+          setContent(contentRef.current);
+          if (data.members) setActiveUsers(data.members);
+          break;
+
+        case "catchup":
+          // Edits made while we were offline are still buffered
+          data.ops.forEach(receiveOp);
+          revisionRef.current = data.revision;
+          setContent(contentRef.current);
+          setActiveUsers(data.members);
+          syncedRef.current = true;
+          sendBuffered();
+          break;
+
+        case "ack":
+          revisionRef.current = data.revision;
+          pendingRef.current = null;
+          sendBuffered();
+          break;
+
+        case "op":
+          receiveOp(data.op);
+          revisionRef.current = data.revision;
+          setContent(contentRef.current);
+          // Edits saved over REST have no username
+          if (username) addMessage(`${username} is editing...`);
+          break;
+
+        case "error":
+          // Our unacknowledged edits will never be acked: start over from
+          // a snapshot, holding new edits until it arrives
+          addMessage(`⚠️ ${data.message}`);
+          pendingRef.current = null;
+          bufferRef.current = null;
+          syncedRef.current = false;
+          sendMessage(JSON.stringify({ resync: true }));
+          break;
+
+        case "presence": {
+          // One batched frame per tick with each user's latest cursor
+          const updates = {};
+          Object.entries(data.cursors).forEach(([name, entry]) => {
+            updates[name] = { ...entry.cursor, color: entry.color };
+          });
+          setCursors((prev) => ({ ...prev, ...updates }));
           break;
+        }
 
         default:
           break;
@@ -113,7 +210,7 @@ function DocumentEditor() {
     } catch (err) {
       console.error("WebSocket message parsing error:", err);
     }
-  }, [lastMessage, content]);
+  }, [lastMessage, receiveOp, sendBuffered, sendMessage]);
 
   const addMessage = (msg) => {
     setMessages((prev) => [...prev.slice(-4), msg]);
@@ -121,45 +218,28 @@ function DocumentEditor() {
 
   const handleChange = (e) => {
     const value = e.target.value;
+    const op = diff(contentRef.current, value);
+    contentRef.current = value;
     setContent(value);
 
     const selectionStart = e.target.selectionStart;
 
-    if (canEdit && readyState === WebSocket.OPEN) {
-      sendMessage(JSON.stringify({
-        message: value,
-        cursor: { position: selectionStart }
-      }));
-    }
-
-    if (saveTimeoutRef.current) clearTimeout(saveTimeoutRef.current);
-    saveTimeoutRef.current = setTimeout(() => {
-      api
-        .patch(`/api/documents/${id}/`, { content: value })
-        .then(() => console.log("💾 Auto-saved"))
-        .catch((err) => console.error("Auto-save failed", err));
-    }, 2000);
-  };
-
-  const handleManualSave = async () => {
-    try {
-      setIsSaving(true);
-      await api.patch(`/api/documents/${id}/`, { content });
-      console.log("✅ Manually saved");
-    } catch (err) {
-      console.error("Manual save failed:", err);
-      alert("Failed to manually save the document.");
-    } finally {
-      setIsSaving(false);
+    if (canEdit && op.length) {
+      if (pendingRef.current || readyState !== WebSocket.OPEN || !syncedRef.current) {
+        // Sent after the ack, or once we have caught up after reconnecting
+        bufferRef.current = bufferRef.current ? compose(bufferRef.current, op) : op;
+      } else {
+        pendingRef.current = op;
+        sendMessage(JSON.stringify({
+          op,
+          revision: revisionRef.current,
+          cursor: { position: selectionStart }
+        }));
+      }
     }
+    // Live edits are persisted by the server; there is nothing to save by hand
   };
 
-  useEffect(() => {
-    return () => {
-      if (saveTimeoutRef.current) clearTimeout(saveTimeoutRef.current);
-    };
-  }, []);
-
   if (!document) {
     return (
       <Container className="mt-4 text-center">
@@ -176,16 +256,6 @@ function DocumentEditor() {
           <Card className="p-3 shadow-sm position-relative">
             <div className="d-flex justify-content-between align-items-center mb-3">
               <h4 className="mb-0">{document.title}</h4>
-              {canEdit && (
-                <Button
-                  size="sm"
-                  variant="outline-primary"
-                  onClick={handleManualSave}
-                  disabled={isSaving}
-                >
-                  {isSaving ? "Saving..." : "💾 Save"}
-                </Button>
-              )}
             </div>
 
             {!canEdit && (
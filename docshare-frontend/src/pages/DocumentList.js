@@ -9,6 +9,7 @@ import {
   Spinner,
   Badge,
   Stack,
+  Form,
 } from "react-bootstrap";
 import useAxios from "../api/axios";
 import AuthContext from "../context/AuthContext";
@@ -18,13 +19,18 @@ function DocumentList() {
   const api = useAxios(authTokens);
   const navigate = useNavigate();
   const [documents, setDocuments] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState(null);
 
   useEffect(() => {
     const fetchDocs = async () => {
       try {
         const res = await api.get("/api/documents/");
-        setDocuments(res.data);
+        setDocuments(res.data.results);
+        setNextPage(res.data.next);
       } catch (err) {
         console.error("Failed to fetch documents:", err);
       } finally {
@@ -34,6 +40,37 @@ function DocumentList() {
     fetchDocs();
   }, [api]);
 
+  // The list is paginated; follow the cursor for older documents
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const res = await api.get(nextPage);
+      setDocuments((prev) => [...prev, ...res.data.results]);
+      setNextPage(res.data.next);
+    } catch (err) {
+      console.error("Failed to fetch more documents:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Search replaces the list until the query is cleared
+  const handleSearch = async (e) => {
+    e.preventDefault();
+    if (!query.trim()) {
+      setResults(null);
+      return;
+    }
+    try {
+      const res = await api.get("/api/documents/search/", { params: { q: query } });
+      setResults(res.data.results);
+    } catch (err) {
+      console.error("Failed to search documents:", err);
+    }
+  };
+
+  const shown = results ?? documents;
+
   const handleCreate = async () => {
   try {
     const res = await api.post("/api/documents/", {
@@ -67,16 +104,30 @@ function DocumentList() {
         </Col>
       </Row>
 
+      <Form onSubmit={handleSearch} className="mb-4">
+        <Form.Control
+          type="search"
+          placeholder="Search documents..."
+          value={query}
+          onChange={(e) => {
+            setQuery(e.target.value);
+            if (!e.target.value) setResults(null);
+          }}
+        />
+      </Form>
+
       {loading ? (
         <div className="text-center py-5">
           <Spinner animation="border" role="status" />
           <div className="mt-2">Loading your documents...</div>
         </div>
-      ) : documents.length === 0 ? (
+      ) : results && results.length === 0 ? (
+        <p className="text-center text-muted">No documents match your search.</p>
+      ) : shown.length === 0 ? (
         <p className="text-center text-muted">You haven't created or received any documents yet.</p>
       ) : (
         <Row xs={1} sm={2} md={3} lg={4} className="g-4">
-          {documents.map((doc) => (
+          {shown.map((doc) => (
             <Col key={doc.id}>
               <Card className="h-100 shadow-sm">
                 <Card.Body>
@@ -105,6 +156,14 @@ function DocumentList() {
           ))}
         </Row>
       )}
+
+      {nextPage && !results && (
+        <div className="text-center my-4">
+          <Button variant="outline-secondary" onClick={handleLoadMore} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load more"}
+          </Button>
+        </div>
+      )}
     </Container>
   );
 }
@@ -0,0 +1,158 @@
+// src/utils/ot.js
+//
+// Client half of the server's text operational transformation
+// (see docshare/srs_service/ot.py). An operation is a list of components:
+// a positive number retains, a string inserts, a negative number deletes.
+// Lengths are counted in code points to match the server.
+
+const isRetain = (c) => typeof c === "number" && c > 0;
+const isDelete = (c) => typeof c === "number" && c < 0;
+const isInsert = (c) => typeof c === "string";
+const chars = (text) => Array.from(text);
+
+function push(op, c) {
+  if (c === 0 || c === "") return;
+  const last = op[op.length - 1];
+  if (op.length) {
+    if ((isRetain(c) && isRetain(last)) || (isDelete(c) && isDelete(last))) {
+      op[op.length - 1] = last + c;
+      return;
+    }
+    if (isInsert(c)) {
+      if (isInsert(last)) {
+        op[op.length - 1] = last + c;
+        return;
+      }
+      if (isDelete(last)) {
+        if (op.length > 1 && isInsert(op[op.length - 2])) {
+          op[op.length - 2] += c;
+        } else {
+          op.splice(op.length - 1, 0, c);
+        }
+        return;
+      }
+    }
+  }
+  op.push(c);
+}
+
+function trim(op) {
+  if (op.length && isRetain(op[op.length - 1])) op.pop();
+  return op;
+}
+
+export function apply(text, op) {
+  const src = chars(text);
+  const out = [];
+  let index = 0;
+  for (const c of op) {
+    if (isRetain(c)) {
+      out.push(src.slice(index, index + c).join(""));
+      index += c;
+    } else if (isInsert(c)) {
+      out.push(c);
+    } else {
+      index -= c;
+    }
+  }
+  out.push(src.slice(index).join(""));
+  return out.join("");
+}
+
+export function compose(a, b) {
+  const result = [];
+  let i = 0;
+  let j = 0;
+  let ca = a[0];
+  let cb = b[0];
+  const nextA = () => (ca = a[++i]);
+  const nextB = () => (cb = b[++j]);
+
+  while (ca !== undefined || cb !== undefined) {
+    if (isDelete(ca)) { push(result, ca); nextA(); continue; }
+    if (isInsert(cb)) { push(result, cb); nextB(); continue; }
+    if (ca === undefined) { push(result, cb); nextB(); continue; }
+    if (cb === undefined) { push(result, ca); nextA(); continue; }
+
+    if (isRetain(ca) && isRetain(cb)) {
+      const n = Math.min(ca, cb);
+      push(result, n);
+      ca -= n; cb -= n;
+    } else if (isInsert(ca) && isDelete(cb)) {
+      const n = Math.min(chars(ca).length, -cb);
+      ca = chars(ca).slice(n).join(""); cb += n;
+    } else if (isInsert(ca) && isRetain(cb)) {
+      const n = Math.min(chars(ca).length, cb);
+      push(result, chars(ca).slice(0, n).join(""));
+      ca = chars(ca).slice(n).join(""); cb -= n;
+    } else {
+      const n = Math.min(ca, -cb);
+      push(result, -n);
+      ca -= n; cb += n;
+    }
+    if (ca === 0 || ca === "") nextA();
+    if (cb === 0) nextB();
+  }
+  return trim(result);
+}
+
+// Returns [a', b']; inserts from `a` win ties, so pass the server's op first.
+export function transform(a, b) {
+  const aPrime = [];
+  const bPrime = [];
+  let i = 0;
+  let j = 0;
+  let ca = a[0];
+  let cb = b[0];
+  const nextA = () => (ca = a[++i]);
+  const nextB = () => (cb = b[++j]);
+
+  while (ca !== undefined || cb !== undefined) {
+    if (isInsert(ca)) {
+      push(aPrime, ca); push(bPrime, chars(ca).length); nextA(); continue;
+    }
+    if (isInsert(cb)) {
+      push(aPrime, chars(cb).length); push(bPrime, cb); nextB(); continue;
+    }
+    if (ca === undefined) { push(bPrime, cb); nextB(); continue; }
+    if (cb === undefined) { push(aPrime, ca); nextA(); continue; }
+
+    if (isRetain(ca) && isRetain(cb)) {
+      const n = Math.min(ca, cb);
+      push(aPrime, n); push(bPrime, n);
+      ca -= n; cb -= n;
+    } else if (isDelete(ca) && isDelete(cb)) {
+      const n = Math.min(-ca, -cb);
+      ca += n; cb += n;
+    } else if (isDelete(ca) && isRetain(cb)) {
+      const n = Math.min(-ca, cb);
+      push(aPrime, -n);
+      ca += n; cb -= n;
+    } else {
+      const n = Math.min(ca, -cb);
+      push(bPrime, -n);
+      ca -= n; cb += n;
+    }
+    if (ca === 0) nextA();
+    if (cb === 0) nextB();
+  }
+  return [trim(aPrime), trim(bPrime)];
+}
+
+export function diff(oldText, newText) {
+  if (oldText === newText) return [];
+  const a = chars(oldText);
+  const b = chars(newText);
+  const limit = Math.min(a.length, b.length);
+  let prefix = 0;
+  while (prefix < limit && a[prefix] === b[prefix]) prefix += 1;
+  let suffix = 0;
+  while (suffix < limit - prefix && a[a.length - 1 - suffix] === b[b.length - 1 - suffix]) {
+    suffix += 1;
+  }
+  const op = [];
+  push(op, prefix);
+  push(op, b.slice(prefix, b.length - suffix).join(""));
+  push(op, -(a.length - prefix - suffix));
+  return trim(op);
+}
@@ -5,17 +5,19 @@ import django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "docshare.settings")
 django.setup()
 
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 import srs_service.routing
+from srs_service.middleware import JWTAuthMiddlewareStack
 
-# ✅ ASGI application instance that supports both HTTP and WebSocket protocols
+# ✅ ASGI application instance that supports both HTTP and WebSocket protocols,
+# plus the document shard channels served by `manage.py runworker docsync.N`
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             srs_service.routing.websocket_urlpatterns
         )
     ),
+    "channel": ChannelNameRouter(srs_service.routing.channel_routes),
 })
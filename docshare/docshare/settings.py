@@ -134,16 +134,105 @@ else:
     STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
     MEDIA_ROOT = os.path.join(BASE_DIR, "mediafiles")
 
-# Channels Layer: In-memory for POC, Redis for scale
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-        # Recommended Redis backend for production:
-        # "BACKEND": "channels_redis.core.RedisChannelLayer",
-        # "CONFIG": {
-        #     "hosts": [("127.0.0.1", 6379)],
-        # },
+# Channels Layer: Redis (or any Redis-protocol server) when REDIS_URL is set,
+# which is required to run more than one worker process; in-memory otherwise,
+# for local development and tests
+REDIS_URL = os.getenv("REDIS_URL")
+# Every command for every document on a shard queues on one docsync.N
+# channel, so those get far more room than the default of 100 messages.
+# Shard workers are separate processes, so this only matters with Redis
+CHANNEL_CAPACITY = {
+    "docsync.*": int(os.getenv("DOCUMENT_SHARD_CAPACITY", "10000")),
+}
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [REDIS_URL],
+                "channel_capacity": CHANNEL_CAPACITY,
+            },
+        }
     }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        }
+    }
+
+# Live document sync (WebSocket rooms)
+DOCUMENT_SYNC = {
+    # Seconds an edit may sit in memory before the room is written back
+    "FLUSH_DELAY": float(os.getenv("DOCUMENT_FLUSH_DELAY", "2.0")),
+    # Write back early once this many edits are pending
+    "FLUSH_MAX_OPS": int(os.getenv("DOCUMENT_FLUSH_MAX_OPS", "200")),
+    # Fold the operation log into Document.content every N operations
+    "SNAPSHOT_INTERVAL": int(os.getenv("DOCUMENT_SNAPSHOT_INTERVAL", "100")),
+    # Recent operations kept per open document for reconnect catch-up
+    "HISTORY_SIZE": int(os.getenv("DOCUMENT_HISTORY_SIZE", "500")),
+    # Seconds between batched cursor/presence broadcasts per document
+    "PRESENCE_TICK": float(os.getenv("DOCUMENT_PRESENCE_TICK", "0.04")),
+    # Seconds of silence before a connection is dropped from a room's
+    # presence; consumers send heartbeats well within this
+    "PRESENCE_TTL": float(os.getenv("DOCUMENT_PRESENCE_TTL", "60")),
+    # Frames this size or larger are compressed for clients that opt in
+    "COMPRESS_THRESHOLD": int(os.getenv("DOCUMENT_COMPRESS_THRESHOLD", "4096")),
+    # Largest inbound frame accepted after decompression
+    "MAX_FRAME_SIZE": int(os.getenv("DOCUMENT_MAX_FRAME_SIZE", str(8 * 1024 * 1024))),
+    # 0 keeps each room in the process serving its sockets (single worker).
+    # With N > 0, run `manage.py runworker docsync.0 ... docsync.<N-1>`
+    # (one process per channel) to host rooms; needs a shared channel layer.
+    "SHARDS": int(os.getenv("DOCUMENT_SYNC_SHARDS", "0")),
+    # Seconds (and entries) an authenticated WebSocket user is remembered by
+    # token, so reconnects skip the database
+    "AUTH_CACHE_TTL": float(os.getenv("DOCUMENT_AUTH_CACHE_TTL", "300")),
+    "AUTH_CACHE_SIZE": int(os.getenv("DOCUMENT_AUTH_CACHE_SIZE", "10000")),
+    # The async REST views trust a cached user for at most this long, so a
+    # deactivated account is refused by every process within it
+    "HTTP_AUTH_CACHE_TTL": float(os.getenv("DOCUMENT_HTTP_AUTH_CACHE_TTL", "30")),
+    # Seconds (and entries) a user's read/edit access to a document is cached
+    # for WebSocket joins, and the CACHES alias holding the per-document
+    # versions that let sharing changes invalidate it in every process; use a
+    # shared cache when running several processes
+    "ACCESS_CACHE_TTL": float(os.getenv("DOCUMENT_ACCESS_CACHE_TTL", "300")),
+    "ACCESS_CACHE_SIZE": int(os.getenv("DOCUMENT_ACCESS_CACHE_SIZE", "100000")),
+    "ACCESS_CACHE_ALIAS": os.getenv("DOCUMENT_ACCESS_CACHE_ALIAS", "default"),
+    # Rendered content_html kept per process, keyed by a hash of the content;
+    # name a CACHES alias to also share renders across processes and restarts
+    "RENDER_CACHE_SIZE": int(os.getenv("DOCUMENT_RENDER_CACHE_SIZE", "256")),
+    "RENDER_CACHE_ALIAS": os.getenv("DOCUMENT_RENDER_CACHE_ALIAS") or None,
+    # Dotted path of a search.SearchBackend class; by default SQLite FTS5 or
+    # PostgreSQL full-text search, matching the database
+    "SEARCH_BACKEND": os.getenv("DOCUMENT_SEARCH_BACKEND") or None,
+    # Seconds a page of user typeahead results is cached per prefix, and the
+    # CACHES alias holding them
+    "USER_SEARCH_CACHE_TTL": float(os.getenv("DOCUMENT_USER_SEARCH_CACHE_TTL", "30")),
+    "USER_SEARCH_CACHE_ALIAS": os.getenv("DOCUMENT_USER_SEARCH_CACHE_ALIAS", "default"),
+    # Seconds a user's document list page is cached, and the CACHES alias
+    # holding them; changes drop them at once in the process that made them,
+    # so use a shared cache when running several processes
+    "DOCUMENT_LIST_CACHE_TTL": float(os.getenv("DOCUMENT_LIST_CACHE_TTL", "300")),
+    "DOCUMENT_LIST_CACHE_ALIAS": os.getenv("DOCUMENT_LIST_CACHE_ALIAS", "default"),
+    # Seconds between stored versions of a document being edited, and how
+    # many versions share a keyframe (deltas replayed to rebuild one, at most)
+    "VERSION_INTERVAL": float(os.getenv("DOCUMENT_VERSION_INTERVAL", "60")),
+    "VERSION_KEYFRAME_INTERVAL": int(os.getenv("DOCUMENT_VERSION_KEYFRAME_INTERVAL", "20")),
+    # `manage.py compact_versions` keeps every version (and the operation
+    # log) for this many days, then one version a day; versions older than
+    # VERSION_RETENTION_DAYS are dropped, 0 keeps them forever
+    "VERSION_DETAIL_DAYS": float(os.getenv("DOCUMENT_VERSION_DETAIL_DAYS", "7")),
+    "VERSION_RETENTION_DAYS": float(os.getenv("DOCUMENT_VERSION_RETENTION_DAYS", "0")),
+    # Frames queued for one WebSocket before it is resynced from a snapshot
+    # instead; more than RESYNC_LIMIT resyncs a minute, or one frame taking
+    # SEND_TIMEOUT seconds to send, and the connection is closed
+    "SEND_QUEUE_SIZE": int(os.getenv("DOCUMENT_SEND_QUEUE_SIZE", "256")),
+    "RESYNC_LIMIT": int(os.getenv("DOCUMENT_RESYNC_LIMIT", "3")),
+    "SEND_TIMEOUT": float(os.getenv("DOCUMENT_SEND_TIMEOUT", "10")),
+    # Revisions a client may fall behind what it reports having applied
+    # before it is resynced too. Daphne never blocks on a slow reader, so
+    # this rather than the queue is what notices one there
+    "LAG_LIMIT": int(os.getenv("DOCUMENT_LAG_LIMIT", "500")),
 }
 
 # Logging (minimal for POC)
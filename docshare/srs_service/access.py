@@ -0,0 +1,116 @@
+"""
+Cached document permissions for the realtime layer.
+
+``level(doc_id, user_id)`` answers whether a user may read or edit a document,
+derived from ``Document.owner`` and ``DocumentShare.can_edit``. Answers are
+kept in a process-local cache for ``ACCESS_CACHE_TTL`` seconds, so a socket
+is checked against the database at most once when it connects; after that
+edits are checked against the level the consumer holds.
+
+Each cached answer is tagged with the document's access version, a counter
+in the Django cache (``ACCESS_CACHE_ALIAS``) that is bumped whenever the
+document's shares change (see ``signals`` and ``caching.versioned_key``), so
+every process stops using its copy on the next join. The change is also
+sent as an ``access.changed`` event to the document's room group, so
+connected sockets are rechecked straight away. Bulk writes send no model
+signals, so they call ``bulk_changed`` themselves.
+"""
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+
+from .caching import TTLCache, aversioned_key
+from .conf import sync_setting
+from .models import Document, DocumentShare
+from .rooms import group_name
+
+NONE = 0
+READ = 1
+EDIT = 2
+
+_levels = TTLCache(sync_setting("ACCESS_CACHE_SIZE"), sync_setting("ACCESS_CACHE_TTL"))
+
+
+def _key(doc_id, user_id):
+    return (str(doc_id), user_id)
+
+
+def _cache():
+    return caches[sync_setting("ACCESS_CACHE_ALIAS")]
+
+
+def _version_key(doc_id):
+    return f"docshare:access:version:{doc_id}"
+
+
+def load_level(doc_id, user_id):
+    """Read a user's access to a document from the database, in one query."""
+    if user_id is None or not str(doc_id).isdigit():
+        return NONE
+    row = Document.objects.filter(pk=doc_id).annotate(
+        share_can_edit=Subquery(
+            DocumentShare.objects.filter(
+                document=OuterRef("pk"), shared_with=user_id
+            ).values("can_edit")[:1]
+        )
+    ).values("owner_id", "share_can_edit").first()
+    if row is None:
+        return NONE
+    if row["owner_id"] == user_id or row["share_can_edit"]:
+        return EDIT
+    if row["share_can_edit"] is None:
+        return NONE
+    return READ
+
+
+async def level(doc_id, user_id):
+    """The cached access level of ``user_id`` to ``doc_id``."""
+    # Read first: a level loaded while shares change is tagged as outdated
+    version = await aversioned_key(_cache(), _version_key(doc_id))
+    key = _key(doc_id, user_id)
+    cached = _levels.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    loaded = await database_sync_to_async(load_level)(doc_id, user_id)
+    _levels.set(key, (version, loaded))
+    return loaded
+
+
+def forget(doc_id, user_id=None):
+    """Drop this process's cached levels for one user of a document, or all its users."""
+    if user_id is None:
+        doc_id = str(doc_id)
+        _levels.pop_matching(lambda key: key[0] == doc_id)
+    else:
+        _levels.pop(_key(doc_id, user_id))
+
+
+def changed(doc_id, user_id=None):
+    """
+    Invalidate after a permission change in every process and tell the
+    document's sockets. ``user_id`` None means everyone, e.g. the document
+    is gone.
+    """
+    forget(doc_id, user_id)
+    try:
+        _cache().incr(_version_key(doc_id))
+    except ValueError:
+        pass  # No version, so nothing cached for this document
+    async_to_sync(get_channel_layer().group_send)(group_name(doc_id), {
+        "type": "access.changed",
+        "user_id": user_id,
+    })
+
+
+def bulk_changed(pairs):
+    """
+    ``changed`` for many ``(doc_id, user_id)`` pairs, with one event per
+    document: for the user when only one changed, otherwise for everyone.
+    """
+    users = {}
+    for doc_id, user_id in pairs:
+        users.setdefault(doc_id, set()).add(user_id)
+    for doc_id, changed_users in users.items():
+        changed(doc_id, next(iter(changed_users)) if len(changed_users) == 1 else None)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SrsServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'srs_service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,170 @@
+"""
+Async-native versions of the read-heavy REST endpoints, under ``/api/async/``.
+
+DRF views are synchronous, so under Daphne every request is handed to the
+single thread Django keeps for sync code, one at a time, behind WebSocket
+database calls. These views run on the event loop instead: authentication is
+the cached token lookup shared with WebSockets (``middleware.get_user``,
+trusting a cached user for ``HTTP_AUTH_CACHE_TTL`` seconds at most), queries use Django's async ORM, and only the queries themselves leave the
+loop. Responses match the DRF endpoints and reuse their serializers, which
+only read data that has already been fetched.
+
+The document list pages by a keyset ``cursor`` and returns only ``next``.
+"""
+import base64
+import binascii
+import functools
+import json
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import directory, doclists, middleware
+from .conf import sync_setting
+from .models import Document, DocumentShare
+from .serializers import (
+    DocumentSerializer,
+    DocumentShareSerializer,
+    DocumentSummarySerializer,
+    UserSummarySerializer,
+)
+from .views import DocumentCursorPagination, document_validators
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def _not_found():
+    return _json({"detail": "Not found."}, status=404)
+
+
+def authenticated(view):
+    """Resolve the ``Authorization: Bearer`` token to ``request.user`` or answer 401."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        user = None
+        if scheme.lower() == "bearer":
+            user = await middleware.get_user(
+                token.strip(), max_age=sync_setting("HTTP_AUTH_CACHE_TTL")
+            )
+        if user is None:
+            return _json(
+                {"detail": "Authentication credentials were not provided."}, status=401
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get(DocumentCursorPagination.page_size_query_param, ""))
+    except ValueError:
+        return DocumentCursorPagination.page_size
+    return min(max(size, 1), DocumentCursorPagination.max_page_size)
+
+
+def _encode_cursor(document):
+    position = json.dumps([document.updated_at.isoformat(), document.pk])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        updated_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse_datetime(updated_at), int(pk)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+@require_safe
+@authenticated
+async def document_list(request):
+    key, data = await doclists.aget_page(request.user.pk, request.build_absolute_uri())
+    if data is not None:
+        return _json(data)
+    size = _page_size(request)
+    documents = Document.objects.accessible_to(request.user.pk).summaries()
+    cursor = request.GET.get("cursor")
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None or position[0] is None:
+            return _json({"detail": "Invalid cursor"}, status=404)
+        updated_at, pk = position
+        documents = documents.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, pk__lt=pk)
+        )
+    page = [document async for document in documents.order_by("-updated_at", "-pk")[:size + 1]]
+
+    next_url = None
+    if len(page) > size:
+        page = page[:size]
+        query = request.GET.copy()
+        query["cursor"] = _encode_cursor(page[-1])
+        next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    data = {
+        "next": next_url,
+        "results": DocumentSummarySerializer(page, many=True).data,
+    }
+    await doclists.aset_page(key, data)
+    return _json(data)
+
+
+@require_safe
+@authenticated
+async def document_detail(request, pk):
+    documents = Document.objects.accessible_to(request.user.pk).filter(pk=pk)
+    row = await documents.values("id", "revision", "updated_at").afirst()
+    if row is None:
+        return _not_found()
+    shares = [pair async for pair in DocumentShare.objects.filter(document_id=pk).values_list(
+        "shared_with_id", "can_edit"
+    )]
+    etag, last_modified = document_validators(row, shares)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        document = await documents.with_details().afirst()
+        if document is None:
+            return _not_found()
+        response = _json(DocumentSerializer(document).data)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_safe
+@authenticated
+async def share_list(request):
+    shares = DocumentShare.objects.filter(document__owner=request.user.pk).select_related(
+        "document", "shared_with"
+    )
+    return _json(DocumentShareSerializer([share async for share in shares], many=True).data)
+
+
+@require_safe
+@authenticated
+async def user_list(request):
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 50)
+    except ValueError:
+        return _json({"error": "'limit' must be a number."}, status=400)
+    users, next_after = await directory.afind_users(
+        request.GET.get("q", ""),
+        exclude_id=request.user.pk,
+        after=request.GET.get("after", ""),
+        limit=limit,
+    )
+    return _json({
+        "results": UserSummarySerializer(users, many=True).data,
+        "next": next_after,
+    })
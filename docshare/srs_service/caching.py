@@ -0,0 +1,91 @@
+"""
+Small in-process caches for hot lookups on the realtime path, and the
+version counters that invalidate entries cached in the Django cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+def versioned_key(cache, key):
+    """
+    The version counter at ``key`` in the Django ``cache``, for tagging
+    cached entries; ``incr`` it to make all of them unreachable at once.
+
+    A missing counter starts from the clock, never from a number entries may
+    still be tagged with. Counters live in the cache they version, so with
+    the local-memory cache and several processes an entry can be stale until
+    it expires; use a shared cache to avoid that.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aversioned_key(cache, key):
+    """``versioned_key`` for async callers."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+class TTLCache:
+    """
+    A thread-safe LRU mapping whose entries also expire after ``ttl``
+    seconds (never, if ``ttl`` is None). Holds at most ``maxsize`` entries;
+    the least recently used one is dropped to make room.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store ``value``; ``ttl`` overrides the cache-wide lifetime if shorter."""
+        if ttl is None or (self.ttl is not None and ttl > self.ttl):
+            ttl = self.ttl
+        if (ttl is not None and ttl <= 0) or self.maxsize <= 0:
+            return
+        expires_at = float("inf") if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def pop_matching(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``; returns how many."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,39 @@
+from django.conf import settings
+
+# Fallbacks for keys missing from settings.DOCUMENT_SYNC
+DEFAULTS = {
+    "FLUSH_DELAY": 2.0,
+    "FLUSH_MAX_OPS": 200,
+    "SNAPSHOT_INTERVAL": 100,
+    "HISTORY_SIZE": 500,
+    "PRESENCE_TICK": 0.04,
+    "PRESENCE_TTL": 60.0,
+    "COMPRESS_THRESHOLD": 4096,
+    "MAX_FRAME_SIZE": 8 * 1024 * 1024,
+    "SHARDS": 0,
+    "AUTH_CACHE_TTL": 300.0,
+    "AUTH_CACHE_SIZE": 10000,
+    "HTTP_AUTH_CACHE_TTL": 30.0,
+    "ACCESS_CACHE_TTL": 300.0,
+    "ACCESS_CACHE_SIZE": 100000,
+    "ACCESS_CACHE_ALIAS": "default",
+    "RENDER_CACHE_SIZE": 256,
+    "RENDER_CACHE_ALIAS": None,
+    "SEARCH_BACKEND": None,
+    "USER_SEARCH_CACHE_TTL": 30.0,
+    "USER_SEARCH_CACHE_ALIAS": "default",
+    "DOCUMENT_LIST_CACHE_TTL": 300.0,
+    "DOCUMENT_LIST_CACHE_ALIAS": "default",
+    "VERSION_INTERVAL": 60.0,
+    "VERSION_KEYFRAME_INTERVAL": 20,
+    "VERSION_DETAIL_DAYS": 7.0,
+    "VERSION_RETENTION_DAYS": 0.0,
+    "SEND_QUEUE_SIZE": 256,
+    "RESYNC_LIMIT": 3,
+    "SEND_TIMEOUT": 10.0,
+    "LAG_LIMIT": 500,
+}
+
+
+def sync_setting(name):
+    return getattr(settings, "DOCUMENT_SYNC", {}).get(name, DEFAULTS[name])
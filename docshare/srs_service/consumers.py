@@ -1,135 +1,363 @@
-import json
-import random
-import jwt
+import asyncio
+import time
+from urllib.parse import parse_qs
 
+from channels.consumer import AsyncConsumer
+from channels.exceptions import ChannelFull
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AnonymousUser
-from django.conf import settings
 
-User = get_user_model()
-user_colors = {}
+from . import access, compression, metrics, outbox, rooms, wire
+from .conf import sync_setting
+
+# Close code for connections that cannot keep up with their document
+CLOSE_TOO_SLOW = 4408
+
+# Seconds over which RESYNC_LIMIT is counted
+RESYNC_WINDOW = 60.0
+
+# Close code when the document's shard is too busy to let us join
+CLOSE_TRY_AGAIN = 1013
+
 
 class DocumentSyncConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.doc_id = self.scope["url_route"]["kwargs"]["doc_id"]
-        self.room_group_name = f"doc_{self.doc_id}"
+        self.room_group_name = rooms.group_name(self.doc_id)
 
-        # Authenticate user from query token
-        token = self.get_token_from_query_string(self.scope["query_string"].decode())
-        self.scope["user"] = await self.get_user_from_token(token)
+        self.heartbeat = None
+        self.writer = None
+        self.closing = False
 
-        # Assign display name
-        self.username = (
-            self.scope["user"].username
-            if self.scope["user"].is_authenticated
-            else f"Guest_{self.channel_name[-5:]}"
-        )
+        # Authenticated from the query token by JWTAuthMiddleware; only the
+        # owner and users the document is shared with get in
+        query_string = self.scope["query_string"].decode()
+        user = self.scope["user"]
+        level = await access.level(self.doc_id, user.id if user.is_authenticated else None)
+        if level == access.NONE:
+            metrics.incr("access.denied")
+            await self.close(code=4403)
+            return
+        self.can_edit = level == access.EDIT
+        self.username = user.username
 
-        # Assign a unique color to user
-        if self.username not in user_colors:
-            user_colors[self.username] = self.assign_color()
+        # JSON text frames unless the client negotiated a binary subprotocol
+        self.codec, subprotocol = wire.negotiate(self.scope.get("subprotocols", []))
+        # Opt-in compression of large frames, e.g. ?compress=zlib
+        self.compression = compression.METHODS.get(self.get_query_param(query_string, "compress"))
+
+        # Edits broadcast before the room's sync reply are covered by it
+        self.synced_revision = None
+        self.dictionary = compression.TEXT
+
+        # Frames wait here for the writer task, so a slow client never
+        # stalls this consumer; see resync() for what happens when it fills
+        self.outbox = outbox.Outbox(sync_setting("SEND_QUEUE_SIZE"))
+        self.resyncs = []
+        # The last revision the client says it has applied. Servers like
+        # Daphne buffer sends without ever blocking, so the outbox rarely
+        # fills for a slow reader; this is how we notice one instead.
+        # None until the client reports (see check_lag)
+        self.applied_revision = None
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=subprotocol)
+        self.writer = asyncio.ensure_future(self.write_frames())
 
-        # Notify others that a user has joined
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "user.join",
+        # The room answers with a catch-up or snapshot (see document_sync),
+        # assigns our color and announces us to the others
+        try:
+            await rooms.send_command({
+                "type": "room.join",
+                "doc_id": self.doc_id,
+                "reply_channel": self.channel_name,
                 "username": self.username,
-                "color": user_colors[self.username],
-            },
-        )
+                "since_revision": self.get_since_revision(query_string),
+            })
+        except ChannelFull:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close(code=CLOSE_TRY_AGAIN)
+            return
+        self.heartbeat = asyncio.ensure_future(self.send_heartbeats())
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "user.leave",
-                "username": self.username,
-            },
-        )
-        user_colors.pop(self.username, None)
+        if self.heartbeat is None:
+            return  # Turned away in connect()
+        self.heartbeat.cancel()
+        self.writer.cancel()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        try:
+            await rooms.send_command({
+                "type": "room.leave",
+                "doc_id": self.doc_id,
+                "reply_channel": self.channel_name,
+            })
+        except ChannelFull:
+            pass  # Our presence entry expires without heartbeats
+
+    async def send_heartbeats(self):
+        """Keep our presence entry alive while the socket is idle."""
+        interval = sync_setting("PRESENCE_TTL") / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await rooms.send_command({
+                    "type": "room.touch",
+                    "doc_id": self.doc_id,
+                    "reply_channel": self.channel_name,
+                })
+            except ChannelFull:
+                pass  # The next one will do; presence outlives a missed beat
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-            message = data.get("message")
+            if bytes_data is not None:
+                if self.compression is not None and compression.is_compressed(bytes_data):
+                    size = len(bytes_data)
+                    bytes_data = compression.decompress(bytes_data, sync_setting("MAX_FRAME_SIZE"))
+                    metrics.incr("compression.frames_in")
+                    metrics.incr("compression.bytes_saved_in", len(bytes_data) - size)
+                elif not self.codec.binary:
+                    raise ValueError("Binary frames need a binary subprotocol.")
+                data = self.codec.decode(bytes_data)
+            else:
+                data = wire.decode(text_data)
+            if not isinstance(data, dict):
+                raise ValueError("Expected an object.")
+            op = data.get("op")  # e.g. [12, "abc", -3]
+            message = data.get("message")  # Legacy: full document text
             cursor = data.get("cursor")  # Optional: cursor object
+            resync = data.get("resync")  # The client lost track and wants a snapshot
+            applied = data.get("applied")  # The last revision the client applied
 
-            if message is None and cursor is None:
+            if all(value is None for value in (op, message, cursor, applied)) and not resync:
                 raise ValueError("Empty payload.")
 
-            payload = {
-                "type": "document.message",
-                "username": self.username,
-                "color": user_colors.get(self.username),
-            }
+            if applied is not None:
+                if not isinstance(applied, int) or isinstance(applied, bool):
+                    raise ValueError("'applied' must be a revision number.")
+                self.applied_revision = max(applied, self.applied_revision or 0)
+            revision = data.get("revision")
+            if self.applied_revision is not None and isinstance(revision, int):
+                # Edits are based on what the client has applied
+                self.applied_revision = max(revision, self.applied_revision)
+
+            if (op is not None or message is not None) and not self.can_edit:
+                metrics.incr("access.denied_edits")
+                await self.send_payload({
+                    "type": "error",
+                    "message": "You have read-only access to this document.",
+                })
+                op = message = None
+
+            if op is not None or message is not None:
+                # Applied by the room, which acks us and relays the edit
+                await rooms.send_command({
+                    "type": "room.edit",
+                    "doc_id": self.doc_id,
+                    "reply_channel": self.channel_name,
+                    "op": op,
+                    "message": message,
+                    "revision": revision,
+                    "author_id": self.scope["user"].id,
+                    "username": self.username,
+                })
 
-            if message is not None:
-                payload["message"] = message
             if cursor is not None:
-                payload["cursor"] = cursor  # e.g., { position: 123, selection: [start, end] }
+                # e.g., { position: 123, selection: [start, end] }; coalesced
+                # with other cursor moves and sent on the next presence tick
+                await rooms.send_command({
+                    "type": "room.cursor",
+                    "doc_id": self.doc_id,
+                    "reply_channel": self.channel_name,
+                    "username": self.username,
+                    "cursor": cursor,
+                })
 
-            await self.channel_layer.group_send(self.room_group_name, payload)
+            if resync:
+                await rooms.send_command({
+                    "type": "room.resync",
+                    "doc_id": self.doc_id,
+                    "reply_channel": self.channel_name,
+                })
 
-        except (json.JSONDecodeError, ValueError):
-            await self.send(text_data=json.dumps({
+        except ValueError:  # includes JSONDecodeError
+            await self.send_payload({
                 "type": "error",
                 "message": "Invalid WebSocket message format."
-            }))
+            })
+        except ChannelFull:
+            # Like any refused edit: the client drops what it had pending and resyncs
+            await self.send_payload({
+                "type": "error",
+                "message": "The server is busy; please try again."
+            })
+
+    async def send_payload(self, payload):
+        await self.send_frame(self.codec.encode(payload))
+
+    def prepare(self, frame):
+        """The ``send`` arguments for a frame, compressed with the current dictionary."""
+        if self.compression is not None and len(frame) >= sync_setting("COMPRESS_THRESHOLD"):
+            compressed = compression.compress(frame, self.compression, self.dictionary)
+            metrics.incr("compression.frames_out")
+            metrics.incr("compression.bytes_saved_out", len(frame) - len(compressed))
+            return {"bytes_data": compressed}
+        if isinstance(frame, bytes):
+            return {"bytes_data": frame}
+        return {"text_data": frame}
+
+    async def send_frame(self, frame):
+        if self.closing:
+            return  # Events still arrive until the server confirms the close
+        # Compressed now: the dictionary may change before the frame is sent
+        if not self.outbox.put(self.prepare(frame)):
+            await self.resync()
+
+    async def forward(self, event):
+        """Send this connection's pre-encoded copy of a broadcast frame."""
+        await self.send_frame(event["frames"][self.codec.name])
+
+    async def write_frames(self):
+        """Drain the outbox into the socket, one frame at a time."""
+        while True:
+            message = await self.outbox.get()
+            try:
+                await asyncio.wait_for(self.send(**message), sync_setting("SEND_TIMEOUT"))
+            except asyncio.TimeoutError:
+                metrics.incr("backpressure.send_timeouts")
+                await self.give_up()
+                return
+
+    async def resync(self):
+        """
+        The client is too far behind to catch up frame by frame: drop what is
+        queued for it and send it a snapshot instead, or give up on it if that
+        keeps happening.
+        """
+        now = time.monotonic()
+        self.resyncs = [at for at in self.resyncs if now - at < RESYNC_WINDOW] + [now]
+        if len(self.resyncs) > sync_setting("RESYNC_LIMIT"):
+            await self.give_up()
+            return
+        metrics.incr("backpressure.resyncs")
+        metrics.incr("backpressure.frames_dropped", self.outbox.clear())
+        # Edits are ignored until the snapshot arrives (see document_message)
+        self.synced_revision = None
+        try:
+            await rooms.send_command({
+                "type": "room.resync",
+                "doc_id": self.doc_id,
+                "reply_channel": self.channel_name,
+            })
+        except ChannelFull:
+            await self.give_up()
+
+    async def check_lag(self, revision):
+        """
+        Resync a client that has not applied the edits up to ``revision``
+        within ``LAG_LIMIT`` revisions; ``resync`` gives up on it if that
+        keeps happening.
+        """
+        if self.applied_revision is None or revision - self.applied_revision <= sync_setting("LAG_LIMIT"):
+            return False
+        metrics.incr("backpressure.lagging")
+        # Not checked again until the client reports from the snapshot
+        self.applied_revision = None
+        await self.resync()
+        return True
+
+    async def give_up(self):
+        """Disconnect a client that cannot keep up; it can reconnect and resync."""
+        metrics.incr("backpressure.disconnects")
+        self.outbox.clear()
+        await self.close(code=CLOSE_TOO_SLOW)
+
+    async def close(self, code=None, reason=None):
+        self.closing = True
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        await super().close(code=code, reason=reason)
+
+    async def document_sync(self, event):
+        """The room's answer to our join: a catch-up or a snapshot."""
+        self.synced_revision = event["revision"]
+        self.dictionary = event["dictionary"]
+        await self.forward(event)
+
+    async def document_error(self, event):
+        await self.forward(event)
 
     async def document_message(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "message",
-            "message": event.get("message"),
-            "username": event["username"],
-            "color": event["color"],
-            "cursor": event.get("cursor"),  # forwarded to frontend
-        }))
+        if self.synced_revision is None or event["revision"] <= self.synced_revision:
+            return
+        if await self.check_lag(event["revision"]):
+            return
+        if event["sender"] == self.channel_name:
+            # The author already has the edit; it only needs the new revision
+            await self.send_payload({
+                "type": "ack",
+                "revision": event["revision"],
+            })
+            return
+        await self.forward(event)
+
+    async def presence_update(self, event):
+        if self.closing:
+            return
+        # Only the latest cursors matter: merge into a presence frame that
+        # is still waiting rather than queue another one
+        result = self.outbox.put_cursors(
+            event["cursors"],
+            self.prepare(event["frames"][self.codec.name]),
+            lambda cursors: self.prepare(self.codec.encode({"type": "presence", "cursors": cursors})),
+        )
+        if result != outbox.QUEUED:
+            metrics.incr(f"backpressure.cursors_{result}")
+
+    async def document_snapshot(self, event):
+        self.synced_revision = event["revision"]
+        self.dictionary = event["dictionary"]
+        await self.forward(event)
+
+    async def access_changed(self, event):
+        """Someone's permissions on this document changed, maybe ours."""
+        access.forget(self.doc_id, event["user_id"])
+        user_id = self.scope["user"].id
+        if event["user_id"] not in (None, user_id):
+            return
+        level = await access.level(self.doc_id, user_id)
+        if level == access.NONE:
+            await self.close(code=4403)
+        else:
+            self.can_edit = level == access.EDIT
 
     async def user_join(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "join",
-            "username": event["username"],
-            "color": event["color"],
-        }))
+        await self.forward(event)
 
     async def user_leave(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "leave",
-            "username": event["username"],
-        }))
-
-    def assign_color(self):
-        palette = [
-            "#f94144", "#f3722c", "#f9c74f", "#90be6d",
-            "#43aa8b", "#577590", "#277da1", "#f9844a"
-        ]
-        assigned = set(user_colors.values())
-        for color in palette:
-            if color not in assigned:
-                return color
-        return random.choice(palette)  # fallback
-
-    def get_token_from_query_string(self, query_string):
-        parts = query_string.split("&")
-        for part in parts:
-            if part.startswith("token="):
-                return part.split("=", 1)[1]
-        return None
-
-    @database_sync_to_async
-    def get_user_from_token(self, token):
+        await self.forward(event)
+
+    def get_query_param(self, query_string, name):
+        values = parse_qs(query_string).get(name)
+        return values[0] if values else None
+
+    def get_since_revision(self, query_string):
         try:
-            if not token:
-                return AnonymousUser()
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            user_id = payload.get("user_id")
-            return User.objects.get(id=user_id)
-        except Exception:
-            return AnonymousUser()
+            return int(self.get_query_param(query_string, "since_revision"))
+        except (TypeError, ValueError):
+            return None
+
+
+class DocumentEngineConsumer(AsyncConsumer):
+    """
+    Hosts the rooms of one shard when DOCUMENT_SYNC["SHARDS"] is set; run one
+    process per shard channel, e.g. ``manage.py runworker docsync.0``.
+    Commands are handed to their document's queue (see ``rooms.dispatch``)
+    rather than awaited here, where they would run one at a time.
+    """
+
+    async def room_join(self, message):
+        await rooms.dispatch(message)
+
+    room_edit = room_cursor = room_touch = room_resync = room_leave = room_join
+    room_flush = room_reload = room_join
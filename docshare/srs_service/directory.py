@@ -0,0 +1,112 @@
+"""
+Typeahead lookups of users by username or email prefix, for the share dialog.
+
+Both columns are matched case-insensitively through indexes on
+``lower(username)`` and ``lower(email)`` (migration 0008), so a lookup costs
+a couple of index range scans however many users there are. Results come in
+``(lower(username), id)`` order, a page at a time: ``after`` is the
+``"<lowered username>:<id>"`` of the last user on the previous page, so
+usernames differing only in case ("Bob", "bob") are never skipped.
+
+Pages are cached per prefix for ``USER_SEARCH_CACHE_TTL`` seconds in the
+Django cache (``USER_SEARCH_CACHE_ALIAS``), so the short prefixes everyone
+types first are answered without touching the database. They are shared by
+all users: the requester is removed after the cache lookup.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Lower
+
+from . import metrics
+from .conf import sync_setting
+
+User = get_user_model()
+
+# Sorts after every character in binary (SQLite) order
+_HIGHEST = "\U0010ffff"
+
+
+def _starts_with(name, prefix):
+    if not prefix:
+        return Q()
+    if connection.vendor == "postgresql":
+        # LIKE 'prefix%' is served by the text_pattern_ops indexes
+        return Q(**{f"{name}__startswith": prefix.lower()})
+    # SQLite cannot use an expression index for LIKE, but can for a range.
+    # The prefix is lowered by the database too, which in SQLite only folds
+    # ASCII letters.
+    low = Lower(Value(prefix))
+    return Q(**{f"{name}__gte": low, f"{name}__lt": Concat(low, Value(_HIGHEST))})
+
+
+def _matches(prefix, after):
+    users = User.objects.annotate(username_key=Lower("username")).alias(email_key=Lower("email"))
+    if after:
+        username_key, _, user_id = after.rpartition(":")
+        if user_id.isdigit():
+            # The range keeps the index usable; ties go on by id
+            users = users.filter(username_key__gte=username_key).filter(
+                Q(username_key__gt=username_key) | Q(id__gt=int(user_id))
+            )
+        else:
+            users = users.filter(username_key__gt=after)
+    matches = users.filter(
+        _starts_with("username_key", prefix) | _starts_with("email_key", prefix)
+    )
+    return matches.order_by("username_key", "id").values("id", "username", "username_key")
+
+
+def _cache_key(prefix, after, size):
+    digest = hashlib.blake2b(f"{prefix}\0{after}\0{size}".encode(), digest_size=16).hexdigest()
+    return f"docshare:users:{digest}"
+
+
+def _finish(page, size, exclude_id, limit):
+    more = len(page) == size
+    page = [user for user in page if user["id"] != exclude_id]
+    if len(page) > limit:
+        more = True
+    page = page[:limit]
+    next_after = f"{page[-1]['username_key']}:{page[-1]['id']}" if more and page else None
+    return [{"id": user["id"], "username": user["username"]} for user in page], next_after
+
+
+def find_users(prefix, exclude_id=None, after="", limit=20):
+    """
+    ``(users, next_after)``: up to ``limit`` users whose username or email
+    starts with ``prefix``, sorted by username, and the ``after`` cursor for
+    the next page (None on the last one).
+    """
+    prefix = prefix.strip()
+    # One spare row for the requester and one to know whether more follow
+    size = limit + 2
+    key = _cache_key(prefix, after, size)
+    cache = caches[sync_setting("USER_SEARCH_CACHE_ALIAS")]
+    page = cache.get(key)
+    if page is None:
+        metrics.incr("users.cache_misses")
+        page = list(_matches(prefix, after)[:size])
+        cache.set(key, page, sync_setting("USER_SEARCH_CACHE_TTL"))
+    else:
+        metrics.incr("users.cache_hits")
+    return _finish(page, size, exclude_id, limit)
+
+
+async def afind_users(prefix, exclude_id=None, after="", limit=20):
+    """``find_users`` for async views."""
+    prefix = prefix.strip()
+    size = limit + 2
+    key = _cache_key(prefix, after, size)
+    cache = caches[sync_setting("USER_SEARCH_CACHE_ALIAS")]
+    page = await cache.aget(key)
+    if page is None:
+        metrics.incr("users.cache_misses")
+        page = [user async for user in _matches(prefix, after)[:size]]
+        await cache.aset(key, page, sync_setting("USER_SEARCH_CACHE_TTL"))
+    else:
+        metrics.incr("users.cache_hits")
+    return _finish(page, size, exclude_id, limit)
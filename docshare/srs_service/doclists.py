@@ -0,0 +1,86 @@
+"""
+Per-user cache of document list pages, for the dashboard.
+
+Pages are cached in the Django cache (``DOCUMENT_LIST_CACHE_ALIAS``) under
+the user, the request URL and the user's list version: a counter that is
+bumped whenever something in the user's list may have changed. Bumping makes
+every cached page of that user unreachable at once; they expire after
+``DOCUMENT_LIST_CACHE_TTL`` seconds.
+
+A document's change bumps its owner and everyone it is shared with (see
+``signals``). Bulk writes send no model signals and call ``invalidate``
+themselves. Versions come from ``caching.versioned_key``.
+"""
+import hashlib
+
+from django.core.cache import caches
+
+from . import metrics
+from .caching import aversioned_key, versioned_key
+from .conf import sync_setting
+from .models import Document
+
+
+def _cache():
+    return caches[sync_setting("DOCUMENT_LIST_CACHE_ALIAS")]
+
+
+def _version_key(user_id):
+    return f"docshare:doclist:version:{user_id}"
+
+
+def _page_key(user_id, version, url):
+    digest = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+    return f"docshare:doclist:{user_id}:{version}:{digest}"
+
+
+def get_page(user_id, url):
+    """
+    ``(key, data)`` for the page at ``url``: ``data`` is the cached response
+    body or None, and ``key`` is where to ``set_page`` a fresh one. The key
+    is taken before the database is read, so a page built while the list
+    changes is stored under the outdated version.
+    """
+    cache = _cache()
+    key = _page_key(user_id, versioned_key(cache, _version_key(user_id)), url)
+    data = cache.get(key)
+    metrics.incr("doclist.cache_misses" if data is None else "doclist.cache_hits")
+    return key, data
+
+
+def set_page(key, data):
+    _cache().set(key, data, sync_setting("DOCUMENT_LIST_CACHE_TTL"))
+
+
+async def aget_page(user_id, url):
+    """``get_page`` for async views."""
+    cache = _cache()
+    key = _page_key(user_id, await aversioned_key(cache, _version_key(user_id)), url)
+    data = await cache.aget(key)
+    metrics.incr("doclist.cache_misses" if data is None else "doclist.cache_hits")
+    return key, data
+
+
+async def aset_page(key, data):
+    await _cache().aset(key, data, sync_setting("DOCUMENT_LIST_CACHE_TTL"))
+
+
+def invalidate(user_ids):
+    """Drop the cached lists of ``user_ids``."""
+    cache = _cache()
+    for user_id in set(user_ids):
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            pass  # No version, so nothing cached for this user
+
+
+def invalidate_document(document_id):
+    """Drop the cached lists of everyone who can see a document, in one query."""
+    users = set()
+    for owner_id, shared_with_id in Document.objects.filter(pk=document_id).values_list(
+        "owner_id", "shares__shared_with_id"
+    ):
+        users.update((owner_id, shared_with_id))
+    users.discard(None)
+    invalidate(users)
@@ -0,0 +1,209 @@
+"""
+RFC 6902 JSON Patch for structured (Quill / Tiptap) document content.
+
+``apply(document, patch)`` returns a new document and leaves the input alone.
+Only the containers along each touched path are copied, so applying a
+small patch to a large document costs time proportional to the path depth
+and the size of the containers on it, not the whole document.
+
+``diff(old, new)`` builds a patch between two documents, descending into the
+objects and arrays they share so the patch stays close to the size of the
+change.
+"""
+_MISSING = object()
+
+
+class InvalidPatch(ValueError):
+    """The patch is malformed or does not apply to the document."""
+
+
+def parse_pointer(pointer):
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if not isinstance(pointer, str):
+        raise InvalidPatch("Paths must be strings.")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise InvalidPatch(f"Invalid JSON Pointer {pointer!r}.")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container, token, allow_end=False):
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise InvalidPatch(f"Invalid array index {token!r}.")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise InvalidPatch(f"Array index {index} is out of range.")
+    return index
+
+
+def _child(container, token):
+    if isinstance(container, dict):
+        if token not in container:
+            raise InvalidPatch(f"Member {token!r} does not exist.")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token)]
+    raise InvalidPatch("Path goes through a value that is not an object or array.")
+
+
+def get(document, tokens):
+    for token in tokens:
+        document = _child(document, token)
+    return document
+
+
+def _shallow(value):
+    return dict(value) if isinstance(value, dict) else list(value)
+
+
+def _edit(document, tokens, change):
+    """
+    Copy the containers from the root down to the parent of ``tokens`` and
+    let ``change(parent, last_token)`` modify the copied parent in place.
+    Returns the new root.
+    """
+    if not tokens:
+        raise InvalidPatch("This operation cannot target the whole document.")
+    if not isinstance(document, (dict, list)):
+        raise InvalidPatch("Path goes through a value that is not an object or array.")
+    root = parent = _shallow(document)
+    for token in tokens[:-1]:
+        child = _child(parent, token)
+        if not isinstance(child, (dict, list)):
+            raise InvalidPatch("Path goes through a value that is not an object or array.")
+        child = _shallow(child)
+        if isinstance(parent, dict):
+            parent[token] = child
+        else:
+            parent[_index(parent, token)] = child
+        parent = child
+    change(parent, tokens[-1])
+    return root
+
+
+def _add(document, tokens, value):
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        if isinstance(parent, dict):
+            parent[token] = value
+        else:
+            parent.insert(_index(parent, token, allow_end=True), value)
+
+    return _edit(document, tokens, change)
+
+
+def _remove(document, tokens):
+    def change(parent, token):
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise InvalidPatch(f"Member {token!r} does not exist.")
+            del parent[token]
+        else:
+            del parent[_index(parent, token)]
+
+    return _edit(document, tokens, change)
+
+
+def _replace(document, tokens, value):
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise InvalidPatch(f"Member {token!r} does not exist.")
+            parent[token] = value
+        else:
+            parent[_index(parent, token)] = value
+
+    return _edit(document, tokens, change)
+
+
+def apply(document, patch):
+    """Apply the operations of ``patch`` in order; all or nothing."""
+    if not isinstance(patch, list):
+        raise InvalidPatch("A JSON Patch is an array of operations.")
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise InvalidPatch("Each patch operation must be an object.")
+        op = operation.get("op")
+        tokens = parse_pointer(operation.get("path"))
+        value = operation.get("value", _MISSING)
+        if op in ("add", "replace", "test") and value is _MISSING:
+            raise InvalidPatch(f"'{op}' needs a value.")
+
+        if op == "add":
+            document = _add(document, tokens, value)
+        elif op == "remove":
+            document = _remove(document, tokens)
+        elif op == "replace":
+            document = _replace(document, tokens, value)
+        elif op in ("move", "copy"):
+            source = parse_pointer(operation.get("from"))
+            if op == "move" and tokens[:len(source)] == source and tokens != source:
+                raise InvalidPatch("Cannot move a value into one of its own children.")
+            # Values are never modified in place, so a copy can share them
+            value = get(document, source)
+            if op == "move":
+                document = _remove(document, source)
+            document = _add(document, tokens, value)
+        elif op == "test":
+            if get(document, tokens) != value:
+                raise InvalidPatch(f"Test failed at {operation['path']!r}.")
+        else:
+            raise InvalidPatch(f"Unknown patch operation {op!r}.")
+    return document
+
+
+def _escape(token):
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def diff(old, new, path=""):
+    """
+    A patch turning ``old`` into ``new``. Arrays are compared by their common
+    head and tail, so inserting or removing a run of items (a paragraph, a
+    Quill op) produces only those adds and removes.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = [
+            {"op": "remove", "path": f"{path}/{_escape(key)}"} for key in old if key not in new
+        ]
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                patch.extend(diff(old[key], value, child))
+            else:
+                patch.append({"op": "add", "path": child, "value": value})
+        return patch
+    if isinstance(old, list) and isinstance(new, list):
+        limit = min(len(old), len(new))
+        head = 0
+        while head < limit and old[head] == new[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old[len(old) - 1 - tail] == new[len(new) - 1 - tail]:
+            tail += 1
+        old_middle = old[head:len(old) - tail]
+        new_middle = new[head:len(new) - tail]
+        paired = min(len(old_middle), len(new_middle))
+        patch = []
+        for offset in range(paired):
+            patch.extend(diff(old_middle[offset], new_middle[offset], f"{path}/{head + offset}"))
+        patch.extend(
+            {"op": "remove", "path": f"{path}/{head + paired}"}
+            for _ in range(len(old_middle) - paired)
+        )
+        patch.extend(
+            {"op": "add", "path": f"{path}/{head + offset}", "value": new_middle[offset]}
+            for offset in range(paired, len(new_middle))
+        )
+        return patch
+    return [{"op": "replace", "path": path, "value": new}]
@@ -0,0 +1,55 @@
+"""
+Microbenchmark for room broadcasts: serialization CPU per edit fanned out to
+rooms of different sizes, encoding the frame once per recipient (the old
+handlers) versus once per broadcast.
+
+Channel-layer transport is left out: it is the same for both and depends on
+the backend in use.
+
+    python manage.py bench_broadcast --sizes 1 10 50 200 --rounds 500
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from srs_service import wire
+
+
+class Command(BaseCommand):
+    help = "Measure serialization CPU per broadcast vs. room size."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 200])
+        parser.add_argument("--rounds", type=int, default=500)
+        parser.add_argument("--op-size", type=int, default=64, help="Characters inserted per edit")
+
+    def handle(self, *args, **options):
+        op = [1200, "x" * options["op_size"], -3]
+        rounds = options["rounds"]
+        self.stdout.write(
+            f"encoder: {'orjson' if wire.orjson else 'json'}\n"
+            f"{'members':>8} {'per-member us':>14} {'serialize-once us':>18} {'speedup':>8}"
+        )
+        for size in options["sizes"]:
+            before = self._measure(rounds, lambda payload: self._per_member(payload, size), op)
+            after = self._measure(rounds, lambda payload: self._once(payload, size), op)
+            self.stdout.write(
+                f"{size:>8} {before * 1e6:>14.1f} {after * 1e6:>18.1f} {before / after:>7.2f}x"
+            )
+
+    def _measure(self, rounds, broadcast, op):
+        start = time.process_time()
+        for revision in range(rounds):
+            broadcast({"type": "op", "op": op, "revision": revision, "username": "bench", "color": "#f94144"})
+        return (time.process_time() - start) / rounds
+
+    def _per_member(self, payload, size):
+        event = {"type": "document.message", "sender": "x", **payload}
+        for _ in range(size):
+            json.dumps({key: value for key, value in event.items() if key != "sender"})
+
+    def _once(self, payload, size):
+        event = wire.group_event("document.message", payload, sender="x", revision=payload["revision"])
+        for _ in range(size):
+            event["frames"]["json"]
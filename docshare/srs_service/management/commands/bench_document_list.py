@@ -0,0 +1,116 @@
+"""
+Benchmark for the document list query as a user's share count grows:
+collecting accessible ids into Python and filtering ``id__in=[...]`` (the old
+``DocumentViewSet.get_queryset``) versus ``Document.objects.accessible_to``.
+
+Seeds a fixture of bench users, documents and shares on first run (reused
+afterwards), plus one probe user per ``--probe`` share count, then times
+fetching the first page of each probe user's list.
+
+    python manage.py bench_document_list --documents 100000 --shares 500000
+    python manage.py bench_document_list --cleanup
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+PREFIX = "bench_list_"
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = "Measure document list latency vs. the number of documents shared with a user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=100_000)
+        parser.add_argument("--shares", type=int, default=500_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--probe", type=int, nargs="+", default=[10, 100, 1000, 10_000])
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--cleanup", action="store_true", help="Delete the fixture and exit")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            User.objects.filter(username__startswith=PREFIX).delete()
+            self.stdout.write("Removed benchmark fixture.")
+            return
+
+        self._seed(options["documents"], options["shares"], options["users"])
+        document_ids = list(
+            Document.objects.filter(owner__username__startswith=PREFIX).values_list("id", flat=True)
+        )
+
+        page = options["page_size"]
+        self.stdout.write(f"{'shared docs':>12} {'id__in ms':>10} {'single query ms':>16}")
+        for count in options["probe"]:
+            user = self._probe_user(count, document_ids)
+            before = self._measure(options["repeat"], lambda: self._old_page(user, page))
+            after = self._measure(options["repeat"], lambda: list(
+                Document.objects.accessible_to(user).values_list("id", "title")[:page]
+            ))
+            self.stdout.write(f"{count:>12} {before * 1e3:>10.2f} {after * 1e3:>16.2f}")
+
+    def _old_page(self, user, page):
+        owned = Document.objects.filter(owner=user).values_list("id", flat=True)
+        shared = DocumentShare.objects.filter(shared_with=user).values_list("document_id", flat=True)
+        ids = list(owned) + list(shared)
+        return list(Document.objects.filter(id__in=ids).values_list("id", "title")[:page])
+
+    def _measure(self, repeat, query):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    def _seed(self, documents, shares, users):
+        if User.objects.filter(username=f"{PREFIX}0").exists():
+            return
+        self.stdout.write(f"Seeding {documents} documents and {shares} shares for {users} users...")
+        rng = random.Random(0)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=f"{PREFIX}{index}") for index in range(users)], batch_size=BATCH
+            )
+            user_ids = list(
+                User.objects.filter(username__startswith=PREFIX).values_list("id", flat=True)
+            )
+            Document.objects.bulk_create(
+                [
+                    Document(title=f"Document {index}", content="", owner_id=rng.choice(user_ids))
+                    for index in range(documents)
+                ],
+                batch_size=BATCH,
+            )
+            document_ids = list(
+                Document.objects.filter(owner_id__in=user_ids).values_list("id", flat=True)
+            )
+            pairs = set()
+            while len(pairs) < min(shares, len(document_ids) * len(user_ids)):
+                pairs.add((rng.choice(document_ids), rng.choice(user_ids)))
+            DocumentShare.objects.bulk_create(
+                [DocumentShare(document_id=doc, shared_with_id=user) for doc, user in pairs],
+                batch_size=BATCH,
+            )
+
+    def _probe_user(self, count, document_ids):
+        user, created = User.objects.get_or_create(username=f"{PREFIX}probe_{count}")
+        if created:
+            DocumentShare.objects.bulk_create(
+                [
+                    DocumentShare(document_id=doc, shared_with=user)
+                    for doc in random.Random(count).sample(document_ids, min(count, len(document_ids)))
+                ],
+                batch_size=BATCH,
+            )
+        return user
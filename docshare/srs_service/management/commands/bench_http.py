@@ -0,0 +1,126 @@
+"""
+Load test for the read endpoints: DRF views (``/api/...``) versus their
+async-native versions (``/api/async/...``), driven through Django's ASGI
+handler by ``--concurrency`` clients at once. ``--background`` tasks make
+database calls through ``database_sync_to_async`` meanwhile, as WebSocket
+consumers do.
+
+Seeds a bench user with documents, shares and a user directory on first run
+(reused afterwards).
+
+    python manage.py bench_http --concurrency 50 --requests 2000 --background 10
+    python manage.py bench_http --cleanup
+"""
+import asyncio
+import statistics
+import time
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+PREFIX = "bench_http_"
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = "Compare throughput and tail latency of the sync and async read endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=2000, help="Per endpoint")
+        parser.add_argument("--background", type=int, default=10, help="Concurrent WebSocket-style DB loops")
+        parser.add_argument("--documents", type=int, default=200)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--cleanup", action="store_true", help="Delete the fixture and exit")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            User.objects.filter(username__startswith=PREFIX).delete()
+            self.stdout.write("Removed benchmark fixture.")
+            return
+
+        user, document_id = self._seed(options["documents"], options["users"])
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        endpoints = {
+            "list": "documents/",
+            "detail": f"documents/{document_id}/",
+            "shares": "shares/",
+            "users": f"users/?q={PREFIX}1",
+        }
+        self.stdout.write(
+            f"{'endpoint':>9} {'path':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for name, path in endpoints.items():
+            for label, prefix in (("sync", "/api/"), ("async", "/api/async/")):
+                # The test client always sends Host: testserver
+                with override_settings(ALLOWED_HOSTS=["testserver"]):
+                    timings, elapsed = asyncio.run(self._load(
+                        prefix + path, headers, options["requests"], options["concurrency"],
+                        options["background"],
+                    ))
+                timings.sort()
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(
+                    f"{name:>9} {label:>6} {len(timings) / elapsed:>8.0f} "
+                    f"{statistics.median(timings) * 1e3:>8.2f} {p99 * 1e3:>8.2f} {timings[-1] * 1e3:>8.2f}"
+                )
+
+    async def _load(self, url, headers, requests, concurrency, background):
+        client = AsyncClient()
+        remaining = iter(range(requests))
+        timings = []
+        done = asyncio.Event()
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} answered {response.status_code}")
+
+        @database_sync_to_async
+        def consumer_query():
+            return Document.objects.filter(pk__gt=0).values("revision")[:1].first()
+
+        async def consumer():
+            while not done.is_set():
+                await consumer_query()
+
+        await client.get(url, headers=headers)  # warm caches and connections
+        noise = [asyncio.ensure_future(consumer()) for _ in range(background)]
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*noise)
+        return timings, elapsed
+
+    def _seed(self, documents, users):
+        user = User.objects.filter(username=f"{PREFIX}owner").first()
+        if user is None:
+            self.stdout.write(f"Seeding {documents} documents and {users} users...")
+            User.objects.bulk_create(
+                [User(username=f"{PREFIX}{index}", email=f"{PREFIX}{index}@example.com")
+                 for index in range(users)],
+                batch_size=BATCH,
+            )
+            user = User.objects.create(username=f"{PREFIX}owner")
+            others = list(User.objects.filter(username__startswith=PREFIX).exclude(pk=user.pk)[:20])
+            created = Document.objects.bulk_create(
+                [Document(title=f"Document {index}", content="lorem ipsum " * 50, owner=user)
+                 for index in range(documents)],
+                batch_size=BATCH,
+            )
+            DocumentShare.objects.bulk_create(
+                [DocumentShare(document=created[0], shared_with=other) for other in others]
+            )
+        document_id = Document.objects.filter(owner=user).order_by("pk").values_list("pk", flat=True)[0]
+        return user, document_id
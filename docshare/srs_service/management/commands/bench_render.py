@@ -0,0 +1,93 @@
+"""
+Benchmark for ``content_html`` rendering on large generated documents:
+a cold render (cache emptied first) versus a cache hit, which still pays
+for hashing the content.
+
+    python manage.py bench_render --nodes 10000 50000 --rounds 20
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from srs_service import rendering
+
+
+def tiptap_document(nodes):
+    """Roughly ``nodes`` nodes of headings, lists and marked-up paragraphs."""
+    content = []
+    count = 0
+    while count < nodes:
+        content.append({"type": "heading", "attrs": {"level": 2}, "content": [
+            {"type": "text", "text": f"Section {count}"},
+        ]})
+        content.append({"type": "paragraph", "content": [
+            {"type": "text", "text": "Some "},
+            {"type": "text", "text": "bold", "marks": [{"type": "bold"}]},
+            {"type": "text", "text": " and "},
+            {"type": "text", "text": "linked", "marks": [
+                {"type": "link", "attrs": {"href": "https://example.com/?a=1&b=2"}},
+            ]},
+            {"type": "text", "text": " text <with> markup & entities."},
+        ]})
+        content.append({"type": "bulletList", "content": [
+            {"type": "listItem", "content": [
+                {"type": "paragraph", "content": [{"type": "text", "text": f"Item {item}"}]},
+            ]}
+            for item in range(3)
+        ]})
+        count += 22
+    return {"type": "doc", "content": content}
+
+
+def quill_delta(nodes):
+    """Roughly ``nodes`` delta operations of the same mix."""
+    ops = []
+    while len(ops) < nodes:
+        ops += [
+            {"insert": f"Section {len(ops)}"},
+            {"insert": "\n", "attributes": {"header": 2}},
+            {"insert": "Some "},
+            {"insert": "bold", "attributes": {"bold": True}},
+            {"insert": " and "},
+            {"insert": "linked", "attributes": {"link": "https://example.com/?a=1&b=2"}},
+            {"insert": " text <with> markup & entities.\n"},
+            {"insert": "Item one"},
+            {"insert": "\n", "attributes": {"list": "bullet"}},
+            {"insert": "Item two"},
+            {"insert": "\n", "attributes": {"list": "bullet"}},
+        ]
+    return {"ops": ops}
+
+
+class Command(BaseCommand):
+    help = "Measure content_html render time, cold and cached."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nodes", type=int, nargs="+", default=[10_000, 50_000])
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        self.stdout.write(
+            f"{'format':>8} {'nodes':>7} {'html KB':>8} {'cold ms':>9} {'hit ms':>8} {'speedup':>8}"
+        )
+        for nodes in options["nodes"]:
+            for name, content in (("tiptap", tiptap_document(nodes)), ("quill", quill_delta(nodes))):
+                html = rendering.render_html(content)
+                cold = self._measure(rounds, content, clear=True)
+                hit = self._measure(rounds, content, clear=False)
+                self.stdout.write(
+                    f"{name:>8} {nodes:>7} {len(html) / 1024:>8.0f} "
+                    f"{cold * 1e3:>9.2f} {hit * 1e3:>8.2f} {cold / hit:>7.1f}x"
+                )
+
+    def _measure(self, rounds, content, clear):
+        timings = []
+        for _ in range(rounds):
+            if clear:
+                rendering._rendered.clear()
+            start = time.perf_counter()
+            rendering.render_html(content)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
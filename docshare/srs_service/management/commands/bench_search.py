@@ -0,0 +1,146 @@
+"""
+Benchmark for document search: the FTS index (``search.search``) versus
+unindexed ``icontains`` matching, for users who can see few or many documents
+and for common, rare and multi-word queries.
+
+Seeds bench users and documents of generated text on first run (reused
+afterwards) and indexes them, plus one probe user per ``--probe`` share count.
+
+    python manage.py bench_search --documents 1000000
+    python manage.py bench_search --cleanup
+"""
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from srs_service import search
+from srs_service.models import Document, DocumentOperation, DocumentShare, DocumentVersion
+
+User = get_user_model()
+
+PREFIX = "bench_search_"
+BATCH = 5000
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "sa", "do", "fu", "gi", "ho", "ju"]
+
+
+def vocabulary(size):
+    """``size`` distinct made-up words, shortest first."""
+    words = list(SYLLABLES)
+    for word in words:
+        if len(words) >= size:
+            break
+        words.extend(word + syllable for syllable in SYLLABLES)
+    return words[:size]
+
+
+class Command(BaseCommand):
+    help = "Measure search latency, FTS index vs. unindexed matching."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--words", type=int, default=40, help="Words per document")
+        parser.add_argument("--probe", type=int, nargs="+", default=[100, 10_000])
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--cleanup", action="store_true", help="Delete the fixture and exit")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            self._cleanup()
+            self.stdout.write("Removed benchmark fixture.")
+            return
+
+        words = vocabulary(5000)
+        self._seed(options["documents"], options["users"], options["words"], words)
+        document_ids = list(
+            Document.objects.filter(owner__username__startswith=PREFIX).values_list("id", flat=True)
+        )
+        queries = {
+            "common": words[0],
+            "mid": words[100],
+            "rare": words[3000],
+            "two words": f"{words[5]} {words[300]}",
+        }
+
+        limit = options["limit"]
+        fts = search.get_backend()
+        scan = search.SearchBackend()
+        self.stdout.write(f"{'shared docs':>12} {'query':>10} {'hits':>6} {'fts ms':>9} {'icontains ms':>13}")
+        for count in options["probe"]:
+            user = self._probe_user(count, document_ids)
+            documents = Document.objects.accessible_to(user)
+            for name, query in queries.items():
+                hits = len(fts.search(query, documents, limit))
+                indexed = self._measure(options["repeat"], lambda: fts.search(query, documents, limit))
+                unindexed = self._measure(
+                    max(1, options["repeat"] // 5), lambda: scan.search(query, documents, limit)
+                )
+                self.stdout.write(
+                    f"{count:>12} {name:>10} {hits:>6} {indexed * 1e3:>9.2f} {unindexed * 1e3:>13.2f}"
+                )
+
+    def _measure(self, repeat, query):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    def _seed(self, documents, users, length, words):
+        if User.objects.filter(username=f"{PREFIX}0").exists():
+            return
+        self.stdout.write(f"Seeding {documents} documents for {users} users...")
+        rng = random.Random(0)
+        # Zipf-like word frequencies, as in real text
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+        start = time.perf_counter()
+        User.objects.bulk_create(
+            [User(username=f"{PREFIX}{index}") for index in range(users)], batch_size=BATCH
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=PREFIX).values_list("id", flat=True)
+        )
+        for offset in range(0, documents, BATCH):
+            Document.objects.bulk_create([
+                Document(
+                    title=" ".join(rng.choices(words, cum_weights=weights, k=3)).capitalize(),
+                    content=" ".join(rng.choices(words, cum_weights=weights, k=length)),
+                    owner_id=rng.choice(user_ids),
+                )
+                for _ in range(min(BATCH, documents - offset))
+            ])
+        self.stdout.write(f"  seeded in {time.perf_counter() - start:.0f}s, indexing...")
+        # bulk_create sends no signals, so index everything in one pass
+        start = time.perf_counter()
+        search.rebuild(batch_size=BATCH)
+        self.stdout.write(f"  indexed in {time.perf_counter() - start:.0f}s")
+
+    def _cleanup(self):
+        # Deleting a million documents one signal at a time takes hours, so
+        # delete the rows directly and reindex what is left
+        documents = Document.objects.filter(owner__username__startswith=PREFIX)
+        with transaction.atomic():
+            for model in (DocumentShare, DocumentOperation, DocumentVersion):
+                model.objects.filter(document__in=documents)._raw_delete(model.objects.db)
+            documents._raw_delete(documents.db)
+            User.objects.filter(username__startswith=PREFIX).delete()
+        search.rebuild()
+
+    def _probe_user(self, count, document_ids):
+        user, created = User.objects.get_or_create(username=f"{PREFIX}probe_{count}")
+        if created:
+            DocumentShare.objects.bulk_create(
+                [
+                    DocumentShare(document_id=doc, shared_with=user)
+                    for doc in random.Random(count).sample(document_ids, min(count, len(document_ids)))
+                ],
+                batch_size=BATCH,
+            )
+        return user
@@ -0,0 +1,85 @@
+"""
+Benchmark for WebSocket authentication: how many connects per second can be
+authenticated by decoding the token and loading the user on every connect
+(the old consumer) versus through JWTAuthMiddleware, with a fresh token per
+connect (cold) and with one token reconnecting over and over (warm).
+
+Connects are pushed through the auth layer with a no-op inner application,
+so the numbers cover token checks, thread hops and database reads only.
+
+    python manage.py bench_ws_connect --connects 2000 --concurrency 50
+"""
+import asyncio
+import time
+
+import jwt
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from srs_service import middleware
+
+User = get_user_model()
+
+
+@database_sync_to_async
+def _legacy_user(token):
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    return User.objects.get(id=payload.get("user_id"))
+
+
+class Command(BaseCommand):
+    help = "Measure authenticated WebSocket connects per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connects", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username="bench_ws_connect")
+        try:
+            tokens = [str(AccessToken.for_user(user)) for _ in range(options["connects"])]
+            asyncio.run(self._run(tokens, options["concurrency"]))
+        finally:
+            if created:
+                user.delete()
+
+    async def _run(self, tokens, concurrency):
+        async def inner(scope, receive, send):
+            assert scope["user"].is_authenticated
+
+        app = middleware.JWTAuthMiddlewareStack(inner)
+
+        def connect(token):
+            return app({"type": "websocket", "query_string": f"token={token}".encode()}, None, None)
+
+        async def legacy(index):
+            await _legacy_user(tokens[index])
+
+        async def cold(index):
+            await connect(tokens[index])
+
+        async def warm(index):
+            await connect(tokens[0])
+
+        self.stdout.write(f"{'path':>24} {'connects/s':>12}")
+        for label, attempt in (
+            ("decode + DB per connect", legacy),
+            ("middleware, cold cache", cold),
+            ("middleware, warm cache", warm),
+        ):
+            rate = await self._measure(attempt, len(tokens), concurrency)
+            self.stdout.write(f"{label:>24} {rate:>12.0f}")
+
+    async def _measure(self, attempt, connects, concurrency):
+        remaining = iter(range(connects))
+
+        async def client():
+            for index in remaining:
+                await attempt(index)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return connects / (time.perf_counter() - start)
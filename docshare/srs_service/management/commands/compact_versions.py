@@ -0,0 +1,25 @@
+"""
+Apply the version history retention settings: keep every version from the
+last VERSION_DETAIL_DAYS days, one a day before that, none older than
+VERSION_RETENTION_DAYS (when set), and drop the operation log entries the
+older versions make redundant. Run it daily, e.g. from cron.
+
+    python manage.py compact_versions
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from srs_service import versions
+
+
+class Command(BaseCommand):
+    help = "Thin out old document versions and prune the operation log."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        versions_deleted, operations_deleted = versions.compact()
+        self.stdout.write(
+            f"Deleted {versions_deleted} versions and {operations_deleted} logged operations "
+            f"in {time.perf_counter() - start:.1f}s."
+        )
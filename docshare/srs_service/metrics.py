@@ -0,0 +1,18 @@
+"""
+Process-local counters for the realtime layer, served at ``/api/metrics/``.
+"""
+import threading
+from collections import Counter
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    with _lock:
+        return dict(sorted(_counters.items()))
@@ -0,0 +1,138 @@
+"""
+WebSocket authentication from the ``?token=`` JWT.
+
+The access token is verified in process (signature, expiry, token type), and
+the user it names is resolved once and cached by the token's ``jti`` for up
+to ``AUTH_CACHE_TTL`` seconds, never past the token's own expiry; concurrent
+connects with one token share a single lookup. Reconnects
+with the same token are then authenticated without touching the database.
+
+The async REST views share the cache but accept entries no older than
+``HTTP_AUTH_CACHE_TTL``. Deactivating or deleting a user drops their
+entries in the process that made the change (see ``signals``); other
+processes notice within those limits.
+"""
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.db.models import Q
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics
+from .caching import TTLCache
+from .conf import sync_setting
+
+User = get_user_model()
+
+_users = TTLCache(sync_setting("AUTH_CACHE_SIZE"), sync_setting("AUTH_CACHE_TTL"))
+_loading = {}
+
+
+class SocketUser:
+    """The cached summary of an authenticated user, standing in for ``User``."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, is_staff=False, is_superuser=False, permissions=()):
+        self.id = self.pk = id
+        self.username = username
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.permissions = frozenset(permissions)
+
+    def has_perm(self, perm):
+        return self.is_superuser or perm in self.permissions
+
+    def __str__(self):
+        return self.username
+
+
+@database_sync_to_async
+def _load_user(user_id):
+    row = User.objects.filter(pk=user_id, is_active=True).values(
+        "id", "username", "is_staff", "is_superuser"
+    ).first()
+    if row is None:
+        return None
+    permissions = ()
+    if not row["is_superuser"]:
+        # What ModelBackend.get_all_permissions() finds, in one query
+        permissions = {
+            f"{app_label}.{codename}"
+            for app_label, codename in Permission.objects.filter(
+                Q(user=user_id) | Q(group__user=user_id)
+            ).values_list("content_type__app_label", "codename")
+        }
+    return SocketUser(
+        row["id"],
+        row["username"],
+        is_staff=row["is_staff"],
+        is_superuser=row["is_superuser"],
+        permissions=permissions,
+    )
+
+
+def _key(user_id, jti):
+    return (str(user_id), jti)
+
+
+def forget_user(user_id):
+    """Drop the cached lookups of every token issued to ``user_id``."""
+    user_id = str(user_id)
+    _users.pop_matching(lambda key: key[0] == user_id)
+
+
+async def get_user(raw_token, max_age=None):
+    """
+    Resolve a raw access token to a ``SocketUser``, or None if it is not
+    valid. ``max_age`` limits how many seconds ago a cached lookup was made.
+    """
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    jti = token.get(api_settings.JTI_CLAIM)
+    key = _key(token.get(api_settings.USER_ID_CLAIM), jti)
+    cached = _users.get(key) if jti else None
+    if cached is not None and (max_age is None or time.monotonic() - cached[0] <= max_age):
+        metrics.incr("auth.cache_hits")
+        return cached[1]
+
+    metrics.incr("auth.cache_misses")
+    if not jti:
+        return await _load_user(token.get(api_settings.USER_ID_CLAIM))
+    # Sockets reconnecting together with one token share a single lookup
+    task = _loading.get(jti)
+    if task is None:
+        task = _loading[jti] = asyncio.ensure_future(
+            _load_user(token.get(api_settings.USER_ID_CLAIM))
+        )
+        task.add_done_callback(lambda _: _loading.pop(jti, None))
+    loaded_at = time.monotonic()
+    user = await asyncio.shield(task)
+    if user is not None:
+        _users.set(key, (loaded_at, user), ttl=token["exp"] - time.time())
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populate ``scope["user"]`` from the connection's ``token`` query parameter."""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        values = parse_qs(scope.get("query_string", b"").decode()).get("token")
+        user = await get_user(values[0]) if values else None
+        scope["user"] = user or AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('srs_service', '0003_alter_document_options_alter_documentshare_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, help_text='Number of operations applied to the document'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='snapshot_revision',
+            field=models.PositiveIntegerField(default=0, help_text='Revision that `content` reflects; later operations are replayed on load'),
+        ),
+        migrations.CreateModel(
+            name='DocumentOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveIntegerField(help_text='Revision this operation produced')),
+                ('kind', models.CharField(choices=[('text', 'Text operation'), ('replace', 'Full replacement')], default='text', max_length=16)),
+                ('operation', models.JSONField(help_text='Text operation, or the new content for replacements')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='document_operations', to=settings.AUTH_USER_MODEL)),
+                ('document', models.ForeignKey(help_text='The document this operation was applied to', on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='srs_service.document')),
+            ],
+            options={
+                'ordering': ['revision'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'revision'), name='unique_document_revision')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('srs_service', '0004_document_operation_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentshare',
+            index=models.Index(fields=['shared_with', 'document'], name='share_user_document_idx'),
+        ),
+    ]
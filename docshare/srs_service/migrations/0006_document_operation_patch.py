@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('srs_service', '0005_documentshare_user_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentoperation',
+            name='kind',
+            field=models.CharField(choices=[('text', 'Text operation'), ('patch', 'JSON Patch'), ('replace', 'Full replacement')], default='text', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='documentoperation',
+            name='operation',
+            field=models.JSONField(help_text='Text operation, JSON Patch, or the new content for replacements'),
+        ),
+    ]
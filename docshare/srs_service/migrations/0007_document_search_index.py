@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from srs_service import search
+
+    search.BACKENDS.get(schema_editor.connection.vendor, search.SearchBackend)().install(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    from srs_service import search
+
+    search.BACKENDS.get(schema_editor.connection.vendor, search.SearchBackend)().uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+    """
+    Create the full-text search table. Existing documents are indexed with
+    ``manage.py rebuild_search_index``.
+    """
+
+    dependencies = [
+        ('srs_service', '0006_document_operation_patch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations
+
+COLUMNS = ("username", "email")
+VENDORS = ("sqlite", "postgresql")
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in VENDORS:
+        return
+    table = schema_editor.quote_name(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+    # PostgreSQL only uses an index for LIKE 'prefix%' with text_pattern_ops
+    opclass = " text_pattern_ops" if schema_editor.connection.vendor == "postgresql" else ""
+    for column in COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS user_{column}_lower_idx "
+            f"ON {table} (lower({schema_editor.quote_name(column)}){opclass})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in VENDORS:
+        return
+    for column in COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS user_{column}_lower_idx")
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive prefix indexes on the user model for the typeahead in
+    ``directory``. The user model belongs to another app, so they are
+    created with SQL rather than ``Meta.indexes``.
+    """
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('srs_service', '0007_document_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('srs_service', '0008_user_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveIntegerField(help_text='Document revision this version reflects')),
+                ('kind', models.CharField(choices=[('replace', 'Keyframe'), ('text', 'Text operation delta'), ('patch', 'JSON Patch delta')], default='replace', max_length=16)),
+                ('data', models.JSONField(blank=True, help_text='The content for keyframes, otherwise the change from the previous version', null=True)),
+                ('depth', models.PositiveIntegerField(default=0, help_text='Deltas between this version and its keyframe (0 for keyframes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(help_text='The document this is a version of', on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='srs_service.document')),
+            ],
+            options={
+                'ordering': ['revision'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'revision'), name='unique_document_version')],
+            },
+        ),
+    ]
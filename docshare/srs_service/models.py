@@ -3,6 +3,43 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+
+class DocumentQuerySet(models.QuerySet):
+    def accessible_to(self, user):
+        """
+        Documents ``user`` owns or that are shared with them, in a single query.
+
+        The ids come from a UNION of two index lookups rather than an OR, which
+        would make the database scan every document.
+        """
+        owned = Document.objects.filter(owner=user).values("pk").order_by()
+        shared = DocumentShare.objects.filter(shared_with=user).values("document_id").order_by()
+        return self.filter(pk__in=owned.union(shared, all=True))
+
+    def summaries(self):
+        """Only what the document list shows; content stays in the database."""
+        return self.select_related("owner").only(
+            "id", "title", "updated_at", "owner__id", "owner__username"
+        ).annotate(
+            is_shared=models.Exists(DocumentShare.objects.filter(document=models.OuterRef("pk")))
+        )
+
+    def with_details(self):
+        """Everything ``DocumentSerializer`` reads, in a fixed number of queries."""
+        return self.select_related("owner").annotate(
+            is_shared=models.Exists(DocumentShare.objects.filter(document=models.OuterRef("pk")))
+        ).prefetch_related(
+            models.Prefetch("shares", queryset=DocumentShare.objects.select_related("shared_with")),
+            models.Prefetch(
+                "operations",
+                queryset=DocumentOperation.objects.filter(
+                    revision__gt=models.F("document__snapshot_revision")
+                ).only("document", "revision", "kind", "operation"),
+                to_attr="trailing_operations",
+            ),
+        )
+
+
 class Document(models.Model):
     title = models.CharField(max_length=255)
     content = models.JSONField(
@@ -16,9 +53,19 @@ class Document(models.Model):
         related_name="documents",
         help_text="The creator of the document"
     )
+    revision = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of operations applied to the document"
+    )
+    snapshot_revision = models.PositiveIntegerField(
+        default=0,
+        help_text="Revision that `content` reflects; later operations are replayed on load"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DocumentQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -26,6 +73,86 @@ class Document(models.Model):
         ordering = ['-updated_at']  # Optional: show most recently updated docs first
 
 
+class DocumentOperation(models.Model):
+    TEXT = "text"
+    PATCH = "patch"
+    REPLACE = "replace"
+    KIND_CHOICES = [
+        (TEXT, "Text operation"),
+        (PATCH, "JSON Patch"),
+        (REPLACE, "Full replacement"),
+    ]
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="operations",
+        help_text="The document this operation was applied to"
+    )
+    revision = models.PositiveIntegerField(help_text="Revision this operation produced")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=TEXT)
+    operation = models.JSONField(
+        help_text="Text operation, JSON Patch, or the new content for replacements"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="document_operations",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['revision']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'revision'], name='unique_document_revision'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_id}@{self.revision}"
+
+
+class DocumentVersion(models.Model):
+    """
+    A stored version of a document's content, for its history: a keyframe
+    with the full content, or a delta from the previous stored version.
+    """
+    KIND_CHOICES = [
+        (DocumentOperation.REPLACE, "Keyframe"),
+        (DocumentOperation.TEXT, "Text operation delta"),
+        (DocumentOperation.PATCH, "JSON Patch delta"),
+    ]
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="versions",
+        help_text="The document this is a version of"
+    )
+    revision = models.PositiveIntegerField(help_text="Document revision this version reflects")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=DocumentOperation.REPLACE)
+    data = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="The content for keyframes, otherwise the change from the previous version"
+    )
+    depth = models.PositiveIntegerField(
+        default=0,
+        help_text="Deltas between this version and its keyframe (0 for keyframes)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['revision']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'revision'], name='unique_document_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_id}@{self.revision}"
+
+
 class DocumentShare(models.Model):
     document = models.ForeignKey(
         Document,
@@ -44,6 +171,10 @@ class DocumentShare(models.Model):
 
     class Meta:
         unique_together = ('document', 'shared_with')
+        indexes = [
+            # "Shared with me" lookups; unique_together covers (document, shared_with)
+            models.Index(fields=['shared_with', 'document'], name='share_user_document_idx'),
+        ]
         verbose_name = "Shared Document"
         verbose_name_plural = "Shared Documents"
 
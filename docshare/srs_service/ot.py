@@ -0,0 +1,250 @@
+"""
+Operational transformation for plain-text documents.
+
+An operation is a compact JSON list of components walked left to right over
+the document:
+
+    * a positive int retains that many characters,
+    * a str inserts that text,
+    * a negative int deletes that many characters.
+
+e.g. ``[5, "abc", -2, 10]`` keeps 5 chars, inserts "abc", drops 2 and keeps the
+remaining 10. Lengths are counted in Unicode code points.
+"""
+
+
+class InvalidOperation(ValueError):
+    pass
+
+
+def _is_retain(component):
+    return isinstance(component, int) and not isinstance(component, bool) and component > 0
+
+
+def _is_delete(component):
+    return isinstance(component, int) and not isinstance(component, bool) and component < 0
+
+
+def _is_insert(component):
+    return isinstance(component, str)
+
+
+def _push(op, component):
+    """Append a component to ``op``, merging it with the previous one where possible."""
+    if component == 0 or component == "":
+        return
+    if op:
+        last = op[-1]
+        if _is_retain(component) and _is_retain(last):
+            op[-1] = last + component
+            return
+        if _is_delete(component) and _is_delete(last):
+            op[-1] = last + component
+            return
+        if _is_insert(component):
+            if _is_insert(last):
+                op[-1] = last + component
+                return
+            # Keep inserts ahead of deletes so equal edits have one canonical form
+            if _is_delete(last):
+                if len(op) > 1 and _is_insert(op[-2]):
+                    op[-2] = op[-2] + component
+                else:
+                    op.insert(len(op) - 1, component)
+                return
+    op.append(component)
+
+
+def _trim(op):
+    """Drop a trailing retain, which apply() already implies."""
+    if op and _is_retain(op[-1]):
+        op.pop()
+    return op
+
+
+def normalize(op):
+    """Validate ``op`` and return it in canonical (merged, trimmed) form."""
+    if not isinstance(op, list):
+        raise InvalidOperation("Operation must be a list.")
+    result = []
+    for component in op:
+        if not (_is_retain(component) or _is_delete(component) or _is_insert(component)):
+            raise InvalidOperation(f"Invalid operation component: {component!r}")
+        _push(result, component)
+    return _trim(result)
+
+
+def base_length(op):
+    """Length of the document ``op`` can be applied to."""
+    return sum(c if _is_retain(c) else -c if _is_delete(c) else 0 for c in op)
+
+
+def target_length(op):
+    """Length of the document after ``op`` is applied."""
+    return sum(c if _is_retain(c) else len(c) if _is_insert(c) else 0 for c in op)
+
+
+def is_noop(op):
+    return all(_is_retain(c) for c in op)
+
+
+def apply(text, op):
+    """Apply ``op`` to ``text``. Unlisted trailing characters are retained."""
+    length = base_length(op)
+    if length > len(text):
+        raise InvalidOperation(
+            f"Operation spans {length} characters but the document has {len(text)}."
+        )
+    parts = []
+    index = 0
+    for component in op:
+        if _is_retain(component):
+            parts.append(text[index:index + component])
+            index += component
+        elif _is_insert(component):
+            parts.append(component)
+        else:
+            index -= component
+    parts.append(text[index:])
+    return "".join(parts)
+
+
+def compose(a, b):
+    """Return a single operation equivalent to applying ``a`` then ``b``."""
+    a, b = list(a), list(b)
+    result = []
+    i = j = 0
+    ca = a[0] if a else None
+    cb = b[0] if b else None
+
+    while ca is not None or cb is not None:
+        if _is_delete(ca):
+            _push(result, ca)
+            i += 1
+            ca = a[i] if i < len(a) else None
+            continue
+        if _is_insert(cb):
+            _push(result, cb)
+            j += 1
+            cb = b[j] if j < len(b) else None
+            continue
+        if ca is None:
+            # ``a`` implicitly retains the rest of the document
+            _push(result, cb)
+            j += 1
+            cb = b[j] if j < len(b) else None
+            continue
+        if cb is None:
+            _push(result, ca)
+            i += 1
+            ca = a[i] if i < len(a) else None
+            continue
+
+        if _is_retain(ca) and _is_retain(cb):
+            n = min(ca, cb)
+            _push(result, n)
+            ca, cb = ca - n, cb - n
+        elif _is_insert(ca) and _is_delete(cb):
+            n = min(len(ca), -cb)
+            ca, cb = ca[n:], cb + n
+        elif _is_insert(ca) and _is_retain(cb):
+            n = min(len(ca), cb)
+            _push(result, ca[:n])
+            ca, cb = ca[n:], cb - n
+        else:  # retain in a, delete in b
+            n = min(ca, -cb)
+            _push(result, -n)
+            ca, cb = ca - n, cb + n
+
+        if ca == 0 or ca == "":
+            i += 1
+            ca = a[i] if i < len(a) else None
+        if cb == 0:
+            j += 1
+            cb = b[j] if j < len(b) else None
+    return _trim(result)
+
+
+def transform(a, b):
+    """
+    Transform concurrent operations ``a`` and ``b`` (both based on the same
+    document) into ``(a', b')`` such that ``apply(apply(d, a), b') ==
+    apply(apply(d, b), a')``. Inserts from ``a`` win ties at the same position.
+    """
+    a, b = list(a), list(b)
+    a_prime, b_prime = [], []
+    i = j = 0
+    ca = a[0] if a else None
+    cb = b[0] if b else None
+
+    while ca is not None or cb is not None:
+        if _is_insert(ca):
+            _push(a_prime, ca)
+            _push(b_prime, len(ca))
+            i += 1
+            ca = a[i] if i < len(a) else None
+            continue
+        if _is_insert(cb):
+            _push(a_prime, len(cb))
+            _push(b_prime, cb)
+            j += 1
+            cb = b[j] if j < len(b) else None
+            continue
+        if ca is None:
+            # ``a`` implicitly retains the rest, so ``b`` carries over unchanged
+            _push(b_prime, cb)
+            j += 1
+            cb = b[j] if j < len(b) else None
+            continue
+        if cb is None:
+            _push(a_prime, ca)
+            i += 1
+            ca = a[i] if i < len(a) else None
+            continue
+
+        if _is_retain(ca) and _is_retain(cb):
+            n = min(ca, cb)
+            _push(a_prime, n)
+            _push(b_prime, n)
+            ca, cb = ca - n, cb - n
+        elif _is_delete(ca) and _is_delete(cb):
+            # Both deleted the same characters
+            n = min(-ca, -cb)
+            ca, cb = ca + n, cb + n
+        elif _is_delete(ca) and _is_retain(cb):
+            n = min(-ca, cb)
+            _push(a_prime, -n)
+            ca, cb = ca + n, cb - n
+        else:  # retain in a, delete in b
+            n = min(ca, -cb)
+            _push(b_prime, -n)
+            ca, cb = ca - n, cb + n
+
+        if ca == 0:
+            i += 1
+            ca = a[i] if i < len(a) else None
+        if cb == 0:
+            j += 1
+            cb = b[j] if j < len(b) else None
+    return _trim(a_prime), _trim(b_prime)
+
+
+def diff(old, new):
+    """Build a minimal-prefix/suffix operation turning ``old`` into ``new``."""
+    if old == new:
+        return []
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+    ):
+        suffix += 1
+    op = []
+    _push(op, prefix)
+    _push(op, new[prefix:len(new) - suffix])
+    _push(op, -(len(old) - prefix - suffix))
+    return _trim(op)
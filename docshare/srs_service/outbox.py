@@ -0,0 +1,78 @@
+"""
+Bounded queue of outgoing WebSocket messages for one connection.
+
+Consumers put frames here instead of awaiting the socket, and a writer task
+drains the queue, so a client that reads slowly never holds up the consumer
+(and with it the channel layer's queue for that connection). The queue holds
+at most ``size`` messages: when it is full the consumer gives up on sending
+the backlog and resyncs the client from a snapshot (see ``consumers``).
+
+Cursor traffic is only ever the latest position, so at most one presence
+message waits in the queue: newer cursors are folded into it.
+"""
+import asyncio
+from collections import deque
+
+# Stands in the queue for the pending presence message, which can still change
+_CURSORS = object()
+
+QUEUED = "queued"
+COALESCED = "coalesced"
+DROPPED = "dropped"
+
+
+class Outbox:
+    def __init__(self, size):
+        self.size = size
+        self._messages = deque()
+        # [cursors, message] of the presence message waiting in the queue
+        self._cursors = None
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def full(self):
+        return len(self._messages) >= self.size
+
+    def put(self, message):
+        """Queue ``message`` (``send`` keyword arguments); False if the queue is full."""
+        if self.full():
+            return False
+        self._messages.append(message)
+        self._ready.set()
+        return True
+
+    def put_cursors(self, cursors, message, encode):
+        """
+        Queue a presence ``message`` carrying ``cursors``, or fold them into
+        the presence message already waiting, re-encoded by ``encode(cursors)``.
+        Returns ``QUEUED``, ``COALESCED`` or ``DROPPED`` (queue full).
+        """
+        if self._cursors is not None:
+            self._cursors[0].update(cursors)
+            self._cursors[1] = encode(self._cursors[0])
+            return COALESCED
+        if self.full():
+            return DROPPED
+        self._cursors = [dict(cursors), message]
+        self._messages.append(_CURSORS)
+        self._ready.set()
+        return QUEUED
+
+    def clear(self):
+        """Drop everything waiting; returns how many messages that was."""
+        dropped = len(self._messages)
+        self._messages.clear()
+        self._cursors = None
+        return dropped
+
+    async def get(self):
+        """The next message to send, waiting for one if need be."""
+        while not self._messages:
+            self._ready.clear()
+            await self._ready.wait()
+        message = self._messages.popleft()
+        if message is _CURSORS:
+            message, self._cursors = self._cursors[1], None
+        return message
@@ -0,0 +1,113 @@
+"""
+Who is connected to a document room.
+
+Each room keeps a ``PresenceRegistry`` of its connections (keyed by reply
+channel) and of the users behind them, each with a color from ``PALETTE``.
+The registry lives with the room, so when rooms are sharded across workers
+every node sees the same members and colors.
+
+Colors are handed out from a free list in O(1) and returned to it when a
+user's last connection leaves; once the palette runs out colors are reused
+round-robin. Connections that have not been heard from for ``ttl`` seconds
+are reported by ``expired`` so the room can evict them, which cleans up
+after workers that died without saying goodbye.
+"""
+import time
+from collections import Counter, OrderedDict, deque
+
+PALETTE = (
+    "#f94144", "#f3722c", "#f9c74f", "#90be6d",
+    "#43aa8b", "#577590", "#277da1", "#f9844a",
+)
+
+
+class PresenceRegistry:
+    def __init__(self, ttl, palette=PALETTE):
+        self.ttl = ttl
+        self.palette = palette
+        # channel -> (username, last seen), least recently seen first
+        self.sessions = OrderedDict()
+        # username -> [color, open connections]
+        self.users = {}
+        self._free = deque(palette)
+        self._holders = Counter()
+        self._next = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, channel, username, now=None):
+        """
+        Register a connection. Returns ``(color, first)``, where ``first`` is
+        True when this is the user's only connection to the room.
+        """
+        now = time.monotonic() if now is None else now
+        self.remove(channel)
+        self.sessions[channel] = (username, now)
+        user = self.users.get(username)
+        if user is not None:
+            user[1] += 1
+            return user[0], False
+        color = self._allocate()
+        self.users[username] = [color, 1]
+        return color, True
+
+    def touch(self, channel, now=None):
+        """Mark a connection as alive; False if it is not registered."""
+        session = self.sessions.get(channel)
+        if session is None:
+            return False
+        self.sessions[channel] = (session[0], time.monotonic() if now is None else now)
+        self.sessions.move_to_end(channel)
+        return True
+
+    def remove(self, channel):
+        """
+        Drop a connection. Returns its username if that was the user's last
+        connection, "" if the user is still connected elsewhere, and None if
+        the connection was not registered.
+        """
+        session = self.sessions.pop(channel, None)
+        if session is None:
+            return None
+        username = session[0]
+        user = self.users[username]
+        user[1] -= 1
+        if user[1] > 0:
+            return ""
+        del self.users[username]
+        self._release(user[0])
+        return username
+
+    def color(self, username):
+        user = self.users.get(username)
+        return user[0] if user is not None else None
+
+    def members(self):
+        """``{username: color}`` for everyone connected."""
+        return {username: user[0] for username, user in self.users.items()}
+
+    def expired(self, now=None):
+        """Channels of connections not seen for ``ttl`` seconds."""
+        deadline = (time.monotonic() if now is None else now) - self.ttl
+        stale = []
+        for channel, (_, last_seen) in self.sessions.items():
+            if last_seen > deadline:
+                break
+            stale.append(channel)
+        return stale
+
+    def _allocate(self):
+        if self._free:
+            color = self._free.popleft()
+        else:
+            color = self.palette[self._next % len(self.palette)]
+            self._next += 1
+        self._holders[color] += 1
+        return color
+
+    def _release(self, color):
+        self._holders[color] -= 1
+        if not self._holders[color]:
+            del self._holders[color]
+            self._free.append(color)
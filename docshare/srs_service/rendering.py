@@ -0,0 +1,294 @@
+"""
+HTML rendering of document content for ``content_html``.
+
+Three content shapes are understood: plain text, Quill deltas
+(``{"ops": [...]}``) and Tiptap/ProseMirror JSON (``{"type": "doc", ...}``).
+Renderers are generators yielding HTML fragments from an explicit-stack walk,
+so arbitrarily deep or large documents neither recurse nor build
+intermediate trees. All text and attribute values are escaped, and links
+and images only keep http(s), mailto and relative URLs.
+
+``render_html`` joins the fragments and caches the result by a hash of the
+content in a bounded in-process LRU, optionally backed by a Django cache
+(``RENDER_CACHE_ALIAS``) so renders survive restarts and are shared between
+processes.
+"""
+import hashlib
+import json
+from html import escape
+
+from django.core.cache import caches
+
+from . import metrics, wire
+from .caching import TTLCache
+from .conf import sync_setting
+
+_rendered = TTLCache(sync_setting("RENDER_CACHE_SIZE"))
+
+SAFE_SCHEMES = ("http://", "https://", "mailto:")
+
+# Tiptap marks other than links, which are built from their attrs
+MARKS = {
+    "bold": ("<strong>", "</strong>"),
+    "italic": ("<em>", "</em>"),
+    "underline": ("<u>", "</u>"),
+    "strike": ("<s>", "</s>"),
+    "code": ("<code>", "</code>"),
+}
+
+# Tiptap nodes that map straight onto one element
+BLOCKS = {
+    "paragraph": "p",
+    "blockquote": "blockquote",
+    "bulletList": "ul",
+    "listItem": "li",
+    "table": "table",
+    "tableRow": "tr",
+    "tableCell": "td",
+    "tableHeader": "th",
+}
+
+# Quill inline attributes, outermost first
+QUILL_INLINE = (
+    ("bold", "<strong>", "</strong>"),
+    ("italic", "<em>", "</em>"),
+    ("underline", "<u>", "</u>"),
+    ("strike", "<s>", "</s>"),
+    ("code", "<code>", "</code>"),
+)
+
+
+def safe_url(url):
+    """``url`` if it is a plain web, mail or relative link, else ``""``."""
+    if not isinstance(url, str):
+        return ""
+    url = url.strip()
+    lowered = url.lower()
+    if lowered.startswith(SAFE_SCHEMES) or url.startswith(("/", "#", "?")):
+        return url
+    if ":" not in url.split("/", 1)[0]:
+        return url  # relative path
+    return ""
+
+
+def _text(text):
+    return escape(text, quote=False)
+
+
+def _attr(value):
+    return escape(str(value), quote=True)
+
+
+def iter_plain(text):
+    """One paragraph per line of plain text."""
+    for line in text.split("\n"):
+        yield f"<p>{_text(line)}</p>" if line else "<p><br></p>"
+
+
+def iter_tiptap(node):
+    """Walk a Tiptap/ProseMirror JSON tree, yielding HTML fragments."""
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item  # a closing tag pushed earlier
+            continue
+        if not isinstance(item, dict):
+            continue
+        kind = item.get("type")
+        attrs = item.get("attrs")
+        if not isinstance(attrs, dict):
+            attrs = {}
+
+        if kind == "text":
+            yield from _tiptap_text(item)
+            continue
+        if kind == "hardBreak":
+            yield "<br>"
+            continue
+        if kind == "horizontalRule":
+            yield "<hr>"
+            continue
+        if kind == "image":
+            src = safe_url(attrs.get("src"))
+            if src:
+                yield f'<img src="{_attr(src)}" alt="{_attr(attrs.get("alt") or "")}">'
+            continue
+
+        if kind == "heading":
+            level = attrs.get("level")
+            tag = f"h{level}" if level in (1, 2, 3, 4, 5, 6) else "h1"
+            opening = f"<{tag}>"
+        elif kind == "orderedList":
+            tag = "ol"
+            start = attrs.get("start")
+            opening = f'<ol start="{start}">' if isinstance(start, int) and start != 1 else "<ol>"
+        elif kind == "codeBlock":
+            tag = "pre"
+            language = attrs.get("language")
+            opening = (
+                f'<pre><code class="language-{_attr(language)}">' if language else "<pre><code>"
+            )
+        elif kind in BLOCKS:
+            tag = BLOCKS[kind]
+            opening = f"<{tag}>"
+        else:
+            tag = opening = None  # doc and unknown nodes: children only
+
+        if opening:
+            yield opening
+            stack.append("</code></pre>" if kind == "codeBlock" else f"</{tag}>")
+        children = item.get("content")
+        if isinstance(children, list):
+            stack.extend(reversed(children))
+
+
+def _tiptap_text(node):
+    text = node.get("text")
+    if not isinstance(text, str):
+        return
+    marks = node.get("marks")
+    closing = []
+    for mark in marks if isinstance(marks, list) else ():
+        kind = mark.get("type") if isinstance(mark, dict) else None
+        if kind == "link":
+            attrs = mark.get("attrs")
+            href = safe_url(attrs.get("href") if isinstance(attrs, dict) else None)
+            if not href:
+                continue
+            yield f'<a href="{_attr(href)}" rel="noopener noreferrer">'
+            closing.append("</a>")
+        elif kind in MARKS:
+            yield MARKS[kind][0]
+            closing.append(MARKS[kind][1])
+    yield _text(text)
+    yield from reversed(closing)
+
+
+def iter_quill(delta):
+    """
+    Render a Quill delta. Inline runs are buffered until the newline that
+    ends their line, whose attributes decide the block (heading, list item,
+    quote, code block, alignment); consecutive list lines share one list.
+    """
+    line = []
+    open_list = None
+    for op in delta.get("ops") or ():
+        if not isinstance(op, dict):
+            continue
+        insert = op.get("insert")
+        attributes = op.get("attributes")
+        if not isinstance(attributes, dict):
+            attributes = {}
+        if isinstance(insert, dict):
+            line.append(_quill_embed(insert))
+            continue
+        if not isinstance(insert, str):
+            continue
+        segments = insert.split("\n")
+        for index, segment in enumerate(segments):
+            if segment:
+                line.append(_quill_inline(segment, attributes))
+            if index == len(segments) - 1:
+                break
+            # A newline: its attributes format the line just finished
+            list_type = attributes.get("list")
+            wanted = {"ordered": "ol", "bullet": "ul"}.get(list_type)
+            if wanted != open_list:
+                if open_list:
+                    yield f"</{open_list}>"
+                if wanted:
+                    yield f"<{wanted}>"
+                open_list = wanted
+            yield _quill_block(line, attributes, wanted)
+            line = []
+    if open_list:
+        yield f"</{open_list}>"
+    if line:
+        yield f"<p>{''.join(line)}</p>"
+
+
+def _quill_inline(text, attributes):
+    html = _text(text)
+    for name, opening, closing in reversed(QUILL_INLINE):
+        if attributes.get(name):
+            html = f"{opening}{html}{closing}"
+    href = safe_url(attributes.get("link"))
+    if href:
+        html = f'<a href="{_attr(href)}" rel="noopener noreferrer">{html}</a>'
+    return html
+
+
+def _quill_embed(embed):
+    src = safe_url(embed.get("image"))
+    if src:
+        return f'<img src="{_attr(src)}">'
+    return ""
+
+
+def _quill_block(line, attributes, list_tag):
+    inner = "".join(line) or "<br>"
+    header = attributes.get("header")
+    if list_tag:
+        tag = "li"
+    elif header in (1, 2, 3, 4, 5, 6):
+        tag = f"h{header}"
+    elif attributes.get("blockquote"):
+        tag = "blockquote"
+    elif attributes.get("code-block"):
+        return f"<pre>{inner}</pre>"
+    else:
+        tag = "p"
+    align = attributes.get("align")
+    if align in ("center", "right", "justify"):
+        return f'<{tag} class="ql-align-{align}">{inner}</{tag}>'
+    return f"<{tag}>{inner}</{tag}>"
+
+
+def iter_html(content):
+    """Yield the HTML for any supported content shape."""
+    if content is None:
+        return
+    if isinstance(content, str):
+        yield from iter_plain(content)
+    elif isinstance(content, dict) and isinstance(content.get("ops"), list):
+        yield from iter_quill(content)
+    elif isinstance(content, dict):
+        yield from iter_tiptap(content)
+    elif isinstance(content, list):
+        # A bare list of Tiptap nodes
+        yield from iter_tiptap({"type": "doc", "content": content})
+
+
+def content_key(content):
+    """Stable hash of ``content``, independent of dict key order."""
+    encoded = None
+    if wire.orjson is not None:
+        try:
+            encoded = wire.orjson.dumps(content, option=wire.orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits, which json handles
+    if encoded is None:
+        encoded = json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+
+def render_html(content):
+    """``content`` as HTML, rendered at most once per distinct content."""
+    key = content_key(content)
+    html = _rendered.get(key)
+    if html is not None:
+        metrics.incr("render.cache_hits")
+        return html
+
+    alias = sync_setting("RENDER_CACHE_ALIAS")
+    shared_key = f"docshare:html:{key}"
+    if alias:
+        html = caches[alias].get(shared_key)
+    if html is None:
+        metrics.incr("render.cache_misses")
+        html = "".join(iter_html(content))
+        if alias:
+            caches[alias].set(shared_key, html, None)
+    _rendered.set(key, html)
+    return html
@@ -0,0 +1,689 @@
+"""
+Authoritative in-process state for documents that are open over WebSockets.
+
+Each open document gets one ``DocumentRoom`` holding the current text, its
+revision number and the operations applied since the room was opened, so that
+a client operation based on an older revision can be transformed against
+everything it has not seen yet before being applied and broadcast.
+
+Rooms are written back to the document's operation log behind the edits:
+changes are coalesced in memory and flushed by a background task once they are
+``FLUSH_DELAY`` seconds old, once ``FLUSH_MAX_OPS`` have piled up, or when the
+last member leaves. REST writes to an open document go through ``writing``:
+the room saves its edits before the write, then rebases any made since on
+top of it and resyncs its clients.
+
+Cursor updates are coalesced per user and broadcast as a single presence frame
+per room every ``PRESENCE_TICK`` seconds, carrying only each user's latest
+position. Members and their colors are tracked by the room's
+``PresenceRegistry``; connections that stop sending heartbeats are evicted
+after ``PRESENCE_TTL`` seconds.
+
+WebSocket consumers never touch rooms directly; they send commands
+(``room.join``, ``room.edit``, ``room.cursor``, ``room.leave``) through
+``send_command`` (plus ``room.touch`` heartbeats, and ``room.resync`` for a
+fresh snapshot when a client falls behind or loses track) and rooms answer
+over the channel layer. With ``SHARDS`` at 0 rooms live in the process that
+received the command. Otherwise each document is pinned to one of ``SHARDS``
+channels (``docsync.0``, ``docsync.1``, ...) and its room lives in whichever
+``runworker`` process consumes that channel, so every node forwards to the
+one authoritative copy.
+"""
+import asyncio
+import itertools
+import logging
+import zlib
+from collections import deque
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from . import compression, metrics, ot, presence, storage, wire
+from .conf import sync_setting
+from .models import Document, DocumentOperation
+
+logger = logging.getLogger(__name__)
+
+_rooms = {}
+_opening = {}
+
+# Commands waiting in a shard worker, per document (see dispatch)
+_mailboxes = {}
+
+# Commands one document may have waiting in a shard worker before the
+# worker stops taking more off the shard channel
+MAILBOX_SIZE = 1000
+
+# Seconds a REST write waits for the document's room to save its edits
+REPLY_TIMEOUT = 10.0
+
+# Seconds to wait before each retry of a command whose shard channel is full
+COMMAND_RETRY_DELAYS = (0.05, 0.2, 0.5)
+
+
+def group_name(doc_id):
+    return f"doc_{doc_id}"
+
+
+class DocumentRoom:
+    def __init__(self, doc_id, content="", revision=0, persistent=True):
+        self.doc_id = doc_id
+        self.content = content
+        self.revision = revision
+        self.members = 0
+        # Ring buffer of recent operations; history[i] produced revision
+        # history_start + i + 1
+        self.history = deque(maxlen=sync_setting("HISTORY_SIZE"))
+
+        # Rooms without a backing Document are never written back
+        self.persistent = persistent
+        self.saved_revision = revision
+        # (kind, operation, author_id) entries not yet in the operation log
+        self.unsaved = []
+        self._flush_timer = None
+        self._flush_task = None
+
+        # Latest cursor per username, waiting for the next presence tick
+        self.cursors = {}
+        self._presence_timer = None
+        self._presence_task = None
+
+        # Connected users and their colors; stale connections are swept out
+        self.presence = presence.PresenceRegistry(sync_setting("PRESENCE_TTL"))
+        self._sweep_timer = None
+        self._sweep_task = None
+
+    @property
+    def history_start(self):
+        return self.revision - len(self.history)
+
+    def reset(self, content, revision):
+        """Replace the room's state wholesale; clients must resync from a snapshot."""
+        self.content = content
+        self.revision = revision
+        self.history.clear()
+
+    async def catch_up(self, revision):
+        """
+        Return the operations a client at ``revision`` has missed, oldest
+        first, or None if it is too far behind and needs a snapshot instead.
+        """
+        if revision == self.revision:
+            return []
+        if not isinstance(revision, int) or not 0 <= revision < self.revision:
+            return None
+        if revision >= self.history_start:
+            return list(itertools.islice(self.history, revision - self.history_start, None))
+
+        # Older than the buffer: fill the gap from the operation log, as long
+        # as the buffer still covers everything not yet saved.
+        gap_end = self.history_start
+        if (
+            not self.persistent
+            or gap_end > self.saved_revision
+            or self.revision - revision > self.history.maxlen
+        ):
+            return None
+        logged = await _load_operations(self.doc_id, revision)
+        if logged is None or len(logged) < gap_end - revision:
+            return None
+        logged = logged[:gap_end - revision]
+        if any(kind != DocumentOperation.TEXT for kind, _ in logged):
+            return None
+        # The room may have moved on while the log was read
+        if gap_end != self.history_start:
+            return await self.catch_up(revision)
+        return [op for _, op in logged] + list(self.history)
+
+    def apply(self, op, revision, author_id=None):
+        """
+        Apply a client operation made against ``revision`` and return it in
+        the form it was applied, i.e. transformed past concurrent operations.
+        """
+        if not isinstance(self.content, str):
+            raise ot.InvalidOperation("Document content is not plain text.")
+        if not isinstance(revision, int) or isinstance(revision, bool):
+            raise ot.InvalidOperation("Operation is missing its base revision.")
+        if not self.history_start <= revision <= self.revision:
+            raise ot.InvalidOperation(f"Unknown revision {revision}.")
+
+        op = ot.normalize(op)
+        for concurrent in itertools.islice(self.history, revision - self.history_start, None):
+            # Operations already applied on the server win ties
+            _, op = ot.transform(concurrent, op)
+
+        self.content = ot.apply(self.content, op)
+        self.history.append(op)
+        self.revision += 1
+        if self.persistent:
+            self.unsaved.append((DocumentOperation.TEXT, op, author_id))
+            self._changed()
+        return op
+
+    def apply_text(self, text, author_id=None):
+        """Apply a full-text replacement, as sent by older clients."""
+        if not isinstance(self.content, str) or not isinstance(text, str):
+            raise ot.InvalidOperation("Document content is not plain text.")
+        return self.apply(ot.diff(self.content, text), self.revision, author_id)
+
+    def _changed(self):
+        if len(self.unsaved) >= sync_setting("FLUSH_MAX_OPS"):
+            self._start_flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                sync_setting("FLUSH_DELAY"), self._start_flush
+            )
+
+    def _start_flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._write())
+
+    async def _serialized(self, work):
+        """
+        Run ``work()`` as the room's write task once the one under way is
+        done, so only one of them reads or moves ``saved_revision`` at a time.
+        """
+        while self._flush_task is not None and not self._flush_task.done():
+            await asyncio.shield(self._flush_task)
+        self._flush_task = asyncio.ensure_future(work())
+        await asyncio.shield(self._flush_task)
+
+    def update_cursor(self, username, color, cursor):
+        """Queue ``username``'s latest cursor for the next presence tick."""
+        self.cursors[username] = {"cursor": cursor, "color": color}
+        if self._presence_timer is None:
+            self._presence_timer = asyncio.get_running_loop().call_later(
+                sync_setting("PRESENCE_TICK"), self._send_presence
+            )
+
+    def drop_cursor(self, username):
+        self.cursors.pop(username, None)
+
+    def _send_presence(self):
+        self._presence_timer = None
+        if not self.cursors:
+            return
+        cursors, self.cursors = self.cursors, {}
+        self._presence_task = asyncio.ensure_future(
+            get_channel_layer().group_send(group_name(self.doc_id), wire.group_event(
+                "presence.update", {"type": "presence", "cursors": cursors},
+                # Raw too, for consumers that merge presence frames
+                cursors=cursors,
+            ))
+        )
+
+    def _schedule_sweep(self):
+        if self._sweep_timer is None:
+            self._sweep_timer = asyncio.get_running_loop().call_later(
+                self.presence.ttl, self._start_sweep
+            )
+
+    def _start_sweep(self):
+        self._sweep_timer = None
+        self._sweep_task = asyncio.ensure_future(self._sweep())
+
+    async def _sweep(self):
+        """Evict connections whose consumer has gone quiet, e.g. a dead worker."""
+        for channel in self.presence.expired():
+            logger.info("Evicting stale connection %s from document %s", channel, self.doc_id)
+            await _depart(self, channel)
+        if self.presence:
+            self._schedule_sweep()
+
+    async def flush(self):
+        """Append unsaved edits to the document's operation log now."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await self._serialized(self._write)
+
+    async def reload(self):
+        """Pick up changes written behind the room's back, e.g. over REST."""
+        await self._serialized(self._reload)
+
+    async def _write(self):
+        while self.unsaved:
+            entries, self.unsaved = self.unsaved, []
+            content, base = self.content, self.saved_revision
+            try:
+                self.saved_revision = await _append_operations(self.doc_id, base, entries, content)
+            except storage.RevisionConflict:
+                self.unsaved = entries + self.unsaved
+                await self._rebase()
+                continue
+            except Document.DoesNotExist:
+                self._deleted()
+                return
+            except Exception:
+                logger.exception("Failed to write back document %s", self.doc_id)
+                self.unsaved = entries + self.unsaved
+                # Retried for as long as the room is open; leave() keeps it
+                # open until its edits are saved
+                if _rooms.get(self.doc_id) is self:
+                    self._schedule_flush()
+                return
+
+        if self.unsaved:
+            # Edits that arrived during the write get their own delay
+            self._schedule_flush()
+        else:
+            _unload(self)
+
+    def _deleted(self):
+        """The document is gone: nothing the room holds can be saved any more."""
+        logger.warning(
+            "Document %s was deleted while open; dropping %d unsaved edits",
+            self.doc_id, len(self.unsaved),
+        )
+        self.unsaved = []
+        self.persistent = False
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        _unload(self)
+
+    async def _reload(self):
+        if self.persistent and _rooms.get(self.doc_id) is self:
+            await self._rebase()
+        if self.unsaved:
+            self._schedule_flush()
+
+    async def _rebase(self):
+        """Put unsaved edits on top of changes written behind the room's back."""
+        missed, latest = await _load_missed(self.doc_id, self.saved_revision)
+
+        # No awaits from here on: the room must not change underneath us
+        if latest is None:
+            self._deleted()
+            return
+        if latest[1] == self.saved_revision:
+            return  # Nothing new
+        text = missed is not None and isinstance(self.content, str) and all(
+            kind == DocumentOperation.TEXT for kind, _ in missed
+        )
+        if text and not self.unsaved:
+            # Nothing to renumber: relay the changes like any other edits, so
+            # clients keep theirs and edits in flight are transformed past them
+            self.saved_revision = latest[1]
+            for _, op in missed:
+                self.content = ot.apply(self.content, op)
+                self.history.append(op)
+                self.revision += 1
+            first = self.revision - len(missed) + 1
+            for revision, (_, op) in enumerate(missed, start=first):
+                await get_channel_layer().group_send(group_name(self.doc_id), wire.group_event(
+                    "document.message",
+                    {"type": "op", "op": op, "revision": revision, "username": None, "color": None},
+                    sender=None,
+                    revision=revision,
+                ))
+            return
+        if not text:
+            if self.unsaved:
+                logger.warning(
+                    "Document %s was replaced while open; dropping %d unsaved edits",
+                    self.doc_id, len(self.unsaved),
+                )
+            self.unsaved = []
+            content, revision = latest
+            content = "" if content is None else content
+        else:
+            content = self.content
+            for _, op in missed:
+                for index, (kind, pending, author_id) in enumerate(self.unsaved):
+                    # The stored operation came first, so it wins ties
+                    op, pending = ot.transform(op, pending)
+                    self.unsaved[index] = (kind, pending, author_id)
+                content = ot.apply(content, op)
+            revision = latest[1] + len(self.unsaved)
+
+        self.saved_revision = latest[1]
+        self.reset(content, revision)
+        await get_channel_layer().group_send(group_name(self.doc_id), wire.group_event(
+            "document.snapshot",
+            {"type": "snapshot", "content": content, "revision": revision},
+            revision=revision,
+            dictionary=compression.dictionary_for(content),
+        ))
+
+
+@database_sync_to_async
+def _load_document(doc_id):
+    try:
+        return storage.load_document(doc_id)
+    except ValueError:
+        # Room names are not restricted to numeric document ids
+        return None
+
+
+@database_sync_to_async
+def _load_operations(doc_id, revision):
+    return storage.operations_since(doc_id, revision)
+
+
+@database_sync_to_async
+def _append_operations(doc_id, base_revision, entries, content):
+    return storage.append_operations(doc_id, base_revision, entries, content)
+
+
+@database_sync_to_async
+def _load_missed(doc_id, revision):
+    with transaction.atomic():
+        latest = storage.load_document(doc_id)
+        if latest is None:
+            return None, None
+        return storage.operations_since(doc_id, revision, latest[1]), latest
+
+
+async def _open(doc_id):
+    state = await _load_document(doc_id)
+    room = _rooms.get(doc_id)
+    if room is None:
+        if state is None:
+            room = DocumentRoom(doc_id, persistent=False)
+        else:
+            content, revision = state
+            room = DocumentRoom(doc_id, "" if content is None else content, revision)
+        _rooms[doc_id] = room
+    return room
+
+
+async def join(doc_id):
+    """Return the room for ``doc_id``, loading it from the database if needed."""
+    room = _rooms.get(doc_id)
+    if room is None:
+        task = _opening.get(doc_id)
+        if task is None:
+            task = _opening[doc_id] = asyncio.ensure_future(_open(doc_id))
+            task.add_done_callback(lambda _: _opening.pop(doc_id, None))
+        room = await task
+    room.members += 1
+    return room
+
+
+async def leave(room):
+    """Drop a member from ``room``, saving and unloading it once nobody is left."""
+    room.members -= 1
+    if room.members > 0:
+        return
+    # The room stays registered while saving so a quick rejoin reuses it
+    # rather than reading stale content back from the database.
+    await room.flush()
+    _unload(room)
+
+
+def _unload(room):
+    """Forget ``room`` once nobody is in it and all its edits are saved."""
+    if room.members <= 0 and not room.unsaved and _rooms.get(room.doc_id) is room:
+        del _rooms[room.doc_id]
+
+
+def shard_channel(doc_id):
+    """The channel whose worker owns ``doc_id``'s room."""
+    return f"docsync.{zlib.crc32(str(doc_id).encode()) % sync_setting('SHARDS')}"
+
+
+def shard_channels():
+    return [f"docsync.{shard}" for shard in range(sync_setting("SHARDS"))]
+
+
+async def send_command(command):
+    """
+    Deliver a room command to wherever the document's room lives. Backs off
+    while the shard's channel is full and raises ``ChannelFull`` if it stays so.
+    """
+    if not sync_setting("SHARDS"):
+        await handle_command(command)
+        return
+    channel = shard_channel(command["doc_id"])
+    for delay in COMMAND_RETRY_DELAYS:
+        try:
+            await get_channel_layer().send(channel, command)
+            return
+        except ChannelFull:
+            metrics.incr("backpressure.commands_delayed")
+            await asyncio.sleep(delay)
+    try:
+        await get_channel_layer().send(channel, command)
+    except ChannelFull:
+        metrics.incr("backpressure.commands_dropped")
+        raise
+
+
+async def _reply(channel, message):
+    """
+    Send ``message`` to one connection. Like ``group_send``, drops it if the
+    connection's channel is full rather than failing the command.
+    """
+    try:
+        await get_channel_layer().send(channel, message)
+    except ChannelFull:
+        metrics.incr("backpressure.replies_dropped")
+
+
+async def request(command, timeout=REPLY_TIMEOUT):
+    """
+    ``send_command`` and wait for the room to answer on ``reply_channel``,
+    for at most ``timeout`` seconds. Returns whether it did.
+    """
+    if not sync_setting("SHARDS"):
+        await handle_command(command)
+        return True
+    layer = get_channel_layer()
+    reply_channel = await layer.new_channel()
+    try:
+        await send_command({**command, "reply_channel": reply_channel})
+        await asyncio.wait_for(layer.receive(reply_channel), timeout)
+    except (ChannelFull, asyncio.TimeoutError):
+        return False
+    return True
+
+
+@contextmanager
+def writing(doc_id):
+    """
+    Wrap a write of ``doc_id``'s content made outside the room, e.g. over
+    REST, from sync code and outside any transaction. The open room saves
+    its edits first so the write builds on them, and reloads afterwards so
+    its clients get the result and later edits are rebased on top of it.
+    """
+    command = {"doc_id": str(doc_id)}
+    if not async_to_sync(request)({**command, "type": "room.flush"}):
+        logger.warning("Document %s room did not save its edits in time", doc_id)
+    yield
+    try:
+        async_to_sync(send_command)({**command, "type": "room.reload"})
+    except ChannelFull:
+        logger.warning("Document %s room was not told about a write", doc_id)
+
+
+async def handle_command(command):
+    await _COMMANDS[command["type"]](command)
+
+
+class _Mailbox:
+    def __init__(self):
+        self.commands = deque()
+        self.space = asyncio.Event()
+
+
+async def dispatch(command):
+    """
+    Run ``command`` in a shard worker without waiting for it. Each document
+    has its own queue drained by its own task, so a document loading or
+    saving never holds up edits to the others on the shard, while commands
+    for one document still run one at a time and in order.
+    """
+    doc_id = str(command["doc_id"])
+    while True:
+        mailbox = _mailboxes.get(doc_id)
+        if mailbox is None:
+            mailbox = _mailboxes[doc_id] = _Mailbox()
+            mailbox.commands.append(command)
+            asyncio.ensure_future(_drain(doc_id, mailbox))
+            return
+        if len(mailbox.commands) < MAILBOX_SIZE:
+            mailbox.commands.append(command)
+            return
+        # Leave the rest on the shard channel, whose capacity pushes back;
+        # the mailbox may be drained and gone by the time we wake up
+        metrics.incr("backpressure.mailbox_full")
+        mailbox.space.clear()
+        await mailbox.space.wait()
+
+
+async def _drain(doc_id, mailbox):
+    try:
+        while mailbox.commands:
+            command = mailbox.commands[0]
+            try:
+                await handle_command(command)
+            except Exception:
+                logger.exception("Room command %s for document %s failed", command["type"], doc_id)
+            mailbox.commands.popleft()
+            mailbox.space.set()
+    finally:
+        if _mailboxes.get(doc_id) is mailbox:
+            del _mailboxes[doc_id]
+
+
+async def _depart(room, channel):
+    """Remove a connection from ``room``, announcing the user if it was their last."""
+    username = room.presence.remove(channel)
+    if username is None:
+        return
+    if username:
+        room.drop_cursor(username)
+        await get_channel_layer().group_send(group_name(room.doc_id), wire.group_event(
+            "user.leave", {"type": "leave", "username": username},
+        ))
+    await leave(room)
+
+
+async def _send_sync(room, channel, ops=None):
+    """Send a connection the ``ops`` it missed, or a snapshot when None."""
+    if ops is not None:
+        payload = {"type": "catchup", "ops": ops, "revision": room.revision}
+    else:
+        payload = {"type": "snapshot", "content": room.content, "revision": room.revision}
+    payload["members"] = room.presence.members()
+    await _reply(channel, wire.group_event(
+        "document.sync", payload,
+        revision=room.revision,
+        dictionary=compression.dictionary_for(room.content),
+    ))
+
+
+async def _join_command(command):
+    room = await join(command["doc_id"])
+    color, first = room.presence.add(command["reply_channel"], command["username"])
+    room._schedule_sweep()
+    ops = None
+    if command.get("since_revision") is not None:
+        ops = await room.catch_up(command["since_revision"])
+    await _send_sync(room, command["reply_channel"], ops)
+    if first:
+        await get_channel_layer().group_send(group_name(room.doc_id), wire.group_event(
+            "user.join", {"type": "join", "username": command["username"], "color": color},
+        ))
+
+
+async def _edit_command(command):
+    room = _rooms.get(command["doc_id"])
+    try:
+        if room is None:
+            raise ot.InvalidOperation("Not connected to this document.")
+        room.presence.touch(command["reply_channel"])
+        if command.get("op") is not None:
+            op = room.apply(command["op"], command.get("revision"), command.get("author_id"))
+        else:
+            # Older clients send the whole text; only the changed span is relayed
+            op = room.apply_text(command["message"], command.get("author_id"))
+    except ot.InvalidOperation as exc:
+        await _reply(command["reply_channel"], wire.group_event(
+            "document.error", {"type": "error", "message": str(exc)},
+        ))
+        return
+
+    revision = room.revision
+    await get_channel_layer().group_send(group_name(room.doc_id), wire.group_event(
+        "document.message", {
+            "type": "op",
+            "op": op,
+            "revision": revision,
+            "username": command["username"],
+            "color": room.presence.color(command["username"]),
+        },
+        sender=command["reply_channel"],
+        revision=revision,
+    ))
+
+
+async def _cursor_command(command):
+    room = _rooms.get(command["doc_id"])
+    if room is not None and room.presence.touch(command["reply_channel"]):
+        username = command["username"]
+        room.update_cursor(username, room.presence.color(username), command["cursor"])
+
+
+async def _touch_command(command):
+    room = _rooms.get(command["doc_id"])
+    if room is not None:
+        room.presence.touch(command["reply_channel"])
+
+
+async def _resync_command(command):
+    room = _rooms.get(command["doc_id"])
+    if room is not None and room.presence.touch(command["reply_channel"]):
+        await _send_sync(room, command["reply_channel"])
+
+
+async def _opened(doc_id):
+    """The room for ``doc_id`` if it is open, waiting for one being opened."""
+    task = _opening.get(doc_id)
+    if task is not None:
+        return await asyncio.shield(task)
+    return _rooms.get(doc_id)
+
+
+async def _flush_command(command):
+    room = await _opened(command["doc_id"])
+    if room is not None:
+        await room.flush()
+    if command.get("reply_channel"):
+        await _reply(command["reply_channel"], {"type": "room.flushed"})
+
+
+async def _reload_command(command):
+    room = await _opened(command["doc_id"])
+    if room is not None:
+        await room.reload()
+
+
+async def _leave_command(command):
+    room = _rooms.get(command["doc_id"])
+    if room is not None:
+        await _depart(room, command["reply_channel"])
+
+
+_COMMANDS = {
+    "room.join": _join_command,
+    "room.edit": _edit_command,
+    "room.cursor": _cursor_command,
+    "room.touch": _touch_command,
+    "room.resync": _resync_command,
+    "room.flush": _flush_command,
+    "room.reload": _reload_command,
+    "room.leave": _leave_command,
+}
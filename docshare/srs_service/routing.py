@@ -1,5 +1,5 @@
 from django.urls import re_path
-from . import consumers
+from . import consumers, rooms
 
 # Define WebSocket routes for document collaboration
 websocket_urlpatterns = [
@@ -8,3 +8,9 @@ websocket_urlpatterns = [
         consumers.DocumentSyncConsumer.as_asgi()
     ),
 ]
+
+# Background channels owning document rooms when sync is sharded across workers
+channel_routes = {
+    name: consumers.DocumentEngineConsumer.as_asgi()
+    for name in rooms.shard_channels()
+}
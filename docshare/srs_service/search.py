@@ -0,0 +1,310 @@
+"""
+Full-text search over document titles and content.
+
+Each document's title and the plain text extracted from its content are kept
+in a search index table, updated as documents change (see ``signals``):
+whenever the operation log grows, the title is edited, or a document is
+created or deleted. ``search`` ranks matches and only considers documents
+from the queryset it is given, so callers apply the usual access rules.
+
+The index lives in the database. The backend is picked by vendor:
+
+* SQLite: an FTS5 table (porter-stemmed), ranked by term hits with title
+  hits counting 10x, among the ``CANDIDATES`` newest matches. bm25 is avoided
+  on purpose: its IDF statistics walk the whole posting list of every term,
+  which costs seconds for common words at a million documents even when the
+  user can only see a handful of them.
+* PostgreSQL: a table with a generated, GIN-indexed ``tsvector`` ranked with
+  ``ts_rank``, titles weighted A and body text B.
+* Anything else: unindexed ``icontains`` matching, good enough for tests.
+
+``SEARCH_BACKEND`` can name another ``SearchBackend`` class by dotted path.
+"""
+import heapq
+import re
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from . import storage
+from .conf import sync_setting
+from .models import Document
+
+TABLE = "srs_service_document_search"
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# Visible documents up to which SQLite matches are looked up by id instead of
+# scanned; past this, per-id lookups cost more than walking the matches
+SEEK_LIMIT = 1000
+
+# Newest matches ranked per SQLite query, bounding the cost of common words
+CANDIDATES = 1000
+
+# Term hits in a column, counted as the markers highlight() inserts
+SCORE = (
+    f"(length(highlight({TABLE}, 0, char(1), '')) - length(title)) * 10"
+    f" + length(highlight({TABLE}, 1, char(1), '')) - length(body)"
+)
+
+
+def extract_text(content):
+    """The plain text of plain, Quill delta or Tiptap JSON content."""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    parts = []
+    stack = [content]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if isinstance(item.get("ops"), list):
+                stack.extend(reversed(item["ops"]))
+                continue
+            text = item.get("insert", item.get("text"))
+            if isinstance(text, str):
+                parts.append(text)
+            children = item.get("content")
+            if isinstance(children, list):
+                if item.get("type") not in (None, "text"):
+                    parts.append("\n")
+                stack.extend(reversed(children))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+    return "".join(parts)
+
+
+def _ids_sql(documents):
+    sql, params = documents.order_by().values("pk").query.sql_with_params()
+    return sql, list(params)
+
+
+class SearchBackend:
+    """Unindexed fallback: substring matches on title and stored content."""
+
+    def install(self, schema_editor):
+        pass
+
+    def uninstall(self, schema_editor):
+        pass
+
+    def index(self, document_id, title, text):
+        pass
+
+    def bulk_index(self, rows):
+        """Add ``(document_id, title, text)`` rows to an empty index."""
+        for row in rows:
+            self.index(*row)
+
+    def optimize(self):
+        """Compact the index after a bulk load."""
+
+    def update_title(self, document_id, title):
+        return True
+
+    def remove(self, document_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, documents, limit):
+        """``[(document_id, rank), ...]`` best first, within ``documents``."""
+        words = WORD.findall(query)
+        if not words:
+            return []
+        condition = Q()
+        for word in words:
+            condition &= Q(title__icontains=word) | Q(content__icontains=word)
+        return [(pk, 0.0) for pk in documents.filter(condition).values_list("pk", flat=True)[:limit]]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def index(self, document_id, title, text):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [document_id])
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [document_id, title, text],
+            )
+
+    def bulk_index(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {TABLE} (rowid, title, body) VALUES (%s, %s, %s)", rows)
+
+    def optimize(self):
+        # Merge the segments a bulk load leaves behind; lookups by id visit
+        # every segment
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+    def update_title(self, document_id, title):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {TABLE} SET title = %s WHERE rowid = %s", [title, document_id])
+            return cursor.rowcount > 0
+
+    def remove(self, document_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [document_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+    def search(self, query, documents, limit):
+        # Every word must match; quoting keeps FTS syntax out of user input
+        words = WORD.findall(query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"' for word in words)
+        ids = list(documents.order_by().values_list("pk", flat=True)[:SEEK_LIMIT + 1])
+        if len(ids) <= SEEK_LIMIT:
+            # Few visible documents: look each one up in the index
+            restrict, params = f"rowid IN ({', '.join(['%s'] * len(ids))})", ids
+        else:
+            # Many: walk the matches newest first, filtering on the access
+            # subquery. The unary plus stops FTS5 seeking once per id.
+            ids_sql, params = _ids_sql(documents)
+            restrict = f"+rowid IN ({ids_sql})"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, {SCORE} FROM {TABLE} WHERE {TABLE} MATCH %s AND {restrict} "
+                "ORDER BY rowid DESC LIMIT %s",
+                [match, *params, CANDIDATES],
+            )
+            return heapq.nlargest(limit, cursor.fetchall(), key=itemgetter(1, 0))
+
+
+class PostgresSearchBackend(SearchBackend):
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            "document_id bigint PRIMARY KEY REFERENCES srs_service_document (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "title text NOT NULL DEFAULT '', body text NOT NULL DEFAULT '', "
+            "vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', title), 'A') || "
+            "setweight(to_tsvector('english', body), 'B')) STORED)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TABLE}_vector ON {TABLE} USING gin (vector)"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def index(self, document_id, title, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (document_id, title, body) VALUES (%s, %s, %s) "
+                "ON CONFLICT (document_id) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body",
+                [document_id, title, text],
+            )
+
+    def bulk_index(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {TABLE} (document_id, title, body) VALUES (%s, %s, %s)", rows)
+
+    def update_title(self, document_id, title):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {TABLE} SET title = %s WHERE document_id = %s", [title, document_id])
+            return cursor.rowcount > 0
+
+    def remove(self, document_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE document_id = %s", [document_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {TABLE}")
+
+    def search(self, query, documents, limit):
+        # Every word must match
+        if not WORD.search(query):
+            return []
+        ids_sql, params = _ids_sql(documents)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT document_id, ts_rank(vector, query) AS score "
+                f"FROM {TABLE}, plainto_tsquery('english', %s) query "
+                f"WHERE vector @@ query AND document_id IN ({ids_sql}) "
+                "ORDER BY score DESC, document_id DESC LIMIT %s",
+                [query, *params, limit],
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend():
+    path = sync_setting("SEARCH_BACKEND")
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def index_document(document_id):
+    """(Re)index one document from its current title and content."""
+    document = Document.objects.filter(pk=document_id).only(
+        "title", "content", "revision", "snapshot_revision"
+    ).first()
+    if document is None:
+        get_backend().remove(document_id)
+        return
+    get_backend().index(document_id, document.title, extract_text(storage.current_content(document)))
+
+
+def index_content(document_id, content):
+    """Reindex after the content changed to ``content``."""
+    title = Document.objects.filter(pk=document_id).values_list("title", flat=True).first()
+    if title is None:
+        return
+    get_backend().index(document_id, title, extract_text(content))
+
+
+def index_title(document_id, title):
+    if not get_backend().update_title(document_id, title):
+        index_document(document_id)
+
+
+def remove_document(document_id):
+    get_backend().remove(document_id)
+
+
+def rebuild(batch_size=1000):
+    """Reindex every document; returns how many were indexed."""
+    backend = get_backend()
+    count = 0
+    documents = Document.objects.only("title", "content", "revision", "snapshot_revision")
+    with transaction.atomic():
+        backend.clear()
+        batch = []
+        for document in documents.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append((document.pk, document.title, extract_text(storage.current_content(document))))
+            if len(batch) == batch_size:
+                backend.bulk_index(batch)
+                count += len(batch)
+                batch = []
+        backend.bulk_index(batch)
+        backend.optimize()
+    return count + len(batch)
+
+
+def search(query, documents, limit=20):
+    """Rank ``documents`` (a Document queryset) against ``query``."""
+    return get_backend().search(query, documents, limit)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Document, DocumentShare
+from . import rendering, storage
+from .models import Document, DocumentOperation, DocumentShare, DocumentVersion
 
 User = get_user_model()
 
@@ -39,9 +40,40 @@ class DocumentShareSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'shared_with', 'shared_at']
 
 
+# ✅ Bulk sharing: every listed document with every listed user
+class DocumentShareBulkSerializer(serializers.Serializer):
+    # Shares written by one request, at most
+    MAX_PAIRS = 10000
+
+    document_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    shared_with_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    can_edit = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        attrs["document_ids"] = sorted(set(attrs["document_ids"]))
+        attrs["shared_with_ids"] = sorted(set(attrs["shared_with_ids"]))
+        if len(attrs["document_ids"]) * len(attrs["shared_with_ids"]) > self.MAX_PAIRS:
+            raise serializers.ValidationError(
+                f"At most {self.MAX_PAIRS} document/user pairs per request."
+            )
+        return attrs
+
+
+# ✅ Dashboard listing: no content, no share details
+class DocumentSummarySerializer(serializers.ModelSerializer):
+    owner = UserSummarySerializer(read_only=True)
+    is_shared = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Document
+        fields = ["id", "title", "owner", "is_shared", "updated_at"]
+        read_only_fields = fields
+
+
 # ✅ Read-only serializer for full document details
 class DocumentSerializer(serializers.ModelSerializer):
     owner = UserSummarySerializer(read_only=True)
+    content = serializers.SerializerMethodField()
     shared_with = serializers.SerializerMethodField()
     is_shared = serializers.SerializerMethodField()
     content_html = serializers.SerializerMethodField()
@@ -53,6 +85,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             "title",
             "content",
             "content_html",
+            "revision",
             "owner",
             "is_shared",
             "shared_with",
@@ -61,15 +94,22 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "id",
+            "revision",
             "owner",
             "created_at",
             "updated_at",
             "content_html"
         ]
 
+    def get_content(self, obj):
+        # ✅ Snapshot plus any operations logged since it was taken
+        if not hasattr(obj, "_current_content"):
+            obj._current_content = storage.current_content(obj)
+        return obj._current_content
+
     def get_shared_with(self, obj):
-        # ✅ Safely retrieve shared users
-        shares = obj.shares.select_related("shared_with").all()
+        # ✅ Served from the view's prefetch when present
+        shares = obj.shares.all()
         return [
             {
                 "id": share.shared_with.id,
@@ -80,13 +120,39 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_shared(self, obj):
-        return obj.shares.exists()
+        # ✅ Annotated by the view; fall back to the prefetched shares
+        if hasattr(obj, "is_shared"):
+            return obj.is_shared
+        return bool(obj.shares.all())
 
     def get_content_html(self, obj):
-        """
-        Placeholder for converting JSON content to HTML (if using rich editors like TipTap/Quill).
-        """
-        return "<div>[Rendered HTML Preview]</div>"
+        # ✅ Plain text, Quill delta or Tiptap JSON; cached by content hash
+        return rendering.render_html(self.get_content(obj))
+
+
+# ✅ Version history entries; content is fetched one version at a time
+class DocumentVersionSerializer(serializers.ModelSerializer):
+    keyframe = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentVersion
+        fields = ["revision", "keyframe", "created_at"]
+        read_only_fields = fields
+
+    def get_keyframe(self, obj):
+        return obj.kind == DocumentOperation.REPLACE
+
+
+# ✅ Partial content edits: a text operation or a JSON Patch on a base revision
+class DocumentContentPatchSerializer(serializers.Serializer):
+    revision = serializers.IntegerField(min_value=0)
+    op = serializers.JSONField(required=False)
+    patch = serializers.JSONField(required=False)
+
+    def validate(self, attrs):
+        if ("op" in attrs) == ("patch" in attrs):
+            raise serializers.ValidationError("Send exactly one of 'op' or 'patch'.")
+        return attrs
 
 
 # ✅ For create/update operations only
@@ -94,3 +160,24 @@ class DocumentCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
         fields = ['title', 'content']
+
+    def update(self, instance, validated_data):
+        content = validated_data.pop('content', None)
+        content_sent = 'content' in self.initial_data
+
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=[*validated_data, 'updated_at'])
+
+        # Content goes through the operation log instead of rewriting the blob
+        if content_sent:
+            request = self.context.get('request')
+            storage.commit_content(instance, content, author=getattr(request, 'user', None))
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'content' in data:
+            data['content'] = storage.current_content(instance)
+        return data
@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import access, doclists, middleware, search, storage, versions
+from .models import Document, DocumentShare
+
+User = get_user_model()
+
+
+# ✅ Keep cached WebSocket permissions in step with sharing changes
+@receiver(post_save, sender=DocumentShare)
+@receiver(post_delete, sender=DocumentShare)
+def share_changed(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: access.changed(instance.document_id, instance.shared_with_id)
+    )
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: access.changed(instance.pk))
+
+
+# ✅ Stop authenticating cached tokens of deactivated or deleted users
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if not instance.is_active:
+        transaction.on_commit(lambda: middleware.forget_user(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk  # None once the delete finishes
+    transaction.on_commit(lambda: middleware.forget_user(user_id))
+
+
+# ✅ Keep the search index up to date; a failed reindex never fails the save
+@receiver(storage.content_changed)
+def content_changed(sender, document_id, content, **kwargs):
+    transaction.on_commit(lambda: search.index_content(document_id, content), robust=True)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None:
+        transaction.on_commit(lambda: search.index_document(instance.pk), robust=True)
+    elif "title" in update_fields:
+        transaction.on_commit(
+            lambda: search.index_title(instance.pk, instance.title), robust=True
+        )
+
+
+@receiver(post_delete, sender=Document)
+def document_unindexed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search.remove_document(instance.pk), robust=True)
+
+
+# ✅ Drop cached dashboard lists of everyone who can see a changed document
+def _share_owner_id(share):
+    if DocumentShare.document.is_cached(share):
+        return share.document.owner_id
+    # Read now: after a cascading delete the document is gone by commit time
+    return Document.objects.filter(pk=share.document_id).values_list("owner_id", flat=True).first()
+
+
+@receiver(post_save, sender=DocumentShare)
+@receiver(post_delete, sender=DocumentShare)
+def share_listed(sender, instance, **kwargs):
+    # The owner's list shows whether a document is shared
+    users = [instance.shared_with_id, _share_owner_id(instance)]
+    transaction.on_commit(lambda: doclists.invalidate(filter(None, users)), robust=True)
+
+
+@receiver(post_save, sender=Document)
+def document_listed(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: doclists.invalidate([instance.owner_id]), robust=True)
+    else:
+        transaction.on_commit(lambda: doclists.invalidate_document(instance.pk), robust=True)
+
+
+@receiver(post_delete, sender=Document)
+def document_unlisted(sender, instance, **kwargs):
+    # Shares are deleted first and drop their users' lists themselves
+    transaction.on_commit(lambda: doclists.invalidate([instance.owner_id]), robust=True)
+
+
+@receiver(storage.content_changed)
+def content_relisted(sender, document_id, **kwargs):
+    # Content edits move updated_at, which the list shows and sorts by
+    transaction.on_commit(lambda: doclists.invalidate_document(document_id), robust=True)
+
+
+# ✅ Keep a version history; the initial content is always kept
+@receiver(post_save, sender=Document)
+def document_versioned(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: versions.record(instance.pk, instance.revision, instance.content, force=True),
+            robust=True,
+        )
+
+
+@receiver(storage.content_changed)
+def content_versioned(sender, document_id, content, revision, **kwargs):
+    transaction.on_commit(lambda: versions.record(document_id, revision, content), robust=True)
@@ -0,0 +1,216 @@
+"""
+Snapshot + operation-log persistence for document content.
+
+``Document.content`` is a compacted snapshot taken at ``snapshot_revision``.
+Every change after that is appended as a small ``DocumentOperation`` row, so a
+save costs one INSERT proportional to the edit rather than a rewrite of the
+whole blob. Once ``SNAPSHOT_INTERVAL`` operations have piled up past the
+snapshot, the next save folds them into a fresh snapshot.
+
+Loading replays the trailing operations on top of the snapshot.
+
+Besides text operations and full replacements, structured content can be
+changed with RFC 6902 JSON Patches (``commit_operation``), so a REST edit is
+logged at the size of the edit too.
+
+``content_changed`` is sent with ``document_id``, the new ``content`` and its
+``revision`` whenever operations are appended, whichever path the edit came
+in by.
+"""
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import jsonpatch, ot
+from .conf import sync_setting
+from .models import Document, DocumentOperation
+
+content_changed = Signal()
+
+
+class RevisionConflict(Exception):
+    """The document moved past the revision a write was based on."""
+
+
+def apply_operation(content, kind, operation):
+    if kind == DocumentOperation.REPLACE:
+        return operation
+    if kind == DocumentOperation.PATCH:
+        return jsonpatch.apply(content, operation)
+    return ot.apply("" if content is None else content, operation)
+
+
+def replay(content, operations):
+    """Apply ``(kind, operation)`` pairs to ``content`` in order."""
+    for kind, operation in operations:
+        content = apply_operation(content, kind, operation)
+    return content
+
+
+def _trailing_operations(document_id, after_revision):
+    return DocumentOperation.objects.filter(
+        document_id=document_id, revision__gt=after_revision
+    ).order_by("revision").values_list("kind", "operation")
+
+
+def current_content(document):
+    """
+    The live content of ``document``: its snapshot plus any trailing
+    operations, taken from ``document.trailing_operations`` when prefetched.
+    """
+    if document.revision == document.snapshot_revision:
+        return document.content
+    trailing = getattr(document, "trailing_operations", None)
+    if trailing is not None:
+        # Already in revision order (DocumentOperation.Meta.ordering)
+        operations = [(op.kind, op.operation) for op in trailing]
+    else:
+        operations = _trailing_operations(document.pk, document.snapshot_revision)
+    return replay(document.content, operations)
+
+
+def load_document(document_id):
+    """Return ``(content, revision)`` for a document, or None if it does not exist."""
+    row = Document.objects.filter(pk=document_id).values(
+        "content", "revision", "snapshot_revision"
+    ).first()
+    if row is None:
+        return None
+    content = row["content"]
+    if row["revision"] != row["snapshot_revision"]:
+        content = replay(content, _trailing_operations(document_id, row["snapshot_revision"]))
+    return content, row["revision"]
+
+
+def operations_since(document_id, revision, current_revision=None):
+    """
+    Return the ``(kind, operation)`` pairs that take a client from ``revision``
+    to the current one, or None if the log no longer reaches back that far.
+
+    With ``current_revision`` every operation up to it must still be logged;
+    compaction can prune a document's whole log, which otherwise looks like
+    nothing was missed.
+    """
+    operations = DocumentOperation.objects.filter(document_id=document_id, revision__gt=revision)
+    if current_revision is not None:
+        operations = operations.filter(revision__lte=current_revision)
+    rows = list(operations.order_by("revision").values_list("revision", "kind", "operation"))
+    if rows and rows[0][0] != revision + 1:
+        return None
+    if current_revision is not None and len(rows) != current_revision - revision:
+        return None
+    return [(kind, operation) for _, kind, operation in rows]
+
+
+def append_operations(document_id, base_revision, entries, content):
+    """
+    Append ``entries`` (``(kind, operation, author_id)`` tuples) on top of
+    ``base_revision`` and return the new revision.
+
+    ``content`` is the document after the entries are applied; it is only
+    written when a new snapshot is due. Raises ``RevisionConflict`` if another
+    writer has already moved the document past ``base_revision``.
+    """
+    if not entries:
+        return base_revision
+
+    revision = base_revision + len(entries)
+    try:
+        with transaction.atomic():
+            document = (
+                Document.objects.select_for_update()
+                .only("revision", "snapshot_revision")
+                .get(pk=document_id)
+            )
+            if document.revision != base_revision:
+                raise RevisionConflict(
+                    f"Document {document_id} is at revision {document.revision}, not {base_revision}."
+                )
+            DocumentOperation.objects.bulk_create([
+                DocumentOperation(
+                    document_id=document_id,
+                    revision=base_revision + offset,
+                    kind=kind,
+                    operation=operation,
+                    author_id=author_id,
+                )
+                for offset, (kind, operation, author_id) in enumerate(entries, start=1)
+            ])
+
+            fields = {"revision": revision, "updated_at": timezone.now()}
+            if revision - document.snapshot_revision >= sync_setting("SNAPSHOT_INTERVAL"):
+                fields.update(content=content, snapshot_revision=revision)
+            Document.objects.filter(pk=document_id).update(**fields)
+    except IntegrityError as exc:
+        # Another writer claimed one of these revisions first
+        raise RevisionConflict(str(exc)) from exc
+    content_changed.send(sender=Document, document_id=document_id, content=content, revision=revision)
+    return revision
+
+
+def commit_content(document, content, author=None):
+    """
+    Save a full replacement of ``document``'s content, as sent over REST.
+
+    Text replacing text is stored as a diff, so only the changed span is
+    logged. ``document`` is refreshed with the new revision fields.
+    """
+    author_id = getattr(author, "pk", None)
+    with transaction.atomic():
+        locked = Document.objects.select_for_update().get(pk=document.pk)
+        current = current_content(locked)
+        if content == current:
+            return locked.revision
+        if isinstance(current, str) and isinstance(content, str):
+            entry = (DocumentOperation.TEXT, ot.diff(current, content), author_id)
+        else:
+            entry = (DocumentOperation.REPLACE, content, author_id)
+        revision = append_operations(document.pk, locked.revision, [entry], content)
+
+    document.refresh_from_db(fields=["content", "revision", "snapshot_revision", "updated_at"])
+    return revision
+
+
+def commit_operation(document, kind, operation, base_revision, author=None):
+    """
+    Apply one text operation or JSON Patch sent over REST against
+    ``base_revision`` and log it. Returns ``(revision, operation)`` with the
+    operation as applied.
+
+    A text operation based on an older revision is transformed past the
+    text operations logged since; anything else must be based on the current
+    revision, or ``RevisionConflict`` is raised. Invalid operations, and text
+    operations on structured content, raise ``ot.InvalidOperation`` /
+    ``jsonpatch.InvalidPatch`` and nothing is saved.
+    """
+    author_id = getattr(author, "pk", None)
+    if kind == DocumentOperation.TEXT:
+        operation = ot.normalize(operation)
+    with transaction.atomic():
+        locked = Document.objects.select_for_update().get(pk=document.pk)
+        if base_revision > locked.revision:
+            raise RevisionConflict(
+                f"Document {document.pk} is at revision {locked.revision}, not {base_revision}."
+            )
+        if base_revision < locked.revision:
+            missed = operations_since(document.pk, base_revision, locked.revision)
+            if kind != DocumentOperation.TEXT or missed is None or any(
+                missed_kind != DocumentOperation.TEXT for missed_kind, _ in missed
+            ):
+                raise RevisionConflict(
+                    f"Document {document.pk} is at revision {locked.revision}, not {base_revision}."
+                )
+            for _, logged in missed:
+                # The logged operation came first, so it wins ties
+                _, operation = ot.transform(logged, operation)
+
+        content = current_content(locked)
+        if kind == DocumentOperation.TEXT and content is not None and not isinstance(content, str):
+            raise ot.InvalidOperation("Document content is not plain text.")
+        content = apply_operation(content, kind, operation)
+        revision = append_operations(
+            document.pk, locked.revision, [(kind, operation, author_id)], content
+        )
+
+    document.refresh_from_db(fields=["content", "revision", "snapshot_revision", "updated_at"])
+    return revision, operation
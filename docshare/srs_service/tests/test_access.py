@@ -0,0 +1,52 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from srs_service import access
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+level = async_to_sync(access.level)
+
+
+class AccessCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.document = Document.objects.create(title="Notes", content="", owner=self.owner)
+        self.other = Document.objects.create(title="Other", content="", owner=self.owner)
+        self.share = DocumentShare.objects.create(
+            document=self.document, shared_with=self.reader, can_edit=False
+        )
+        access._levels.clear()
+
+    def test_levels(self):
+        self.assertEqual(level(self.document.pk, self.owner.pk), access.EDIT)
+        self.assertEqual(level(self.document.pk, self.reader.pk), access.READ)
+        self.assertEqual(level(self.other.pk, self.reader.pk), access.NONE)
+        self.assertEqual(level(self.document.pk, None), access.NONE)
+
+    def test_cached_levels_skip_the_database(self):
+        level(self.document.pk, self.reader.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(level(self.document.pk, self.reader.pk), access.READ)
+
+    def test_share_change_outdates_copies_held_by_other_processes(self):
+        level(self.document.pk, self.reader.pk)
+        key = access._key(self.document.pk, self.reader.pk)
+        elsewhere = access._levels.get(key)
+
+        self.share.can_edit = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.share.save()
+        # Another process never saw the change and still holds its copy
+        access._levels.set(key, elsewhere)
+        self.assertEqual(level(self.document.pk, self.reader.pk), access.EDIT)
+
+    def test_forgetting_everyone_is_scoped_to_the_document(self):
+        level(self.document.pk, self.reader.pk)
+        level(self.other.pk, self.reader.pk)
+        access.forget(self.document.pk)
+        self.assertIsNone(access._levels.get(access._key(self.document.pk, self.reader.pk)))
+        self.assertIsNotNone(access._levels.get(access._key(self.other.pk, self.reader.pk)))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from srs_service import middleware
+
+User = get_user_model()
+
+
+class CachedTokenTests(TestCase):
+    """The async views authenticate through the cached WebSocket token lookup."""
+
+    def setUp(self):
+        middleware._users.clear()
+        self.user = User.objects.create_user("owner", password="x")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def get(self):
+        return self.client.get("/api/async/documents/").status_code
+
+    def test_cached_user_skips_the_database(self):
+        self.assertEqual(self.get(), 200)
+        caches["default"].clear()  # No cached list page
+        with self.assertNumQueries(1):  # The list itself
+            self.assertEqual(self.get(), 200)
+
+    def test_deactivated_user_is_refused_at_once(self):
+        self.assertEqual(self.get(), 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get(), 401)
+
+    def test_deleted_user_is_refused_at_once(self):
+        self.assertEqual(self.get(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.get(), 401)
+
+    @override_settings(DOCUMENT_SYNC={**settings.DOCUMENT_SYNC, "HTTP_AUTH_CACHE_TTL": 0})
+    def test_changes_made_elsewhere_are_seen_within_the_http_ttl(self):
+        self.assertEqual(self.get(), 200)
+        # Another process deactivated the user: no signal reaches this one
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get(), 401)
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from srs_service import storage
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+STALE = '"0000000000000000000000000000000000000000"'
+
+
+class ConditionalRequestTests(TestCase):
+    """ETag / Last-Modified on the document detail and the writes that check them."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.other = User.objects.create_user("other", password="x")
+        self.document = Document.objects.create(title="Notes", content="hello", owner=self.owner)
+        self.url = f"/api/documents/{self.document.pk}/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def assertUnchanged(self):
+        self.assertEqual(storage.load_document(self.document.pk), ("hello", 0))
+        self.assertEqual(Document.objects.get(pk=self.document.pk).title, "Notes")
+
+    def test_validators_on_the_detail(self):
+        response = self.get()
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_if_none_match(self):
+        response = self.get(if_none_match=self.etag())
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag())
+        self.assertEqual(self.get(if_none_match=STALE).status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()["Last-Modified"]
+        self.assertEqual(self.get(if_modified_since=last_modified).status_code, 304)
+        self.assertEqual(self.get(if_modified_since="Mon, 01 Jan 2001 00:00:00 GMT").status_code, 200)
+
+    def test_stale_if_match_refuses_writes(self):
+        for method, path, data in (
+            ("put", self.url, {"title": "New", "content": "bye"}),
+            ("patch", self.url, {"title": "New"}),
+            ("delete", self.url, None),
+            ("patch", f"{self.url}content/", {"op": ["x"], "revision": 0}),
+        ):
+            with self.subTest(method=method, path=path), self.assertLogs("django.request", "WARNING"):
+                response = getattr(self.client, method)(path, data, format="json", headers={"if_match": STALE})
+                self.assertEqual(response.status_code, 412)
+                self.assertUnchanged()
+
+    def test_current_if_match_allows_writes(self):
+        response = self.client.patch(
+            f"{self.url}content/", {"op": [5, "!"], "revision": 0}, format="json",
+            headers={"if_match": self.etag()},
+        )
+        self.assertEqual(response.status_code, 200)
+        # The response carries the validators of the new state
+        self.assertEqual(response["ETag"], self.etag())
+
+    def test_etag_changes_with_a_share(self):
+        before = self.etag()
+        share = DocumentShare.objects.create(document=self.document, shared_with=self.other)
+        shared = self.etag()
+        self.assertNotEqual(shared, before)
+
+        share.can_edit = not share.can_edit
+        share.save()
+        self.assertNotEqual(self.etag(), shared)
+        self.assertEqual(self.get(if_none_match=shared).status_code, 200)
+
+    def test_etag_changes_with_the_title(self):
+        before = self.etag()
+        self.assertEqual(self.client.patch(self.url, {"title": "Renamed"}, format="json").status_code, 200)
+        self.assertNotEqual(self.etag(), before)
+        self.assertEqual(self.get(if_none_match=before).status_code, 200)
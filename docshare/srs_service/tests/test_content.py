@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from srs_service import jsonpatch, storage
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+
+class ContentPatchTests(TestCase):
+    """``PATCH /api/documents/<pk>/content/`` with text operations and JSON Patch."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.text = Document.objects.create(title="Text", content="hello", owner=self.owner)
+        self.tree = Document.objects.create(
+            title="Tree", content={"type": "doc", "content": []}, owner=self.owner
+        )
+        DocumentShare.objects.create(document=self.text, shared_with=self.reader, can_edit=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def patch(self, document, data):
+        return self.client.patch(f"/api/documents/{document.pk}/content/", data, format="json")
+
+    def assertUnchanged(self, document):
+        before = (document.content, document.revision)
+        self.assertEqual(storage.load_document(document.pk), before)
+
+    def test_operation(self):
+        response = self.patch(self.text, {"op": [5, " world"], "revision": 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"revision": 1, "op": [5, " world"]})
+        self.assertEqual(storage.load_document(self.text.pk), ("hello world", 1))
+
+    def test_operation_is_normalized(self):
+        response = self.patch(self.text, {"op": [2, 3, "!", ""], "revision": 0})
+        self.assertEqual(response.json(), {"revision": 1, "op": [5, "!"]})
+
+    def test_operation_on_an_old_revision_is_transformed(self):
+        self.patch(self.text, {"op": ["> "], "revision": 0})
+        response = self.patch(self.text, {"op": [5, "!"], "revision": 0})
+        self.assertEqual(response.json(), {"revision": 2, "op": [7, "!"]})
+        self.assertEqual(storage.load_document(self.text.pk), ("> hello!", 2))
+
+    def test_future_revision_conflicts(self):
+        response = self.patch(self.text, {"op": ["x"], "revision": 5})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["revision"], 0)
+        self.assertUnchanged(self.text)
+
+    def test_malformed_operations_are_refused(self):
+        for op in ("xyz", {"k": 1}, [True], [2.5], [{"a": 1}], [None], [99, "x"]):
+            with self.subTest(op=op):
+                response = self.patch(self.text, {"op": op, "revision": 0})
+                self.assertEqual(response.status_code, 400)
+                self.assertUnchanged(self.text)
+
+    def test_operation_on_structured_content_is_refused(self):
+        response = self.patch(self.tree, {"op": ["x"], "revision": 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertUnchanged(self.tree)
+
+    def test_json_patch(self):
+        patch = [{"op": "add", "path": "/content/-", "value": {"type": "paragraph"}}]
+        response = self.patch(self.tree, {"patch": patch, "revision": 0})
+        self.assertEqual(response.json(), {"revision": 1, "patch": patch})
+        self.assertEqual(
+            storage.load_document(self.tree.pk),
+            ({"type": "doc", "content": [{"type": "paragraph"}]}, 1),
+        )
+
+    def test_json_patch_needs_the_current_revision(self):
+        patch = [{"op": "replace", "path": "/type", "value": "x"}]
+        self.patch(self.tree, {"patch": patch, "revision": 0})
+        response = self.patch(self.tree, {"patch": patch, "revision": 0})
+        self.assertEqual(response.status_code, 409)
+
+    def test_failing_json_patch_saves_nothing(self):
+        for patch in (
+            [{"op": "add", "path": "/content/-", "value": 1}, {"op": "test", "path": "/type", "value": "x"}],
+            [{"op": "remove", "path": "/missing"}],
+            [{"op": "nope", "path": "/type"}],
+            {"op": "add"},
+        ):
+            with self.subTest(patch=patch):
+                response = self.patch(self.tree, {"patch": patch, "revision": 0})
+                self.assertEqual(response.status_code, 400)
+                self.assertUnchanged(self.tree)
+
+    def test_exactly_one_of_op_and_patch(self):
+        for data in ({"revision": 0}, {"op": ["x"], "patch": [], "revision": 0}):
+            with self.subTest(data=data):
+                self.assertEqual(self.patch(self.text, data).status_code, 400)
+
+    def test_read_only_users_are_refused(self):
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.patch(self.text, {"op": ["x"], "revision": 0}).status_code, 403)
+        self.assertUnchanged(self.text)
+
+
+class JSONPatchTests(SimpleTestCase):
+    def test_operations(self):
+        document = {"a": [1, 2], "b": {"c": "x"}}
+        patched = jsonpatch.apply(document, [
+            {"op": "add", "path": "/a/1", "value": 9},
+            {"op": "remove", "path": "/b/c"},
+            {"op": "copy", "from": "/a", "path": "/d"},
+            {"op": "move", "from": "/d/0", "path": "/e"},
+            {"op": "test", "path": "/e", "value": 1},
+        ])
+        self.assertEqual(patched, {"a": [1, 9, 2], "b": {}, "d": [9, 2], "e": 1})
+        self.assertEqual(document, {"a": [1, 2], "b": {"c": "x"}})
+
+    def test_diff_round_trips(self):
+        old = {"a": [1, 2, 3], "b": {"c": "x", "d": None}, "e": "y"}
+        new = {"a": [1, 3], "b": {"c": "z"}, "f": [{}]}
+        self.assertEqual(jsonpatch.apply(old, jsonpatch.diff(old, new)), new)
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from srs_service import directory
+
+User = get_user_model()
+
+
+class FindUsersTests(TestCase):
+    """Share-dialog typeahead over usernames and emails."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.users = {
+            name: User.objects.create_user(name, email=email, password="x")
+            for name, email in (
+                ("alice", "alice@example.com"),
+                ("Bob", "robert@example.com"),
+                ("bob", "bobby@example.com"),
+                ("bobcat", "cat@example.com"),
+                ("carol", "bob.c@example.com"),
+            )
+        }
+
+    def names(self, prefix, **kwargs):
+        users, _ = directory.find_users(prefix, **kwargs)
+        return [user["username"] for user in users]
+
+    def test_prefix_matches_username_or_email(self):
+        self.assertEqual(self.names("bob"), ["Bob", "bob", "bobcat", "carol"])
+        self.assertEqual(self.names("ROB"), ["Bob"])
+        self.assertEqual(self.names("cat"), ["bobcat"])
+        # Prefixes only
+        self.assertEqual(self.names("example"), [])
+
+    def test_requester_is_left_out_of_shared_pages(self):
+        self.assertEqual(self.names("bob", exclude_id=self.users["bob"].pk), ["Bob", "bobcat", "carol"])
+        # The same cached page, someone else asking
+        self.assertEqual(self.names("bob", exclude_id=self.users["carol"].pk), ["Bob", "bob", "bobcat"])
+
+    def test_after_pages_through_every_user(self):
+        seen, after = [], ""
+        while after is not None:
+            users, after = directory.find_users("", after=after, limit=1)
+            seen.extend(user["username"] for user in users)
+        self.assertEqual(seen, ["alice", "Bob", "bob", "bobcat", "carol"])
+
+    def test_after_around_the_requester(self):
+        users, after = directory.find_users("bob", exclude_id=self.users["Bob"].pk, limit=1)
+        self.assertEqual([user["username"] for user in users], ["bob"])
+        self.assertEqual(self.names("bob", exclude_id=self.users["Bob"].pk, after=after), ["bobcat", "carol"])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.users["alice"])
+        page = client.get("/api/users/", {"q": "b", "limit": 2}).json()
+        self.assertEqual([user["username"] for user in page["results"]], ["Bob", "bob"])
+        page = client.get("/api/users/", {"q": "b", "after": page["next"]}).json()
+        self.assertEqual([user["username"] for user in page["results"]], ["bobcat", "carol"])
+        self.assertIsNone(page["next"])
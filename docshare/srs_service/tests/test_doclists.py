@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from srs_service import ot, storage
+from srs_service.caching import aversioned_key, versioned_key
+from srs_service.models import Document, DocumentOperation, DocumentShare
+
+User = get_user_model()
+
+
+class VersionedKeyTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches["default"]
+        self.cache.clear()
+
+    def test_starts_from_the_clock_and_is_stable(self):
+        version = versioned_key(self.cache, "v")
+        self.assertGreater(version, 10 ** 18)
+        self.assertEqual(versioned_key(self.cache, "v"), version)
+        self.cache.incr("v")
+        self.assertEqual(versioned_key(self.cache, "v"), version + 1)
+
+    async def test_async(self):
+        version = await aversioned_key(self.cache, "v")
+        self.assertEqual(await aversioned_key(self.cache, "v"), version)
+        self.assertEqual(versioned_key(self.cache, "v"), version)
+
+
+class DocumentListInvalidationTests(TestCase):
+    """Cached dashboard pages are dropped by the model and content signals."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.document = self.change(
+            Document.objects.create, title="Notes", content="hello", owner=self.owner
+        )
+        self.share = self.change(DocumentShare.objects.create, document=self.document, shared_with=self.reader)
+
+    def change(self, write, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return write(*args, **kwargs)
+
+    def listed(self, user):
+        """``(id, title, is_shared, updated_at)`` of every document on the user's cached list."""
+        client = APIClient()
+        client.force_authenticate(user)
+        return [
+            (document["id"], document["title"], document["is_shared"], document["updated_at"])
+            for document in client.get("/api/documents/").json()["results"]
+        ]
+
+    def assertListsFollow(self, write, *args, **kwargs):
+        """Lists are cached; after ``write`` they match the database again."""
+        before = {user: self.listed(user) for user in (self.owner, self.reader)}
+        self.change(write, *args, **kwargs)
+        for user, page in before.items():
+            with self.subTest(user=user.username):
+                after = self.listed(user)
+                self.assertNotEqual(after, page)
+                caches["default"].clear()
+                self.assertEqual(after, self.listed(user))
+
+    def test_create(self):
+        self.assertListsFollow(
+            lambda: DocumentShare.objects.create(
+                document=Document.objects.create(title="New", content="", owner=self.owner),
+                shared_with=self.reader,
+            )
+        )
+
+    def test_rename(self):
+        def rename():
+            self.document.title = "Renamed"
+            self.document.save(update_fields=["title"])
+        self.assertListsFollow(rename)
+
+    def test_content_edit(self):
+        self.assertListsFollow(
+            storage.commit_operation, self.document, DocumentOperation.TEXT, ot.diff("hello", "hello!"), 0
+        )
+
+    def test_share_removed_and_added(self):
+        self.assertListsFollow(self.share.delete)
+        self.assertEqual(self.listed(self.reader), [])
+
+        other = User.objects.create_user("other", password="x")
+        before = self.listed(other)
+        self.change(DocumentShare.objects.create, document=self.document, shared_with=other)
+        self.assertEqual(before, [])
+        self.assertEqual([document[0] for document in self.listed(other)], [self.document.pk])
+        self.assertTrue(self.listed(self.owner)[0][2])
+
+    def test_delete(self):
+        self.assertListsFollow(self.document.delete)
+        self.assertEqual((self.listed(self.owner), self.listed(self.reader)), ([], []))
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from srs_service import storage
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+
+class DocumentWriteAccessTests(TestCase):
+    """Who may change or delete a document through the detail endpoint."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.editor = User.objects.create_user("editor", password="x")
+        self.document = Document.objects.create(title="Notes", content="hello", owner=self.owner)
+        DocumentShare.objects.create(document=self.document, shared_with=self.reader, can_edit=False)
+        DocumentShare.objects.create(document=self.document, shared_with=self.editor, can_edit=True)
+        self.url = f"/api/documents/{self.document.pk}/"
+
+    def as_user(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assertUnchanged(self):
+        self.assertEqual(storage.load_document(self.document.pk), ("hello", 0))
+        self.assertEqual(Document.objects.get(pk=self.document.pk).title, "Notes")
+
+    def test_read_only_users_cannot_write(self):
+        client = self.as_user(self.reader)
+        for method, data in (
+            ("put", {"title": "Notes", "content": "bye"}),
+            ("patch", {"content": "bye"}),
+            ("patch", {"title": "Mine"}),
+        ):
+            with self.subTest(method=method, data=data), self.assertLogs("django.request", "WARNING"):
+                response = getattr(client, method)(self.url, data, format="json")
+                self.assertEqual(response.status_code, 403)
+                self.assertIn("read-only", response.json()["error"])
+                self.assertUnchanged()
+
+    def test_editors_can_write_content(self):
+        response = self.as_user(self.editor).patch(self.url, {"content": "bye"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(storage.load_document(self.document.pk)[0], "bye")
+
+    def test_only_the_owner_can_delete(self):
+        for user in (self.reader, self.editor):
+            with self.subTest(user=user.username), self.assertLogs("django.request", "WARNING"):
+                self.assertEqual(self.as_user(user).delete(self.url).status_code, 403)
+                self.assertTrue(Document.objects.filter(pk=self.document.pk).exists())
+        self.assertEqual(self.as_user(self.owner).delete(self.url).status_code, 204)
+        self.assertFalse(Document.objects.filter(pk=self.document.pk).exists())
+
+    def test_strangers_get_not_found(self):
+        stranger = User.objects.create_user("stranger", password="x")
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.as_user(stranger).delete(self.url).status_code, 404)
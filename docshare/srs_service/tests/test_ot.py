@@ -0,0 +1,98 @@
+import random
+
+from django.test import SimpleTestCase
+
+from srs_service import ot
+
+
+def random_op(text, rng):
+    """A random valid operation on ``text``."""
+    op, index = [], 0
+    while index < len(text):
+        n = rng.randint(1, len(text) - index)
+        choice = rng.random()
+        if choice < 0.4:
+            op.append(n)
+            index += n
+        elif choice < 0.7:
+            op.append(-n)
+            index += n
+        else:
+            op.append(rng.choice(["x", "yz", "é", "\U0001f600"]))
+    if rng.random() < 0.5:
+        op.append("tail")
+    return ot.normalize(op)
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_merges_and_trims(self):
+        self.assertEqual(ot.normalize([2, 3, "a", "b", -1, -1, 4]), [5, "ab", -2])
+
+    def test_puts_inserts_before_deletes(self):
+        self.assertEqual(ot.normalize([1, -2, "x"]), [1, "x", -2])
+
+    def test_drops_empty_components(self):
+        self.assertEqual(ot.normalize(["", 3]), [])
+
+    def test_rejects_malformed_operations(self):
+        for op in ("xyz", {"k": 1}, None, 3, [True], [2.5], [{"a": 1}], [None], [[1]]):
+            with self.subTest(op=op), self.assertRaises(ot.InvalidOperation):
+                ot.normalize(op)
+
+
+class ApplyTests(SimpleTestCase):
+    def test_apply(self):
+        self.assertEqual(ot.apply("hello world", [6, "there ", -5]), "hello there ")
+
+    def test_trailing_text_is_retained(self):
+        self.assertEqual(ot.apply("hello", ["> "]), "> hello")
+
+    def test_lengths_are_code_points(self):
+        self.assertEqual(ot.apply("\U0001f600b", [1, -1, "c"]), "\U0001f600c")
+
+    def test_rejects_operations_longer_than_the_text(self):
+        with self.assertRaises(ot.InvalidOperation):
+            ot.apply("abc", [2, -2])
+
+
+class ComposeTransformTests(SimpleTestCase):
+    def test_compose_matches_sequential_apply(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            text = "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 12)))
+            a = random_op(text, rng)
+            b = random_op(ot.apply(text, a), rng)
+            self.assertEqual(ot.apply(text, ot.compose(a, b)), ot.apply(ot.apply(text, a), b))
+
+    def test_transform_converges(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            text = "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 12)))
+            a, b = random_op(text, rng), random_op(text, rng)
+            a_prime, b_prime = ot.transform(a, b)
+            self.assertEqual(
+                ot.apply(ot.apply(text, a), b_prime), ot.apply(ot.apply(text, b), a_prime)
+            )
+
+    def test_first_operation_wins_insert_ties(self):
+        a_prime, b_prime = ot.transform([1, "a"], [1, "b"])
+        self.assertEqual(ot.apply(ot.apply("xy", [1, "a"]), b_prime), "xaby")
+        self.assertEqual(ot.apply(ot.apply("xy", [1, "b"]), a_prime), "xaby")
+
+    def test_concurrent_deletes_of_the_same_text(self):
+        a_prime, b_prime = ot.transform([1, -3], [2, -3])
+        self.assertEqual(ot.apply(ot.apply("abcdef", [1, -3]), b_prime), "af")
+        self.assertEqual(ot.apply(ot.apply("abcdef", [2, -3]), a_prime), "af")
+
+
+class DiffTests(SimpleTestCase):
+    def test_diff_round_trips(self):
+        rng = random.Random(3)
+        for _ in range(300):
+            old = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 10)))
+            new = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 10)))
+            self.assertEqual(ot.apply(old, ot.diff(old, new)), new)
+
+    def test_diff_covers_only_the_changed_span(self):
+        self.assertEqual(ot.diff("hello world", "hello there world"), [6, "there "])
+        self.assertEqual(ot.diff("same", "same"), [])
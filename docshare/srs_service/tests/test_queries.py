@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+PAGE_SIZES = (1, 10, 50)
+
+
+class QueryCountTests(TestCase):
+    """Reads cost the same number of queries however many rows they return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner", password="x")
+        cls.others = [User.objects.create_user(f"user{i}", password="x") for i in range(3)]
+        for i in range(60):
+            owner = cls.user if i % 2 else cls.others[i % 3]
+            document = Document.objects.create(title=f"Document {i}", content="text", owner=owner)
+            for other in [cls.user, *cls.others][: i % 4 + 1]:
+                if other != owner:
+                    DocumentShare.objects.create(document=document, shared_with=other, can_edit=i % 3 == 0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        caches["default"].clear()  # No cached list pages
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_document_list(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size), self.assertNumQueries(1):
+                page = self.get(f"/api/documents/?page_size={page_size}")
+            self.assertEqual(len(page["results"]), page_size)
+
+    def test_document_list_next_page(self):
+        cursor = self.get("/api/documents/?page_size=10")["next"]
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get(cursor).json()["results"]), 10)
+
+    def test_document_detail(self):
+        for shares in (0, 1, 3):
+            document = Document.objects.create(title="Shared", content="text", owner=self.user)
+            for other in self.others[:shares]:
+                DocumentShare.objects.create(document=document, shared_with=other)
+            with self.subTest(shares=shares), self.assertNumQueries(5):
+                detail = self.get(f"/api/documents/{document.pk}/")
+            self.assertEqual(len(detail["shared_with"]), shares)
+
+    def test_share_list(self):
+        first = len(self.get("/api/shares/"))
+        DocumentShare.objects.create(
+            document=Document.objects.create(title="More", content="", owner=self.user),
+            shared_with=self.others[0],
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get("/api/shares/")), first + 1)
+
+    def test_async_document_list(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.get("/api/async/documents/")  # Caches the user behind the token
+        for page_size in PAGE_SIZES:
+            caches["default"].clear()
+            with self.subTest(page_size=page_size), self.assertNumQueries(1):
+                page = self.get(f"/api/async/documents/?page_size={page_size}")
+            self.assertEqual(len(page["results"]), page_size)
@@ -0,0 +1,78 @@
+from django.test import SimpleTestCase
+
+from srs_service import rendering, wire
+
+
+class PlainTests(SimpleTestCase):
+    def test_one_paragraph_per_line(self):
+        self.assertEqual(rendering.render_html("a\n\n<b>"), "<p>a</p><p><br></p><p>&lt;b&gt;</p>")
+
+
+class TiptapTests(SimpleTestCase):
+    def test_blocks_and_marks(self):
+        content = {"type": "doc", "content": [
+            {"type": "heading", "attrs": {"level": 2}, "content": [{"type": "text", "text": "Title"}]},
+            {"type": "paragraph", "content": [
+                {"type": "text", "text": "bold", "marks": [{"type": "bold"}]},
+                {"type": "text", "text": "link", "marks": [
+                    {"type": "link", "attrs": {"href": "https://example.com"}},
+                ]},
+            ]},
+        ]}
+        self.assertEqual(
+            rendering.render_html(content),
+            '<h2>Title</h2><p><strong>bold</strong>'
+            '<a href="https://example.com" rel="noopener noreferrer">link</a></p>',
+        )
+
+    def test_unsafe_urls_are_dropped(self):
+        content = {"type": "doc", "content": [
+            {"type": "image", "attrs": {"src": "javascript:alert(1)"}},
+            {"type": "text", "text": "x", "marks": [
+                {"type": "link", "attrs": {"href": "javascript:alert(1)"}},
+            ]},
+        ]}
+        self.assertEqual(rendering.render_html(content), "x")
+
+    def test_malformed_attrs_and_marks_are_ignored(self):
+        for content, html in (
+            ({"type": "doc", "content": [{"type": "heading", "attrs": "x"}]}, "<h1></h1>"),
+            ({"type": "doc", "content": [{"type": "image", "attrs": ["x"]}]}, ""),
+            ({"type": "text", "text": "a", "marks": [{"type": "link", "attrs": "x"}]}, "a"),
+            ({"type": "text", "text": "a", "marks": 5}, "a"),
+            ({"type": "text", "text": "a", "marks": ["bold", None]}, "a"),
+        ):
+            with self.subTest(content=content):
+                self.assertEqual(rendering.render_html(content), html)
+
+
+class QuillTests(SimpleTestCase):
+    def test_lines_lists_and_inline_formats(self):
+        delta = {"ops": [
+            {"insert": "Title"}, {"insert": "\n", "attributes": {"header": 1}},
+            {"insert": "one\ntwo"}, {"insert": "\n", "attributes": {"list": "bullet"}},
+            {"insert": "bold", "attributes": {"bold": True}}, {"insert": "\n"},
+        ]}
+        self.assertEqual(
+            rendering.render_html(delta),
+            "<h1>Title</h1><p>one</p><ul><li>two</li></ul><p><strong>bold</strong></p>",
+        )
+
+    def test_malformed_attributes_are_ignored(self):
+        for attributes in (["x"], "bold", 1):
+            with self.subTest(attributes=attributes):
+                delta = {"ops": [{"insert": "a\n", "attributes": attributes}]}
+                self.assertEqual(rendering.render_html(delta), "<p>a</p>")
+
+
+class ContentKeyTests(SimpleTestCase):
+    def test_independent_of_key_order(self):
+        self.assertEqual(
+            rendering.content_key({"a": 1, "b": [2]}), rendering.content_key({"b": [2], "a": 1})
+        )
+
+    def test_integers_wider_than_64_bits(self):
+        content = {"type": "doc", "content": [{"type": "heading", "attrs": {"level": 2 ** 70}}]}
+        self.assertNotEqual(rendering.content_key(content), rendering.content_key({}))
+        self.assertEqual(rendering.render_html(content), "<h1></h1>")
+        self.assertEqual(wire.decode(wire.encode(content)), content)
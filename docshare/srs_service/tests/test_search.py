@@ -0,0 +1,91 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from srs_service import ot, search, storage
+from srs_service.models import Document, DocumentOperation, DocumentShare
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    """``GET /api/documents/search/`` and the index kept by the signals."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.stranger = User.objects.create_user("stranger", password="x")
+        self.mine = self.create("Garden plans", "tomatoes and basil", self.owner)
+        self.shared = self.create("Recipes", "basil pesto", self.owner)
+        self.change(DocumentShare.objects.create, document=self.shared, shared_with=self.reader)
+        # Shared only with someone else
+        self.theirs = self.create("Secret basil", "basil", self.stranger)
+        self.change(DocumentShare.objects.create, document=self.theirs, shared_with=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def change(self, write, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return write(*args, **kwargs)
+
+    def create(self, title, content, owner):
+        return self.change(Document.objects.create, title=title, content=content, owner=owner)
+
+    def found(self, query, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        response = self.client.get("/api/documents/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [document["id"] for document in response.json()["results"]]
+
+    def test_only_visible_documents_are_found(self):
+        self.assertEqual(self.found("basil"), [self.shared.pk])
+        self.assertEqual(sorted(self.found("basil", self.owner)), [self.mine.pk, self.shared.pk, self.theirs.pk])
+        self.assertEqual(self.found("tomatoes", self.stranger), [])
+
+    def test_content_changes_are_reindexed(self):
+        self.change(
+            storage.commit_operation,
+            self.shared, DocumentOperation.TEXT, ot.diff("basil pesto", "walnut pesto"), 0,
+        )
+        self.assertEqual(self.found("walnut"), [self.shared.pk])
+        self.assertEqual(self.found("basil"), [])
+
+    def test_title_changes_are_reindexed(self):
+        self.shared.title = "Sauces"
+        with mock.patch.object(search, "index_document", wraps=search.index_document) as index_document:
+            self.change(self.shared.save, update_fields=["title"])
+        # Only the title is rewritten
+        index_document.assert_not_called()
+        self.assertEqual(self.found("sauces"), [self.shared.pk])
+        self.assertEqual(self.found("recipes"), [])
+        self.assertEqual(self.found("pesto"), [self.shared.pk])
+
+    def test_deleted_documents_are_removed(self):
+        self.change(self.shared.delete)
+        self.assertEqual(self.found("pesto"), [])
+        if connection.vendor in search.BACKENDS:
+            column = "rowid" if connection.vendor == "sqlite" else "document_id"
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {search.TABLE} WHERE {column} = %s", [self.shared.pk])
+                self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_missing_query(self):
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.client.get("/api/documents/search/").status_code, 400)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite backend only")
+    def test_many_visible_documents_use_the_access_subquery(self):
+        private = self.create("Private", "basil", self.stranger)
+        with mock.patch.object(search, "SEEK_LIMIT", 1):
+            # One visible document: looked up by id
+            self.assertEqual(self.found("basil"), [self.shared.pk])
+            # More: matches filtered on the access subquery
+            self.assertEqual(
+                sorted(self.found("basil", self.owner)), [self.mine.pk, self.shared.pk, self.theirs.pk]
+            )
+            self.assertEqual(sorted(self.found("basil", self.stranger)), [self.theirs.pk, private.pk])
+            self.assertEqual(self.found("tomatoes", self.stranger), [])
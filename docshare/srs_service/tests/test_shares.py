@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from srs_service.models import Document, DocumentShare
+
+User = get_user_model()
+
+
+class BulkShareTests(TestCase):
+    """``POST /api/shares/bulk/``: many documents with many users at once."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.stranger = User.objects.create_user("stranger", password="x")
+        self.users = [User.objects.create_user(f"user{i}", password="x") for i in range(2)]
+        self.documents = [
+            Document.objects.create(title=f"Document {i}", content="", owner=self.owner) for i in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def bulk(self, documents=None, users=None, can_edit=False):
+        return self.client.post("/api/shares/bulk/", {
+            "document_ids": [document.pk for document in documents or self.documents],
+            "shared_with_ids": [user.pk for user in users or self.users],
+            "can_edit": can_edit,
+        }, format="json")
+
+    def shares(self):
+        return set(DocumentShare.objects.values_list("document_id", "shared_with_id", "can_edit"))
+
+    def test_creates_every_pair(self):
+        response = self.bulk()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"created": 4, "updated": 0, "unchanged": 0})
+        self.assertEqual(self.shares(), {
+            (document.pk, user.pk, False) for document in self.documents for user in self.users
+        })
+
+    def test_upsert_flips_can_edit_and_counts(self):
+        DocumentShare.objects.create(document=self.documents[0], shared_with=self.users[0], can_edit=False)
+        DocumentShare.objects.create(document=self.documents[1], shared_with=self.users[0], can_edit=True)
+
+        response = self.bulk(can_edit=True)
+        self.assertEqual(response.json(), {"created": 2, "updated": 1, "unchanged": 1})
+        self.assertEqual(self.shares(), {
+            (document.pk, user.pk, True) for document in self.documents for user in self.users
+        })
+        self.assertEqual(self.bulk(can_edit=True).json(), {"created": 0, "updated": 0, "unchanged": 4})
+
+    def test_documents_owned_by_someone_else_are_refused(self):
+        theirs = Document.objects.create(title="Theirs", content="", owner=self.stranger)
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.bulk(documents=[self.documents[0], theirs])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["document_ids"], [theirs.pk])
+        self.assertEqual(self.shares(), set())
+
+    def test_unknown_users_are_refused(self):
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.client.post("/api/shares/bulk/", {
+                "document_ids": [self.documents[0].pk], "shared_with_ids": [self.users[0].pk, 9999],
+            }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["shared_with_ids"], [9999])
+        self.assertEqual(self.shares(), set())
+
+    def test_the_owner_is_skipped(self):
+        response = self.bulk(users=[self.owner, self.users[0]])
+        self.assertEqual(response.json(), {"created": 2, "updated": 0, "unchanged": 0})
+        self.assertNotIn(self.owner.pk, {user_id for _, user_id, _ in self.shares()})
+
+    def test_sockets_and_lists_are_told_on_commit(self):
+        DocumentShare.objects.create(document=self.documents[0], shared_with=self.users[0], can_edit=False)
+        with mock.patch("srs_service.access.bulk_changed") as bulk_changed, \
+                mock.patch("srs_service.doclists.invalidate") as invalidate:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.bulk()
+            bulk_changed.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        # The unchanged pair is left out
+        changed = {
+            (self.documents[0].pk, self.users[1].pk),
+            (self.documents[1].pk, self.users[0].pk),
+            (self.documents[1].pk, self.users[1].pk),
+        }
+        (pairs,), _ = bulk_changed.call_args
+        self.assertEqual(set(pairs), changed)
+        (user_ids,), _ = invalidate.call_args
+        self.assertEqual(set(user_ids), {self.owner.pk, *(user.pk for user in self.users)})
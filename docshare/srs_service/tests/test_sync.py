@@ -0,0 +1,346 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from srs_service import rooms, storage
+from srs_service.middleware import JWTAuthMiddlewareStack
+from srs_service.models import Document, DocumentShare
+from srs_service.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+load_document = database_sync_to_async(storage.load_document)
+
+
+def sync_settings(**overrides):
+    return override_settings(DOCUMENT_SYNC={**settings.DOCUMENT_SYNC, **overrides})
+
+
+@sync_settings(FLUSH_DELAY=0.05, PRESENCE_TICK=0.01)
+class DocumentSyncTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.reader = User.objects.create_user("reader", password="x")
+        self.document = Document.objects.create(title="Notes", content="hello", owner=self.owner)
+        DocumentShare.objects.create(document=self.document, shared_with=self.reader, can_edit=False)
+
+    def tearDown(self):
+        left_open = dict(rooms._rooms)
+        rooms._rooms.clear()
+        self.assertEqual(left_open, {}, "a test left a room open")
+
+    async def connect(self, user, since_revision=None):
+        path = f"/ws/doc/{self.document.pk}/?token={AccessToken.for_user(user)}"
+        if since_revision is not None:
+            path += f"&since_revision={since_revision}"
+        socket = WebsocketCommunicator(application, path)
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def receive(self, socket, type):
+        """The next frame of ``type``, skipping presence traffic."""
+        while True:
+            frame = await socket.receive_json_from()
+            if frame["type"] == type:
+                return frame
+            self.assertIn(frame["type"], ("join", "leave", "presence"), frame)
+
+    async def test_join_edit_ack_and_broadcast(self):
+        alice = await self.connect(self.owner)
+        snapshot = await self.receive(alice, "snapshot")
+        self.assertEqual((snapshot["content"], snapshot["revision"]), ("hello", 0))
+        bob = await self.connect(self.reader)
+        await self.receive(bob, "snapshot")
+
+        await alice.send_json_to({"op": [5, " world"], "revision": 0})
+        self.assertEqual(await self.receive(alice, "ack"), {"type": "ack", "revision": 1})
+        relayed = await self.receive(bob, "op")
+        self.assertEqual((relayed["op"], relayed["revision"]), ([5, " world"], 1))
+
+        await alice.disconnect()
+        await bob.disconnect()
+        content, revision = await load_document(self.document.pk)
+        self.assertEqual((content, revision), ("hello world", 1))
+
+    async def test_concurrent_edits_are_transformed(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        await alice.send_json_to({"op": ["A"], "revision": 0})
+        await self.receive(alice, "ack")
+        # Also based on revision 0: moved past the insert before it
+        await alice.send_json_to({"op": [5, "!"], "revision": 0})
+        await self.receive(alice, "ack")
+        await alice.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ("Ahello!", 2))
+
+    async def test_reconnect_catches_up(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        bob = await self.connect(self.owner)
+        await self.receive(bob, "snapshot")
+        await bob.disconnect()
+        await alice.send_json_to({"op": ["1"], "revision": 0})
+        await self.receive(alice, "ack")
+        await alice.send_json_to({"op": ["2"], "revision": 1})
+        await self.receive(alice, "ack")
+
+        bob = await self.connect(self.owner, since_revision=0)
+        catchup = await self.receive(bob, "catchup")
+        self.assertEqual((catchup["ops"], catchup["revision"]), ([["1"], ["2"]], 2))
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_read_only_edits_are_refused(self):
+        bob = await self.connect(self.reader)
+        await self.receive(bob, "snapshot")
+        await bob.send_json_to({"op": ["x"], "revision": 0})
+        error = await self.receive(bob, "error")
+        self.assertIn("read-only", error["message"])
+        await bob.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ("hello", 0))
+
+    async def test_invalid_edit_gets_an_error_and_resync_a_snapshot(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        await alice.send_json_to({"op": [99, "x"], "revision": 0})
+        await self.receive(alice, "error")
+        await alice.send_json_to({"resync": True})
+        snapshot = await self.receive(alice, "snapshot")
+        self.assertEqual((snapshot["content"], snapshot["revision"]), ("hello", 0))
+        await alice.disconnect()
+
+    async def test_a_full_shard_refuses_the_edit_instead_of_dropping_the_socket(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        send_command = rooms.send_command
+
+        async def full_for_edits(command):
+            if command["type"] == "room.edit":
+                raise ChannelFull()
+            await send_command(command)
+
+        with mock.patch.object(rooms, "send_command", full_for_edits):
+            await alice.send_json_to({"op": ["x"], "revision": 0})
+            self.assertIn("busy", (await self.receive(alice, "error"))["message"])
+        await alice.send_json_to({"op": ["x"], "revision": 0})
+        await self.receive(alice, "ack")
+        await alice.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ("xhello", 1))
+
+    async def lagging(self):
+        """Alice reports revision 0 applied; Bob then makes three edits."""
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        await alice.send_json_to({"op": ["a"], "revision": 0, "applied": 0})
+        await self.receive(alice, "ack")
+        bob = await self.connect(self.owner)
+        await self.receive(bob, "snapshot")
+        for revision in (1, 2, 3):
+            await bob.send_json_to({"op": ["b"], "revision": revision})
+            await self.receive(bob, "ack")
+        return alice, bob
+
+    @sync_settings(FLUSH_DELAY=0.05, PRESENCE_TICK=0.01, LAG_LIMIT=2)
+    async def test_clients_that_fall_behind_what_they_report_are_resynced(self):
+        alice, bob = await self.lagging()
+        self.assertEqual((await self.receive(alice, "op"))["revision"], 2)
+        self.assertGreaterEqual((await self.receive(alice, "snapshot"))["revision"], 3)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    @sync_settings(FLUSH_DELAY=0.05, PRESENCE_TICK=0.01, LAG_LIMIT=2, RESYNC_LIMIT=0)
+    async def test_clients_that_keep_falling_behind_are_disconnected(self):
+        alice, bob = await self.lagging()
+        self.assertEqual((await self.receive(alice, "op"))["revision"], 2)
+        while (output := await alice.receive_output())["type"] != "websocket.close":
+            pass  # Presence frames sent before it gave up
+        self.assertEqual(output["code"], 4408)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    @sync_settings(FLUSH_DELAY=0.05, PRESENCE_TICK=0.01, LAG_LIMIT=0)
+    async def test_clients_that_never_report_are_not_checked(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        bob = await self.connect(self.owner)
+        await self.receive(bob, "snapshot")
+        await bob.send_json_to({"op": ["b"], "revision": 0})
+        self.assertEqual((await self.receive(alice, "op"))["revision"], 1)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_content_with_integers_wider_than_64_bits_opens(self):
+        content = {"type": "doc", "attrs": {"n": 2 ** 70}}
+        await database_sync_to_async(Document.objects.filter(pk=self.document.pk).update)(content=content)
+        alice = await self.connect(self.owner)
+        self.assertEqual((await self.receive(alice, "snapshot"))["content"], content)
+        await alice.disconnect()
+
+    async def test_strangers_are_turned_away(self):
+        stranger = await database_sync_to_async(User.objects.create_user)("stranger", password="x")
+        socket = WebsocketCommunicator(
+            application, f"/ws/doc/{self.document.pk}/?token={AccessToken.for_user(stranger)}"
+        )
+        connected, code = await socket.connect()
+        self.assertEqual((connected, code), (False, 4403))
+
+    @sync_settings(FLUSH_DELAY=60)
+    async def test_deleting_an_open_document_drops_its_room(self):
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        await alice.send_json_to({"op": ["x"], "revision": 0})
+        await self.receive(alice, "ack")
+        room = rooms._rooms[str(self.document.pk)]
+        self.assertEqual(len(room.unsaved), 1)
+
+        with self.assertLogs("srs_service.rooms", "WARNING"):
+            await database_sync_to_async(self.document.delete)()
+            self.assertEqual(await alice.receive_output(), {"type": "websocket.close", "code": 4403})
+            await alice.disconnect()
+        self.assertEqual((room.unsaved, room._flush_timer), ([], None))
+
+
+@sync_settings(FLUSH_DELAY=60, PRESENCE_TICK=0.01)
+class RestWriteTests(TransactionTestCase):
+    """REST writes to a document that is open over WebSockets."""
+
+    setUp = DocumentSyncTests.setUp
+    tearDown = DocumentSyncTests.tearDown
+    connect = DocumentSyncTests.connect
+    receive = DocumentSyncTests.receive
+
+    async def rest(self, method, path, data):
+        def call():
+            client = APIClient()
+            client.force_authenticate(self.owner)
+            return getattr(client, method)(path, data, format="json")
+        return await sync_to_async(call)()
+
+    async def edited(self):
+        """An open document with an edit the room has acked but not saved."""
+        alice = await self.connect(self.owner)
+        await self.receive(alice, "snapshot")
+        await alice.send_json_to({"op": [5, "!"], "revision": 0})
+        await self.receive(alice, "ack")
+        return alice
+
+    async def test_saving_the_same_text_keeps_live_edits_once(self):
+        alice = await self.edited()
+        response = await self.rest("patch", f"/api/documents/{self.document.pk}/", {"content": "hello!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await load_document(self.document.pk), ("hello!", 1))
+
+        bob = await self.connect(self.owner)
+        snapshot = await self.receive(bob, "snapshot")
+        self.assertEqual((snapshot["content"], snapshot["revision"]), ("hello!", 1))
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_replacement_builds_on_live_edits_and_is_relayed(self):
+        alice = await self.edited()
+        await self.rest("put", f"/api/documents/{self.document.pk}/", {"title": "Notes", "content": "HELLO!?"})
+        relayed = await self.receive(alice, "op")
+        self.assertEqual((relayed["op"], relayed["revision"]), (["HELLO!?", -6], 2))
+
+        bob = await self.connect(self.owner)
+        snapshot = await self.receive(bob, "snapshot")
+        self.assertEqual(snapshot["content"], "HELLO!?")
+        await alice.disconnect()
+        await bob.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ("HELLO!?", 2))
+
+    async def test_operation_on_an_old_revision_is_transformed_past_live_edits(self):
+        alice = await self.edited()
+        response = await self.rest(
+            "patch", f"/api/documents/{self.document.pk}/content/", {"op": ["> "], "revision": 0}
+        )
+        self.assertEqual(response.json(), {"revision": 2, "op": ["> "]})
+        relayed = await self.receive(alice, "op")
+        self.assertEqual((relayed["op"], relayed["revision"]), (["> "], 2))
+
+        # An edit sent before the client saw it is transformed past it
+        await alice.send_json_to({"op": [6, "?"], "revision": 1})
+        self.assertEqual((await self.receive(alice, "ack"))["revision"], 3)
+        await alice.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ("> hello!?", 3))
+
+    async def test_structured_replacement_resets_the_room(self):
+        alice = await self.edited()
+        await self.rest("patch", f"/api/documents/{self.document.pk}/", {"content": {"ops": []}})
+        snapshot = await self.receive(alice, "snapshot")
+        self.assertEqual((snapshot["content"], snapshot["revision"]), ({"ops": []}, 2))
+        await alice.disconnect()
+        self.assertEqual(await load_document(self.document.pk), ({"ops": []}, 2))
+
+
+class ShardDispatchTests(SimpleTestCase):
+    """Commands in a shard worker run per document, not one at a time."""
+
+    async def test_a_slow_document_does_not_hold_up_the_others(self):
+        release, ran = asyncio.Event(), []
+
+        async def slow(command):
+            await release.wait()
+            ran.append(command["n"])
+
+        async def fast(command):
+            ran.append(command["n"])
+
+        with mock.patch.dict(rooms._COMMANDS, {"room.slow": slow, "room.fast": fast}):
+            await rooms.dispatch({"type": "room.slow", "doc_id": "1", "n": 1})
+            await rooms.dispatch({"type": "room.fast", "doc_id": "1", "n": 2})
+            await rooms.dispatch({"type": "room.fast", "doc_id": "2", "n": 3})
+            await asyncio.sleep(0.01)
+            # Document 2 went ahead; document 1 keeps its order
+            self.assertEqual(ran, [3])
+            release.set()
+            await asyncio.sleep(0.01)
+        self.assertEqual(ran, [3, 1, 2])
+        self.assertEqual(rooms._mailboxes, {})
+
+    async def test_a_failing_command_does_not_stop_the_queue(self):
+        ran = []
+
+        async def failing(command):
+            raise RuntimeError("boom")
+
+        async def fast(command):
+            ran.append(command["n"])
+
+        with mock.patch.dict(rooms._COMMANDS, {"room.fail": failing, "room.fast": fast}):
+            with self.assertLogs("srs_service.rooms", "ERROR"):
+                await rooms.dispatch({"type": "room.fail", "doc_id": "1"})
+                await rooms.dispatch({"type": "room.fast", "doc_id": "1", "n": 1})
+                await asyncio.sleep(0.01)
+        self.assertEqual(ran, [1])
+
+    @mock.patch.object(rooms, "MAILBOX_SIZE", 1)
+    async def test_a_full_mailbox_waits_for_room(self):
+        release, ran = asyncio.Event(), []
+
+        async def slow(command):
+            await release.wait()
+            ran.append(command["n"])
+
+        with mock.patch.dict(rooms._COMMANDS, {"room.slow": slow}):
+            await rooms.dispatch({"type": "room.slow", "doc_id": "1", "n": 1})
+            waiting = asyncio.ensure_future(rooms.dispatch({"type": "room.slow", "doc_id": "1", "n": 2}))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            release.set()
+            await waiting
+            await asyncio.sleep(0.01)
+        self.assertEqual(ran, [1, 2])
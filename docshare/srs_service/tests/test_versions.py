@@ -0,0 +1,189 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from srs_service import ot, storage, versions
+from srs_service.models import Document, DocumentOperation
+
+User = get_user_model()
+
+REPLACE, TEXT, PATCH = DocumentOperation.REPLACE, DocumentOperation.TEXT, DocumentOperation.PATCH
+
+# Long enough that a one-word edit is stored as a delta, not a keyframe
+BASE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+
+# A version per edit and a keyframe every third one
+HISTORY = {"VERSION_INTERVAL": 0, "VERSION_KEYFRAME_INTERVAL": 3, "SNAPSHOT_INTERVAL": 1000}
+
+
+def history_settings(**overrides):
+    return override_settings(DOCUMENT_SYNC={**settings.DOCUMENT_SYNC, **HISTORY, **overrides})
+
+
+@history_settings()
+class VersionHistoryTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="x")
+        self.document = self.create(BASE)
+
+    def create(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Document.objects.create(title="Notes", content=content, owner=self.owner)
+
+    def edit(self, kind, operation, document=None):
+        document = document or self.document
+        with self.captureOnCommitCallbacks(execute=True):
+            storage.commit_operation(document, kind, operation, document.revision)
+
+    def write(self, words):
+        """One edit per word; returns the content at every revision."""
+        history = [BASE]
+        for word in words:
+            history.append(history[-1] + word)
+            self.edit(TEXT, ot.diff(history[-2], history[-1]))
+        return history
+
+    def stored(self, document=None):
+        return list(
+            (document or self.document).versions.order_by("revision").values_list("revision", "kind", "depth")
+        )
+
+    def test_deltas_between_periodic_keyframes(self):
+        self.write("abcdefg")
+        self.assertEqual(self.stored(), [
+            (0, REPLACE, 0), (1, TEXT, 1), (2, TEXT, 2),
+            (3, REPLACE, 0), (4, TEXT, 1), (5, TEXT, 2),
+            (6, REPLACE, 0), (7, TEXT, 1),
+        ])
+
+    def test_every_revision_is_rebuilt(self):
+        history = self.write(["one ", "two ", "three ", "four ", "five "])
+        for revision, content in enumerate(history):
+            with self.subTest(revision=revision):
+                self.assertEqual(versions.content_at(self.document, revision), content)
+
+    def test_rebuilding_a_version_is_one_query(self):
+        self.write("abcde")
+        with self.assertNumQueries(1):
+            self.assertEqual(versions.content_at(self.document, 2), BASE + "ab")
+
+    @history_settings(VERSION_INTERVAL=3600)
+    def test_revisions_between_versions_come_from_the_log(self):
+        history = self.write("abc")
+        self.assertEqual(self.stored(), [(0, REPLACE, 0)])
+        self.assertEqual(versions.content_at(self.document, 2), history[2])
+
+        DocumentOperation.objects.filter(document=self.document, revision=1).delete()
+        with self.assertRaises(versions.VersionUnavailable):
+            versions.content_at(self.document, 2)
+
+    def test_structured_content_is_stored_as_patches(self):
+        # Large enough that a patch is smaller than the content
+        document = self.create({"items": [], "title": "x" * 200})
+        for item in range(4):
+            self.edit(PATCH, [{"op": "add", "path": "/items/-", "value": item}], document)
+        self.assertEqual([kind for _, kind, _ in self.stored(document)], [REPLACE, PATCH, PATCH, REPLACE, PATCH])
+        self.assertEqual(versions.content_at(document, 2)["items"], [0, 1])
+
+    def test_unknown_revisions(self):
+        self.write("ab")
+        for revision in (3, 100):
+            with self.subTest(revision=revision), self.assertRaises(versions.VersionUnavailable):
+                versions.content_at(self.document, revision)
+
+    def test_endpoints(self):
+        self.write("abcd")
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        page = client.get(f"/api/documents/{self.document.pk}/versions/?limit=3").json()
+        self.assertEqual((page["revision"], page["next"]), (4, 2))
+        self.assertEqual([version["revision"] for version in page["results"]], [4, 3, 2])
+        older = client.get(f"/api/documents/{self.document.pk}/versions/?before=2").json()
+        self.assertEqual([version["revision"] for version in older["results"]], [1, 0])
+
+        version = client.get(f"/api/documents/{self.document.pk}/versions/2/").json()
+        self.assertEqual((version["revision"], version["content"]), (2, BASE + "ab"))
+        self.assertEqual(client.get(f"/api/documents/{self.document.pk}/versions/9/").status_code, 404)
+
+
+@history_settings(VERSION_DETAIL_DAYS=7, VERSION_RETENTION_DAYS=0, SNAPSHOT_INTERVAL=2)
+class CompactionTests(TestCase):
+    setUp = VersionHistoryTests.setUp
+    create = VersionHistoryTests.create
+    edit = VersionHistoryTests.edit
+    write = VersionHistoryTests.write
+    stored = VersionHistoryTests.stored
+
+    def age(self, ages):
+        """Backdate versions and their logged operations: ``{revision: days old}``."""
+        now = timezone.now()
+        for revision, days in ages.items():
+            created_at = now - timedelta(days=days)
+            self.document.versions.filter(revision=revision).update(created_at=created_at)
+            DocumentOperation.objects.filter(document=self.document, revision=revision).update(
+                created_at=created_at
+            )
+        return now
+
+    def test_keeps_recent_versions_and_the_last_of_each_older_day(self):
+        history = self.write("abcdefg")
+        now = self.age({0: 12.2, 1: 12.1, 2: 12, 3: 10.1, 4: 10, 5: 9, 6: 1, 7: 0})
+
+        deleted, _ = versions.compact(now)
+        self.assertEqual(deleted, 3)
+        self.assertEqual([revision for revision, _, _ in self.stored()], [2, 4, 5, 6, 7])
+        # The survivors are re-chained and still rebuild the same content
+        self.assertEqual(self.stored()[0][1:], (REPLACE, 0))
+        for revision, _, _ in self.stored():
+            with self.subTest(revision=revision):
+                self.assertEqual(versions.content_at(self.document, revision), history[revision])
+
+    def test_compacting_twice_changes_nothing(self):
+        self.write("abcd")
+        now = self.age({0: 20, 1: 19, 2: 19.5})
+        versions.compact(now)
+        before = self.stored()
+        self.assertEqual(versions.compact(now), (0, 0))
+        self.assertEqual(self.stored(), before)
+
+    @history_settings(VERSION_DETAIL_DAYS=7, VERSION_RETENTION_DAYS=11, SNAPSHOT_INTERVAL=2)
+    def test_retention_drops_older_versions(self):
+        history = self.write("abcd")
+        now = self.age({0: 30, 1: 20, 2: 10, 3: 1})
+        versions.compact(now)
+        # Revision 2 was a delta from a dropped version; 3 was a keyframe already
+        self.assertEqual(self.stored(), [(2, REPLACE, 0), (3, REPLACE, 0), (4, TEXT, 1)])
+        self.assertEqual(versions.content_at(self.document, 3), history[3])
+        with self.assertRaises(versions.VersionUnavailable):
+            versions.content_at(self.document, 1)
+
+    def test_prunes_operations_older_versions_make_redundant(self):
+        self.write("abcde")
+        now = self.age({0: 30, 1: 30, 2: 30, 3: 30, 4: 1, 5: 0})
+        self.document.refresh_from_db()
+        _, pruned = versions.compact(now)
+        # Old, covered by the snapshot and by stored versions
+        self.assertEqual(pruned, 3)
+        self.assertEqual(
+            list(DocumentOperation.objects.filter(document=self.document).values_list("revision", flat=True)),
+            [4, 5],
+        )
+        self.assertEqual(storage.load_document(self.document.pk), (BASE + "abcde", 5))
+
+    def test_stale_revisions_conflict_once_the_log_is_pruned(self):
+        self.write("abcd")
+        now = self.age({0: 30, 1: 30, 2: 30, 3: 30, 4: 30})
+        self.assertEqual(versions.compact(now)[1], 4)
+        self.assertFalse(DocumentOperation.objects.filter(document=self.document).exists())
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.patch(
+            f"/api/documents/{self.document.pk}/content/", {"op": ["X"], "revision": 0}, format="json"
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(storage.load_document(self.document.pk), (BASE + "abcd", 4))
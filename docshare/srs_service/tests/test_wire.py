@@ -0,0 +1,35 @@
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from srs_service import wire
+
+HUGE = {"type": "doc", "attrs": {"n": 2 ** 70}}
+
+
+class JSONCodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        payload = {"type": "op", "op": [1, "é"], "revision": 3}
+        self.assertEqual(wire.decode(wire.encode(payload)), payload)
+
+    def test_integers_wider_than_64_bits(self):
+        self.assertEqual(wire.decode(wire.encode(HUGE)), HUGE)
+
+
+@skipUnless(wire.msgpack, "msgpack is not installed")
+class MsgpackCodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        payload = {"type": "op", "op": [1, "é"], "revision": 3}
+        frame = wire.MsgpackCodec.encode(payload)
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(wire.MsgpackCodec.decode(frame), payload)
+
+    def test_integers_wider_than_64_bits_go_out_as_json(self):
+        frame = wire.MsgpackCodec.encode(HUGE)
+        self.assertIsInstance(frame, str)
+        self.assertEqual(wire.decode(frame), HUGE)
+
+    def test_group_event_encodes_every_codec(self):
+        event = wire.group_event("document.snapshot", {"content": HUGE}, revision=1)
+        self.assertEqual(set(event["frames"]), {"msgpack", "json"})
+        self.assertEqual(event["revision"], 1)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DocumentViewSet, DocumentShareViewSet, UserListView
+from . import async_views
+from .views import DocumentViewSet, DocumentShareViewSet, MetricsView, UserListView
 
 # DRF Router for ViewSets
 router = DefaultRouter()
@@ -11,4 +12,10 @@ router.register(r"shares", DocumentShareViewSet, basename="share")
 urlpatterns = [
     path("", include(router.urls)),
     path("users/", UserListView.as_view(), name="user-list"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    # Async-native read endpoints (see async_views)
+    path("async/documents/", async_views.document_list, name="async-document-list"),
+    path("async/documents/<int:pk>/", async_views.document_detail, name="async-document-detail"),
+    path("async/shares/", async_views.share_list, name="async-share-list"),
+    path("async/users/", async_views.user_list, name="async-user-list"),
 ]
@@ -0,0 +1,244 @@
+"""
+Version history of document content.
+
+While a document is being edited, a ``DocumentVersion`` is stored at most
+every ``VERSION_INTERVAL`` seconds (see ``signals``). Most versions are
+deltas from the previous one: the text operations or JSON Patches logged in
+between composed into one, or else a diff of the two contents. Every
+``VERSION_KEYFRAME_INTERVAL``-th version, and any version whose delta would
+be larger than the content, is a keyframe holding the full content. Storage
+therefore grows with the edits made, and rebuilding a version applies fewer
+than ``VERSION_KEYFRAME_INTERVAL`` deltas to a keyframe.
+
+Revisions between stored versions are rebuilt from the nearest version
+before them and the operation log, for as long as the log goes back that far.
+
+``compact`` keeps every version from the last ``VERSION_DETAIL_DAYS`` days,
+one per day before that, none older than ``VERSION_RETENTION_DAYS`` (when
+set), and drops operation log entries the older versions make redundant.
+"""
+import json
+from datetime import timedelta
+from functools import reduce
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import jsonpatch, ot, storage
+from .conf import sync_setting
+from .models import Document, DocumentOperation, DocumentVersion
+
+
+class VersionUnavailable(Exception):
+    """The history no longer reaches the requested revision."""
+
+
+def _size(value):
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+def diff(old, new):
+    """``(kind, delta)`` turning ``old`` content into ``new``, or None if only a keyframe will do."""
+    if isinstance(old, str) and isinstance(new, str):
+        return DocumentOperation.TEXT, ot.diff(old, new)
+    if isinstance(old, (dict, list)) and isinstance(new, (dict, list)):
+        return DocumentOperation.PATCH, jsonpatch.diff(old, new)
+    return None
+
+
+def _logged(document_id, after_revision, revision):
+    """The ``(kind, operation)`` pairs from ``after_revision`` to ``revision``, or None if the log lacks some."""
+    rows = list(
+        DocumentOperation.objects.filter(
+            document_id=document_id, revision__gt=after_revision, revision__lte=revision
+        ).order_by("revision").values_list("kind", "operation")
+    )
+    return rows if len(rows) == revision - after_revision else None
+
+
+def _composed(operations):
+    """Logged operations as one delta, if they compose."""
+    kinds = {kind for kind, _ in operations}
+    if kinds == {DocumentOperation.TEXT}:
+        try:
+            return DocumentOperation.TEXT, reduce(ot.compose, (operation for _, operation in operations))
+        except ot.InvalidOperation:
+            return None
+    if kinds == {DocumentOperation.PATCH}:
+        return DocumentOperation.PATCH, [step for _, patch in operations for step in patch]
+    return None
+
+
+def _stored(document_id, revision):
+    """
+    ``(version_revision, content)`` of the last stored version at or before
+    ``revision``, or None. Reads the keyframe and the deltas on top of it in
+    one query.
+    """
+    keyframe = DocumentVersion.objects.filter(
+        document_id=document_id, kind=DocumentOperation.REPLACE, revision__lte=revision
+    ).order_by("-revision").values("revision")[:1]
+    rows = list(
+        DocumentVersion.objects.filter(
+            document_id=document_id, revision__lte=revision, revision__gte=Subquery(keyframe)
+        ).order_by("revision").values_list("revision", "kind", "data")
+    )
+    if not rows:
+        return None
+    return rows[-1][0], storage.replay(None, [(kind, data) for _, kind, data in rows])
+
+
+def content_at(document, revision):
+    """
+    The content of ``document`` at ``revision``. Raises ``VersionUnavailable``
+    if the history no longer reaches it.
+    """
+    if revision == document.revision:
+        return storage.current_content(document)
+    stored = _stored(document.pk, revision) if revision < document.revision else None
+    if stored is None:
+        raise VersionUnavailable(f"Document {document.pk} has no version at revision {revision}.")
+    stored_revision, content = stored
+    if stored_revision == revision:
+        return content
+    operations = _logged(document.pk, stored_revision, revision)
+    if operations is None:
+        raise VersionUnavailable(f"Document {document.pk} has no version at revision {revision}.")
+    return storage.replay(content, operations)
+
+
+def _latest(document_id):
+    return DocumentVersion.objects.filter(document_id=document_id).order_by("-revision").first()
+
+
+def record(document_id, revision, content, force=False):
+    """
+    Store ``content`` as the version at ``revision`` if the document's last
+    version is more than ``VERSION_INTERVAL`` seconds old (or ``force``).
+    Returns the new ``DocumentVersion`` or None.
+    """
+    interval = timedelta(seconds=sync_setting("VERSION_INTERVAL"))
+    last = _latest(document_id)
+    if last is not None and (
+        last.revision >= revision or (not force and timezone.now() - last.created_at < interval)
+    ):
+        return None
+
+    with transaction.atomic():
+        # Versions of one document are written one at a time, so each delta
+        # is taken against the version stored just before it
+        if not Document.objects.select_for_update().filter(pk=document_id).exists():
+            return None
+        last = _latest(document_id)
+        if last is not None and last.revision >= revision:
+            return None
+        kind, data, depth = DocumentOperation.REPLACE, content, 0
+        if last is not None and last.depth + 1 < sync_setting("VERSION_KEYFRAME_INTERVAL"):
+            operations = _logged(document_id, last.revision, revision)
+            delta = _composed(operations) if operations else None
+            if delta is None:
+                previous = _stored(document_id, last.revision)
+                if previous is not None:
+                    delta = diff(previous[1], content)
+            if delta is not None and _size(delta[1]) < _size(content):
+                (kind, data), depth = delta, last.depth + 1
+        try:
+            with transaction.atomic():
+                return DocumentVersion.objects.create(
+                    document_id=document_id, revision=revision, kind=kind, data=data, depth=depth
+                )
+        except IntegrityError:
+            return None
+
+
+def _kept(versions, detail_since, retain_since):
+    """Pick the versions to keep: all recent ones, then the last of each day."""
+    kept = set()
+    days = {}
+    for version in versions:
+        if retain_since is not None and version.created_at < retain_since:
+            continue
+        if version.created_at >= detail_since:
+            kept.add(version.pk)
+        else:
+            days[version.created_at.date()] = version.pk
+    return kept | set(days.values())
+
+
+def compact_document(document_id, detail_since, retain_since=None):
+    """
+    Thin the versions of one document and re-chain the survivors.
+    Returns the number of versions deleted.
+    """
+    keyframe_interval = sync_setting("VERSION_KEYFRAME_INTERVAL")
+    with transaction.atomic():
+        if not Document.objects.select_for_update().filter(pk=document_id).exists():
+            return 0
+        versions = list(DocumentVersion.objects.filter(document_id=document_id).order_by("revision"))
+        kept = _kept(versions, detail_since, retain_since)
+        if len(kept) == len(versions):
+            return 0
+
+        changed = []
+        content = previous_content = None
+        previous_kept = previous = None
+        for version in versions:
+            content = storage.apply_operation(content, version.kind, version.data)
+            if version.pk in kept:
+                chainable = previous_kept is not None and previous_kept.depth + 1 < keyframe_interval
+                if version.kind != DocumentOperation.REPLACE and chainable and previous_kept is previous:
+                    # Still a delta from the version before it
+                    if version.depth != previous_kept.depth + 1:
+                        version.depth = previous_kept.depth + 1
+                        changed.append(version)
+                elif version.kind != DocumentOperation.REPLACE:
+                    # The version it was a delta from is gone
+                    delta = diff(previous_content, content) if chainable else None
+                    if delta is not None and _size(delta[1]) < _size(content):
+                        (version.kind, version.data), version.depth = delta, previous_kept.depth + 1
+                    else:
+                        version.kind, version.data, version.depth = DocumentOperation.REPLACE, content, 0
+                    changed.append(version)
+                previous_kept, previous_content = version, content
+            previous = version
+
+        DocumentVersion.objects.bulk_update(changed, ["kind", "data", "depth"])
+        deleted, _ = DocumentVersion.objects.filter(
+            document_id=document_id
+        ).exclude(pk__in=kept).delete()
+    return deleted
+
+
+def prune_operations(before):
+    """
+    Delete operation log entries older than ``before`` that no load needs:
+    at or before both the document's snapshot and its last stored version.
+    """
+    latest = DocumentVersion.objects.filter(document=OuterRef("document")).order_by(
+        "-revision"
+    ).values("revision")[:1]
+    deleted, _ = DocumentOperation.objects.alias(latest_version=Subquery(latest)).filter(
+        created_at__lt=before,
+        revision__lte=F("document__snapshot_revision"),
+    ).filter(revision__lte=F("latest_version")).delete()
+    return deleted
+
+
+def compact(now=None):
+    """
+    Apply the retention settings to every document's history. Returns
+    ``(versions_deleted, operations_deleted)``.
+    """
+    now = now or timezone.now()
+    detail_since = now - timedelta(days=sync_setting("VERSION_DETAIL_DAYS"))
+    retention_days = sync_setting("VERSION_RETENTION_DAYS")
+    retain_since = now - timedelta(days=retention_days) if retention_days else None
+
+    stale = DocumentVersion.objects.filter(created_at__lt=detail_since).values_list(
+        "document_id", flat=True
+    ).distinct()
+    versions_deleted = sum(
+        compact_document(document_id, detail_since, retain_since) for document_id in list(stale)
+    )
+    return versions_deleted, prune_operations(detail_since)
@@ -1,47 +1,270 @@
+import hashlib
+from contextlib import nullcontext
+
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import viewsets, permissions, status
-from rest_framework.generics import ListAPIView
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Document, DocumentShare
+from . import (
+    access, directory, doclists, jsonpatch, metrics, ot, rendering, rooms, search, storage, versions,
+)
+from .models import Document, DocumentOperation, DocumentShare
 from .serializers import (
     DocumentSerializer,
+    DocumentContentPatchSerializer,
     DocumentCreateUpdateSerializer,
+    DocumentShareBulkSerializer,
     DocumentShareSerializer,
+    DocumentSummarySerializer,
+    DocumentVersionSerializer,
     UserSummarySerializer,
 )
 
 User = get_user_model()
 
 
+def document_validators(row, shares):
+    """
+    ``(etag, last_modified)`` of a document from its ``id``, ``revision`` and
+    ``updated_at`` (``row``) and its ``(shared_with_id, can_edit)`` pairs.
+    """
+    digest = hashlib.sha1(
+        f"{row['id']}:{row['revision']}:{row['updated_at'].isoformat()}:{sorted(shares)}".encode()
+    ).hexdigest()
+    return f'"{digest}"', int(row["updated_at"].timestamp())
+
+
+# ✅ Keyset pages over the dashboard order, stable while documents change
+class DocumentCursorPagination(CursorPagination):
+    ordering = "-updated_at"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
 # ✅ Handles document CRUD with owner and shared-user access
 class DocumentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DocumentCursorPagination
 
     def get_queryset(self):
         # Prevent errors during schema generation
         if getattr(self, 'swagger_fake_view', False):
             return Document.objects.none()
 
-        user = self.request.user
-
-        # Documents owned or shared with the user
-        owned_doc_ids = Document.objects.filter(owner=user).values_list("id", flat=True)
-        shared_doc_ids = DocumentShare.objects.filter(shared_with=user).values_list("document_id", flat=True)
-
-        # Combined QuerySet of accessible document IDs
-        accessible_ids = list(owned_doc_ids) + list(shared_doc_ids)
-        return Document.objects.filter(id__in=accessible_ids)
+        # Documents owned by or shared with the user
+        queryset = Document.objects.accessible_to(self.request.user)
+        if self.action in ('list', 'search'):
+            queryset = queryset.summaries()
+        elif self.action == 'retrieve':
+            queryset = queryset.with_details()
+        elif self.action in ('list_versions', 'version'):
+            queryset = queryset.defer('content')
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return DocumentCreateUpdateSerializer
+        if self.action in ('list', 'search'):
+            return DocumentSummarySerializer
         return DocumentSerializer
 
+    def list(self, request, *args, **kwargs):
+        # ✅ Served from the per-user cache until one of the user's documents changes
+        key, data = doclists.get_page(request.user.pk, request.build_absolute_uri())
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        doclists.set_page(key, response.data)
+        return response
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def get_validators(self, lock=False):
+        """
+        ``(etag, last_modified)`` for the requested document, read without
+        loading its content, or None if the user cannot see it.
+
+        The ETag covers the revision, ``updated_at`` (bumped by title and
+        content changes) and the share list, so every field of the detail
+        response is accounted for.
+        """
+        documents = Document.objects.accessible_to(self.request.user)
+        if lock:
+            documents = documents.select_for_update()
+        row = documents.filter(pk=self.kwargs["pk"]).values("id", "revision", "updated_at").first()
+        if row is None:
+            return None
+        shares = DocumentShare.objects.filter(document_id=row["id"]).values_list(
+            "shared_with_id", "can_edit"
+        )
+        return document_validators(row, shares)
+
+    def conditional(self, request, handler, *args, **kwargs):
+        """
+        Run ``handler`` unless the request's preconditions say otherwise:
+        304 for a GET the client already has, 412 for a write based on a
+        stale copy (If-Match / If-Unmodified-Since).
+        """
+        write = request.method not in ("GET", "HEAD")
+        with transaction.atomic() if write else nullcontext():
+            validators = self.get_validators(lock=write)
+            if validators is None:
+                return handler(request, *args, **kwargs)  # 404 as usual
+            etag, last_modified = validators
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = handler(request, *args, **kwargs)
+                if write:
+                    etag, last_modified = self.get_validators() or (None, None)
+        if response.status_code in (200, 304) and etag is not None:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            # Let browsers keep the copy but always revalidate it
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """
+        Full-text search over the titles and content of the documents the
+        user can see, best matches first: ``?q=words&limit=20``.
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "Missing search query 'q'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 50)
+        except ValueError:
+            return Response({"error": "'limit' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        documents = Document.objects.accessible_to(request.user)
+        ranked = search.search(query, documents, limit)
+        found = self.get_queryset().in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, rank in ranked:
+            if pk in found:
+                results.append({**self.get_serializer(found[pk]).data, "rank": rank})
+        return Response({"results": results})
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+    def _refuse_read_only(self, document):
+        """A 403 response unless the user may edit ``document``, else None."""
+        if access.load_level(document.pk, self.request.user.pk) != access.EDIT:
+            return Response(
+                {"error": "You have read-only access to this document."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return None
+
+    @action(detail=True, methods=["patch"], url_path="content")
+    def patch_content(self, request, *args, **kwargs):
+        """
+        Change content with a text operation (``op``) or an RFC 6902 JSON
+        Patch (``patch``) based on ``revision``, instead of resending it all.
+        """
+        with rooms.writing(self.kwargs["pk"]):
+            return self.conditional(request, self._patch_content, *args, **kwargs)
+
+    def _patch_content(self, request, *args, **kwargs):
+        document = self.get_object()
+        refused = self._refuse_read_only(document)
+        if refused is not None:
+            return refused
+        serializer = DocumentContentPatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if "op" in data:
+            field, kind = "op", DocumentOperation.TEXT
+        else:
+            field, kind = "patch", DocumentOperation.PATCH
+
+        try:
+            revision, applied = storage.commit_operation(
+                document, kind, data[field], data["revision"], author=request.user
+            )
+        except storage.RevisionConflict:
+            return Response(
+                {"error": "The document has changed since that revision.", "revision": document.revision},
+                status=status.HTTP_409_CONFLICT
+            )
+        except (ot.InvalidOperation, jsonpatch.InvalidPatch) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"revision": revision, field: applied})
+
+    @action(detail=True, methods=["get"], url_path="versions")
+    def list_versions(self, request, *args, **kwargs):
+        """
+        Stored versions, newest first, next to the current ``revision``:
+        ``?before=`` continues from the previous page's ``next``.
+        """
+        document = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get("limit", 50)), 1), 200)
+            before = int(request.query_params.get("before", 0))
+        except ValueError:
+            return Response({"error": "'limit' and 'before' must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        stored = document.versions.order_by("-revision").only("revision", "kind", "created_at")
+        if before:
+            stored = stored.filter(revision__lt=before)
+        page = list(stored[:limit + 1])
+        next_before = page[limit - 1].revision if len(page) > limit else None
+        return Response({
+            "revision": document.revision,
+            "results": DocumentVersionSerializer(page[:limit], many=True).data,
+            "next": next_before,
+        })
+
+    @action(detail=True, methods=["get"], url_path=r"versions/(?P<revision>[0-9]+)")
+    def version(self, request, revision, *args, **kwargs):
+        """The content of the document as it was at ``revision``."""
+        document = self.get_object()
+        try:
+            content = versions.content_at(document, int(revision))
+        except versions.VersionUnavailable:
+            return Response(
+                {"error": "The history does not reach that revision."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({
+            "revision": int(revision),
+            "content": content,
+            "content_html": rendering.render_html(content),
+        })
+
+    def update(self, request, *args, **kwargs):
+        if "content" not in request.data:
+            return self.conditional(request, self._update, *args, **kwargs)
+        # Live edits to the document come first
+        with rooms.writing(self.kwargs["pk"]):
+            return self.conditional(request, self._update, *args, **kwargs)
+
+    def _update(self, request, *args, **kwargs):
+        refused = self._refuse_read_only(self.get_object())
+        if refused is not None:
+            return refused
+        return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self.conditional(request, self._destroy, *args, **kwargs)
+
+    def _destroy(self, request, *args, **kwargs):
+        if self.get_object().owner_id != request.user.pk:
+            return Response(
+                {"error": "Only the owner can delete this document."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return super().destroy(request, *args, **kwargs)
+
 
 # ✅ Manages sharing (grant/edit/revoke permissions)
 class DocumentShareViewSet(viewsets.ModelViewSet):
@@ -56,6 +279,73 @@ class DocumentShareViewSet(viewsets.ModelViewSet):
             document__owner=self.request.user
         ).select_related("document", "shared_with")
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Share every document in ``document_ids`` with every user in
+        ``shared_with_ids``, setting ``can_edit`` on new and existing shares.
+        Costs a fixed handful of queries however many pairs are sent.
+        """
+        serializer = DocumentShareBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        document_ids = serializer.validated_data["document_ids"]
+        user_ids = serializer.validated_data["shared_with_ids"]
+        can_edit = serializer.validated_data["can_edit"]
+
+        owned = set(
+            Document.objects.filter(pk__in=document_ids, owner=request.user).values_list("pk", flat=True)
+        )
+        if len(owned) < len(document_ids):
+            return Response(
+                {"error": "Only the owner can share these documents.",
+                 "document_ids": [pk for pk in document_ids if pk not in owned]},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        found = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+        if len(found) < len(user_ids):
+            return Response(
+                {"error": "Unknown users.", "shared_with_ids": [pk for pk in user_ids if pk not in found]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Owners already have access
+        user_ids = [pk for pk in user_ids if pk != request.user.pk]
+        existing = dict(
+            ((document_id, user_id), edit)
+            for document_id, user_id, edit in DocumentShare.objects.filter(
+                document_id__in=document_ids, shared_with_id__in=user_ids
+            ).values_list("document_id", "shared_with_id", "can_edit")
+        )
+        pairs = [
+            (document_id, user_id)
+            for document_id in document_ids
+            for user_id in user_ids
+            if existing.get((document_id, user_id)) != can_edit
+        ]
+        with transaction.atomic():
+            # Upsert, so shares created meanwhile are updated rather than clash
+            DocumentShare.objects.bulk_create(
+                [DocumentShare(document_id=document_id, shared_with_id=user_id, can_edit=can_edit)
+                 for document_id, user_id in pairs],
+                update_conflicts=True,
+                unique_fields=["document", "shared_with"],
+                update_fields=["can_edit"],
+            )
+            # bulk_create sends no post_save, so tell the sockets and drop
+            # the cached lists here
+            transaction.on_commit(lambda: access.bulk_changed(pairs))
+            transaction.on_commit(
+                lambda: doclists.invalidate([request.user.pk, *(user_id for _, user_id in pairs)]),
+                robust=True,
+            )
+
+        created = sum(1 for pair in pairs if pair not in existing)
+        return Response({
+            "created": created,
+            "updated": len(pairs) - created,
+            "unchanged": len(document_ids) * len(user_ids) - len(pairs),
+        })
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.document.owner != request.user:
@@ -75,10 +365,34 @@ class DocumentShareViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
 
-# ✅ Returns list of all users except the requester (used in share dropdown)
-class UserListView(ListAPIView):
-    serializer_class = UserSummarySerializer
+# ✅ User typeahead for the share dialog, excluding the requester
+class UserListView(APIView):
+    """
+    Typeahead for the share dialog: ``?q=`` matches the start of usernames
+    and emails, ``?after=`` continues from the previous page's ``next``.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return User.objects.exclude(id=self.request.user.id)
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 50)
+        except ValueError:
+            return Response({"error": "'limit' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        users, next_after = directory.find_users(
+            request.query_params.get("q", ""),
+            exclude_id=request.user.id,
+            after=request.query_params.get("after", ""),
+            limit=limit,
+        )
+        return Response({
+            "results": UserSummarySerializer(users, many=True).data,
+            "next": next_after,
+        })
+
+
+# ✅ Realtime-layer counters for this process (admins only)
+class MetricsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
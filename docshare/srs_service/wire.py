@@ -0,0 +1,98 @@
+"""
+Encoding of WebSocket frames.
+
+Broadcast events carry their frame already encoded, so a message sent to a
+room is serialized once at ``group_send`` time instead of once per member.
+orjson is used when installed; the stdlib encoder is the fallback.
+
+Clients speak JSON text frames by default. A client can offer the
+``docshare.msgpack`` subprotocol to switch its connection to MessagePack
+binary frames (when msgpack is installed), or ``docshare.json`` to pin JSON.
+MessagePack has no room for integers wider than 64 bits, so the rare frame
+carrying one goes out to those clients as JSON text instead.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary protocol
+    msgpack = None
+
+
+def encode(payload):
+    """Encode ``payload`` as a compact JSON text frame."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload).decode()
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits, which json handles
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def decode(text):
+    """Decode a JSON text frame; raises ``json.JSONDecodeError`` on bad input."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class JSONCodec:
+    name = "json"
+    subprotocol = "docshare.json"
+    binary = False
+    encode = staticmethod(encode)
+    decode = staticmethod(decode)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    subprotocol = "docshare.msgpack"
+    binary = True
+
+    @staticmethod
+    def encode(payload):
+        try:
+            return msgpack.packb(payload, use_bin_type=True)
+        except (OverflowError, TypeError):
+            return encode(payload)  # A JSON text frame
+
+    @staticmethod
+    def decode(data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as exc:
+            raise ValueError("Invalid MessagePack frame.") from exc
+
+
+# Preferred first; only codecs whose library is installed are offered
+CODECS = [codec for codec in (MsgpackCodec, JSONCodec) if codec is not MsgpackCodec or msgpack]
+
+
+def negotiate(subprotocols):
+    """
+    Pick the codec for a connection from the subprotocols the client offered.
+    Returns ``(codec, subprotocol)``; ``subprotocol`` is None when the client
+    did not ask for one, in which case it gets plain JSON.
+    """
+    for codec in CODECS:
+        if codec.subprotocol in subprotocols:
+            return codec, codec.subprotocol
+    return JSONCodec, None
+
+
+def group_event(event_type, payload, **fields):
+    """
+    Build a channel-layer event for ``group_send`` whose client frame is
+    encoded up front, once per available codec; handlers forward
+    ``event["frames"][codec.name]`` untouched.
+    """
+    return {
+        "type": event_type,
+        "frames": {codec.name: codec.encode(payload) for codec in CODECS},
+        **fields,
+    }